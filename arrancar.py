@@ -1,13 +1,54 @@
 #!/usr/bin/env python3
 """
 Arrancar gunicorn para que se ejecute el servicio de la API
+
+Con ARRANCAR=uvicorn se arranca un solo proceso para desarrollo, con recarga de los cambios.
+
+Con ARRANCAR=gunicorn se arranca para produccion: la aplicacion se importa una sola vez
+en el proceso maestro y los workers la comparten al hacer el fork, cada worker abre su propio
+pool de conexiones, y los workers se reciclan despues de max-requests peticiones.
+Para reiniciar los workers sin cortar peticiones mande la señal HUP al proceso maestro.
+Si no se define METRICS_DIR se crea un directorio temporal para que /metrics sume las metricas de todos los workers,
+y si no se define RATE_LIMIT_STORE los limites de peticiones se guardan en el archivo que comparten los workers.
 """
 import argparse
+import gc
 import os
 import sys
+import tempfile
+
+from gunicorn.app.base import BaseApplication
+from uvicorn.workers import UvicornWorker
+import uvicorn
 
 APP = "citas_admin.app:app"
 PORT = 8006
+LOOPS = ["auto", "asyncio", "uvloop"]
+HTTPS = ["auto", "h11", "httptools"]
+
+
+def str_to_bool(valor: str) -> bool:
+    """Interpretar True, False, 1, 0, si o no"""
+    if valor.lower() in ("true", "1", "si", "yes"):
+        return True
+    if valor.lower() in ("false", "0", "no"):
+        return False
+    raise argparse.ArgumentTypeError(f"Valor booleano no valido: {valor}")
+
+
+def get_cpus() -> int:
+    """Cantidad de CPUs disponibles para este proceso, respeta los limites del contenedor"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def get_workers_por_defecto() -> int:
+    """Workers por defecto, WEB_CONCURRENCY o dos por CPU mas uno"""
+    if "WEB_CONCURRENCY" in os.environ:
+        return int(os.environ["WEB_CONCURRENCY"])
+    return 2 * get_cpus() + 1
 
 
 def uvicorn_run():
@@ -17,16 +58,65 @@ def uvicorn_run():
     parser = argparse.ArgumentParser(description="Arrancar uvicorn")
     parser.add_argument("--host", type=str, default="127.0.0.1", help="Host default 127.0.0.1")
     parser.add_argument("--port", type=int, default=PORT, help=f"Port default {PORT}")
-    parser.add_argument("--reload", type=bool, default=True, help="Reload default True")
+    parser.add_argument("--reload", type=str_to_bool, default=True, help="Reload default True")
+    parser.add_argument("--loop", type=str, default="auto", choices=LOOPS, help="Event loop default auto, usa uvloop si esta instalado")
+    parser.add_argument("--http", type=str, default="auto", choices=HTTPS, help="Parser HTTP default auto, usa httptools si esta instalado")
+    parser.add_argument("--keep-alive", type=int, default=5, help="Segundos que se mantiene abierta una conexion sin peticiones")
+    parser.add_argument("--backlog", type=int, default=2048, help="Conexiones en espera de ser aceptadas")
     args = parser.parse_args()
 
-    # Definir comando a ejecutar
-    reload_str = "--reload" if args.reload else ""
-    cmd = f"uvicorn --host={args.host} --port {args.port} {reload_str} {APP}"
-    print(cmd)
+    # Ejecutar uvicorn
+    print(f"uvicorn --host={args.host} --port {args.port} {'--reload ' if args.reload else ''}--loop {args.loop} --http {args.http} {APP}")
+    uvicorn.run(
+        APP,
+        host=args.host,
+        port=args.port,
+        reload=args.reload,
+        loop=args.loop,
+        http=args.http,
+        timeout_keep_alive=args.keep_alive,
+        backlog=args.backlog,
+    )
+
+
+def post_fork(server, worker):
+    """Despues del fork, el worker deja al maestro las conexiones heredadas y abre las suyas"""
+    # pylint: disable=import-outside-toplevel,unused-argument
+    from lib.database import reiniciar_pool
+
+    reiniciar_pool()
 
-    # Ejecutar comando
-    os.system(cmd)
+
+class GunicornApplication(BaseApplication):
+    """Aplicacion de gunicorn con la configuracion en codigo, en lugar de la linea de comandos"""
+
+    # pylint: disable=abstract-method
+
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        """Cargar las opciones en la configuracion de gunicorn"""
+        for clave, valor in self.options.items():
+            self.cfg.set(clave, valor)
+
+    def load(self):
+        """Importar la aplicacion, con preload_app ocurre una sola vez en el maestro antes del fork"""
+        # pylint: disable=import-outside-toplevel
+        from citas_admin.app import app
+
+        # Mover los objetos importados a la generacion permanente, el recolector de basura
+        # de los workers no los toca y sus paginas de memoria se siguen compartiendo
+        gc.collect()
+        gc.freeze()
+        return app
+
+
+class CitasUvicornWorker(UvicornWorker):
+    """Worker de uvicorn con el event loop y el parser HTTP de las variables UVICORN_LOOP y UVICORN_HTTP"""
+
+    CONFIG_KWARGS = {"loop": os.environ.get("UVICORN_LOOP", "auto"), "http": os.environ.get("UVICORN_HTTP", "auto")}
 
 
 def gunicorn_run():
@@ -34,19 +124,52 @@ def gunicorn_run():
 
     # Parsear argumentos
     parser = argparse.ArgumentParser(description="Arrancar gunicorn")
-    parser.add_argument("-r", "--reload", type=bool, default=True)
-    parser.add_argument("-w", "--workers", type=int, default=4)
-    parser.add_argument("-b", "--bind", type=str, default=f"0.0.0.0:{PORT}")
-    parser.add_argument("-k", "--worker-class", type=str, default="uvicorn.workers.UvicornWorker")
+    parser.add_argument("--host", type=str, default="0.0.0.0", help="Host default 0.0.0.0")
+    parser.add_argument("--port", type=int, default=PORT, help=f"Port default {PORT}")
+    parser.add_argument("-b", "--bind", type=str, default="", help="Direccion host:puerto, tiene preferencia sobre host y port")
+    parser.add_argument("-r", "--reload", type=str_to_bool, default=False, help="Reload default False, desactiva preload")
+    parser.add_argument("-w", "--workers", type=int, default=get_workers_por_defecto(), help="Default WEB_CONCURRENCY o dos por CPU mas uno")
+    parser.add_argument("--loop", type=str, default="auto", choices=LOOPS, help="Event loop default auto, usa uvloop si esta instalado")
+    parser.add_argument("--http", type=str, default="auto", choices=HTTPS, help="Parser HTTP default auto, usa httptools si esta instalado")
+    parser.add_argument("--max-requests", type=int, default=10000, help="Peticiones que atiende un worker antes de reciclarse, cero para nunca")
+    parser.add_argument("--max-requests-jitter", type=int, default=1000, help="Variacion al azar de max-requests para que no se reciclen todos a la vez")
+    parser.add_argument("--timeout", type=int, default=60, help="Segundos sin respuesta antes de reiniciar un worker")
+    parser.add_argument("--graceful-timeout", type=int, default=30, help="Segundos para terminar las peticiones en curso al reiniciar")
+    parser.add_argument("--keep-alive", type=int, default=5, help="Segundos que se mantiene abierta una conexion sin peticiones")
+    parser.add_argument("--backlog", type=int, default=2048, help="Conexiones en espera de ser aceptadas")
+    parser.add_argument("--pidfile", type=str, default=None, help="Archivo con el PID del maestro, para mandarle señales")
     args = parser.parse_args()
 
-    # Definir comando a ejecutar
-    reload_str = "--reload" if args.reload else ""
-    cmd = f"gunicorn {reload_str} -w {args.workers} -b {args.bind} -k {args.worker_class} {APP}"
-    print(cmd)
-
-    # Ejecutar comando
-    os.system(cmd)
+    # Las metricas de los workers se suman en un directorio compartido
+    os.environ.setdefault("METRICS_DIR", tempfile.mkdtemp(prefix="citas_metricas_"))
+
+    # Los limites de peticiones se comparten entre los workers, en memoria cada worker tendria los suyos
+    os.environ.setdefault("RATE_LIMIT_STORE", "file")
+
+    # El worker se importa desde este modulo y toma el event loop y el parser HTTP de estas variables
+    os.environ["UVICORN_LOOP"] = args.loop
+    os.environ["UVICORN_HTTP"] = args.http
+
+    # Definir opciones
+    options = {
+        "bind": args.bind or f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "worker_class": "arrancar.CitasUvicornWorker",
+        "preload_app": not args.reload,
+        "reload": args.reload,
+        "max_requests": args.max_requests,
+        "max_requests_jitter": args.max_requests_jitter,
+        "timeout": args.timeout,
+        "graceful_timeout": args.graceful_timeout,
+        "keepalive": args.keep_alive,
+        "backlog": args.backlog,
+        "pidfile": args.pidfile,
+        "post_fork": post_fork,
+    }
+    print(f"gunicorn {' '.join(f'--{clave}={valor}' for clave, valor in options.items() if clave != 'post_fork')} --loop={args.loop} --http={args.http} {APP}")
+
+    # Ejecutar gunicorn
+    GunicornApplication(options).run()
 
 
 def main():
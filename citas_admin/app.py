@@ -1,11 +1,22 @@
 """
 Citas V2 Admin API OAuth2
 """
-from fastapi import FastAPI
+import hmac
+import json
+
+from fastapi import APIRouter, FastAPI, Header, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRoute
 from fastapi_pagination import add_pagination
+from starlette.routing import request_response
 
 from config.settings import get_settings
+from lib.compresion import CompresionMiddleware
+from lib.escucha import detener_escuchas
+from lib.invalidacion import detener_invalidaciones, iniciar_invalidaciones
+from lib.metrics import MetricasCompartidas, MetricsMiddleware, render_metrics
+from lib.sql_profiler import SQLProfilerMiddleware
 
 from .v2.autoridades.paths import autoridades
 from .v2.cit_categorias.paths import cit_categorias
@@ -19,6 +30,7 @@ from .v2.cit_horas_bloqueadas.paths import cit_horas_bloqueadas
 from .v2.cit_horas_disponibles.paths import cit_horas_disponibles
 from .v2.cit_oficinas_servicios.paths import cit_oficinas_servicios
 from .v2.cit_servicios.paths import cit_servicios
+from .v2.cit_tableros.paths import cit_tableros
 from .v2.distritos.paths import distritos
 from .v2.domicilios.paths import domicilios
 from .v2.enc_servicios.paths import enc_servicios
@@ -52,39 +64,121 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# CompresionMiddleware, con gzip o brotli segun lo que acepte el cliente
+app.add_middleware(
+    CompresionMiddleware,
+    minimo=settings.compresion_minimo,
+    nivel_gzip=settings.compresion_nivel_gzip,
+    nivel_brotli=settings.compresion_nivel_brotli,
+    con_brotli=settings.compresion_brotli,
+)
+
+# MetricsMiddleware, mide tambien el tiempo de comprimir
+app.add_middleware(MetricsMiddleware)
+
+# SQLProfilerMiddleware, solo en desarrollo y pruebas
+if settings.sql_profiler:
+    app.add_middleware(SQLProfilerMiddleware, presupuesto=settings.sql_profiler_budget)
+
+
+def agregar_router(router: APIRouter):
+    """Agregar las rutas del router ya construidas, include_router las vuelve a construir y copia otra vez cada response_model"""
+    for ruta in router.routes:
+        if isinstance(ruta, APIRoute):
+            # Con la aplicacion como proveedor para que funcione app.dependency_overrides
+            ruta.dependency_overrides_provider = app
+            ruta.app = request_response(ruta.get_route_handler())
+        app.router.routes.append(ruta)
+    app.router.on_startup.extend(router.on_startup)
+    app.router.on_shutdown.extend(router.on_shutdown)
+
+
 # Paths
-app.include_router(autoridades)
-app.include_router(cit_categorias)
-app.include_router(cit_citas)
-app.include_router(cit_clientes)
-app.include_router(cit_clientes_recuperaciones)
-app.include_router(cit_clientes_registros)
-app.include_router(cit_dias_disponibles)
-app.include_router(cit_dias_inhabiles)
-app.include_router(cit_horas_bloqueadas)
-app.include_router(cit_horas_disponibles)
-app.include_router(cit_oficinas_servicios)
-app.include_router(cit_servicios)
-app.include_router(distritos)
-app.include_router(domicilios)
-app.include_router(enc_servicios)
-app.include_router(enc_sistemas)
-app.include_router(materias)
-app.include_router(modulos)
-app.include_router(oficinas)
-app.include_router(pag_pagos)
-app.include_router(pag_tramites_servicios)
-app.include_router(permisos)
-app.include_router(roles)
-app.include_router(usuarios)
-app.include_router(usuarios_oficinas)
-app.include_router(usuarios_roles)
+for router in (
+    autoridades,
+    cit_categorias,
+    cit_citas,
+    cit_clientes,
+    cit_clientes_recuperaciones,
+    cit_clientes_registros,
+    cit_dias_disponibles,
+    cit_dias_inhabiles,
+    cit_horas_bloqueadas,
+    cit_horas_disponibles,
+    cit_oficinas_servicios,
+    cit_servicios,
+    cit_tableros,
+    distritos,
+    domicilios,
+    enc_servicios,
+    enc_sistemas,
+    materias,
+    modulos,
+    oficinas,
+    pag_pagos,
+    pag_tramites_servicios,
+    permisos,
+    roles,
+    usuarios,
+    usuarios_oficinas,
+    usuarios_roles,
+):
+    agregar_router(router)
 
 # Pagination
 add_pagination(app)
 
 
+def openapi_desde_archivo() -> dict:
+    """Esquema OpenAPI pre-generado con generar_openapi.py, si no existe el archivo se construye como siempre"""
+    if app.openapi_schema is None:
+        try:
+            with open(settings.openapi_file, encoding="utf8") as archivo:
+                app.openapi_schema = json.load(archivo)
+        except FileNotFoundError:
+            return FastAPI.openapi(app)
+    return app.openapi_schema
+
+
+# OpenAPI, en produccion se lee del archivo en lugar de construirlo en la primera consulta
+if settings.openapi_file:
+    app.openapi = openapi_desde_archivo
+
+
+# Con gunicorn cada worker guarda sus metricas en el directorio y /metrics entrega la suma de todos
+METRICAS_COMPARTIDAS = MetricasCompartidas(settings.metrics_dir) if settings.metrics_dir else None
+
+
+@app.on_event("startup")
+async def startup():
+    """Escuchar los avisos de Postgres para invalidar los caches y guardar las metricas del worker"""
+    if settings.cache_invalidacion:
+        iniciar_invalidaciones()
+    if METRICAS_COMPARTIDAS is not None:
+        METRICAS_COMPARTIDAS.iniciar()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Cerrar las conexiones que escuchan los avisos de Postgres y acumular las metricas del worker"""
+    detener_escuchas()
+    detener_invalidaciones()
+    if METRICAS_COMPARTIDAS is not None:
+        METRICAS_COMPARTIDAS.terminar()
+
+
 @app.get("/")
 async def root():
     """Mensaje de Bienvenida"""
     return {"message": "Bienvenido a Citas v2 admin API OAuth2 del Poder Judicial del Estado de Coahuila de Zaragoza."}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics(authorization: str = Header(default="")):
+    """Metricas en formato de texto de Prometheus, solo con METRICS_TOKEN y el encabezado Authorization: Bearer"""
+    if settings.metrics_token == "":
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not hmac.compare_digest(authorization.encode(), f"Bearer {settings.metrics_token}".encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    contenido = METRICAS_COMPARTIDAS.render() if METRICAS_COMPARTIDAS is not None else render_metrics()
+    return PlainTextResponse(contenido, media_type="text/plain; version=0.0.4")
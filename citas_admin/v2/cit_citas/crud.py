@@ -2,32 +2,87 @@
 Cit Citas v2, CRUD (create, read, update, and delete)
 """
 from datetime import date, datetime, time, timedelta
-from typing import Any
+from typing import Any, Dict, List, Tuple
+import json
 
-from sqlalchemy import or_
-from sqlalchemy.orm import Session
+from sqlalchemy import Date, DateTime, Integer, and_, cast, column, extract, literal, null, or_, select, tuple_, union_all, update, values
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.sql import func
 import pytz
 
 from config.settings import Settings
+from lib.campos import MapaCampos, cargar_campos
 from lib.exceptions import CitasIsDeletedError, CitasNotExistsError, CitasNotValidParamError, CitasOutOfRangeParamError
+from lib.incluidos import Relacion
+from lib.lotes import consultar_lote
 from lib.pwgen import generar_codigo_asistencia
 from lib.safe_string import safe_clave, safe_curp, safe_email, safe_string
 
 from .models import CitCita
-from ..cit_citas_anonimas.crud import get_cit_citas_anonimas
-from ..cit_clientes.crud import get_cit_cliente
+from .schemas import (
+    CitCitaImpactoOut,
+    CitCitasImpactoOficinaOut,
+    CitCitasImpactoOut,
+    CitCitasOcupacionOficinaOut,
+    CitCitasOcupacionOut,
+    CitHoraBloqueadaPropuestaIn,
+)
+from ..cit_citas_ocupaciones.crud import liberar_lugares, ocupar_lugar
+from ..cit_clientes.crud import get_cit_cliente, get_cit_clientes_lote
 from ..cit_clientes.models import CitCliente
+from ..cit_clientes.schemas import CitClienteIncluidoOut
 from ..cit_dias_disponibles.crud import get_cit_dias_disponibles
-from ..cit_dias_inhabiles.crud import get_cit_dias_inhabiles
+from ..cit_dias_inhabiles.crud import get_cit_dias_inhabiles_fechas
 from ..cit_horas_disponibles.crud import get_cit_horas_disponibles
 from ..cit_oficinas_servicios.crud import get_cit_oficinas_servicios
-from ..cit_servicios.crud import get_cit_servicio
+from ..cit_servicios.crud import get_cit_servicio, get_cit_servicios_lote
 from ..cit_servicios.models import CitServicio
+from ..cit_servicios.schemas import CitServicioOut
 from ..distritos.crud import get_distrito
 from ..distritos.models import Distrito
-from ..oficinas.crud import get_oficina
+from ..oficinas.crud import get_oficina, get_oficinas_lote
 from ..oficinas.models import Oficina
+from ..oficinas.schemas import OficinaOut
+
+BLOQUEO_CLIENTES = 1  # Primer entero de pg_advisory_xact_lock para los bloqueos por cliente, el segundo es su id
+CANAL_CITAS_CANCELADAS = "cit_citas_canceladas"
+CANCELADAS_POR_AVISO = 500
+CANCELAR_LOTE_MAXIMO = 10000
+ESTADISTICAS_CONJUNTOS_MAXIMO = 16
+ESTADISTICAS_DIMENSIONES = ("dia", "distrito", "oficina", "servicio", "estado")
+IMPACTO_PROPUESTAS_MAXIMO = 1000
+OCUPACION_DIAS_MAXIMO = 92
+
+# Columnas y relaciones que necesita cada campo de CitCitaOut
+CIT_CITAS_CAMPOS: MapaCampos = {
+    "id": [CitCita.id],
+    "cit_cliente_id": [CitCita.cit_cliente_id],
+    "cit_cliente_nombre": [(CitCita.cit_cliente, CitCliente.nombres), (CitCita.cit_cliente, CitCliente.apellido_primero), (CitCita.cit_cliente, CitCliente.apellido_segundo)],
+    "cit_cliente_curp": [(CitCita.cit_cliente, CitCliente.curp)],
+    "cit_cliente_email": [(CitCita.cit_cliente, CitCliente.email)],
+    "cit_servicio_id": [CitCita.cit_servicio_id],
+    "cit_servicio_clave": [(CitCita.cit_servicio, CitServicio.clave)],
+    "cit_servicio_descripcion": [(CitCita.cit_servicio, CitServicio.descripcion)],
+    "oficina_id": [CitCita.oficina_id],
+    "oficina_clave": [(CitCita.oficina, Oficina.clave)],
+    "oficina_descripcion": [(CitCita.oficina, Oficina.descripcion)],
+    "oficina_descripcion_corta": [(CitCita.oficina, Oficina.descripcion_corta)],
+    "inicio": [CitCita.inicio],
+    "termino": [CitCita.termino],
+    "notas": [CitCita.notas],
+    "estado": [CitCita.estado],
+    "asistencia": [CitCita.asistencia],
+    "codigo_asistencia": [CitCita.codigo_asistencia],
+    "creado": [CitCita.creado],
+    "puede_cancelarse": [CitCita.estado, CitCita.inicio, CitCita.cancelar_antes],
+}
+
+# Relaciones que se pueden incluir en el listado de citas
+CIT_CITAS_INCLUIDOS: Dict[str, Relacion] = {
+    "cit_cliente": Relacion("cit_cliente_id", get_cit_clientes_lote, CitClienteIncluidoOut, "CIT CLIENTES"),
+    "cit_servicio": Relacion("cit_servicio_id", get_cit_servicios_lote, CitServicioOut, "CIT SERVICIOS"),
+    "oficina": Relacion("oficina_id", get_oficinas_lote, OficinaOut, "OFICINAS"),
+}
 
 
 def get_cit_citas(
@@ -48,8 +103,9 @@ def get_cit_citas(
     inicio_hasta: date = None,
     oficina_id: int = None,
     oficina_clave: str = None,
+    campos: List[str] = None,
 ) -> Any:
-    """Consultar los citas activos"""
+    """Consultar los citas activos, con campos solo se cargan las columnas y relaciones que necesitan"""
     consulta = db.query(CitCita)
 
     # Zonas horarias
@@ -142,6 +198,10 @@ def get_cit_citas(
     else:
         consulta = consulta.order_by(CitCita.id.desc())
 
+    # Cargar solo los campos pedidos
+    if campos is not None:
+        consulta = cargar_campos(consulta, CIT_CITAS_CAMPOS, campos)
+
     # Entregar
     return consulta
 
@@ -159,6 +219,19 @@ def get_cit_cita(
     return cit_cita
 
 
+def get_cit_citas_lote(
+    db: Session,
+    cit_citas_ids: List[int],
+) -> List[Tuple[int, Any]]:
+    """Consultar un lote de citas por sus ids, con el cliente, el servicio y la oficina en la misma consulta"""
+    consulta = db.query(CitCita).options(
+        joinedload(CitCita.cit_cliente),
+        joinedload(CitCita.cit_servicio),
+        joinedload(CitCita.oficina),
+    )
+    return consultar_lote(consulta, CitCita, cit_citas_ids, "cita")
+
+
 def get_cit_citas_creados_por_dia(
     db: Session,
     settings: Settings,
@@ -320,6 +393,136 @@ def get_cit_citas_agendadas_por_servicio_oficina(
     return consulta.group_by(Oficina.clave, CitServicio.clave).order_by(Oficina.clave, CitServicio.clave)
 
 
+def get_estadisticas_dimensiones(texto: str) -> Tuple[str, ...]:
+    """Convertir las dimensiones separadas por comas en una tupla, sin repetidas y validadas"""
+    dimensiones = []
+    for dimension in texto.split(","):
+        dimension = dimension.strip()
+        if dimension == "" or dimension in dimensiones:
+            continue
+        if dimension not in ESTADISTICAS_DIMENSIONES:
+            raise CitasNotValidParamError(f"No es válida la dimension {dimension}, puede ser {','.join(ESTADISTICAS_DIMENSIONES)}")
+        dimensiones.append(dimension)
+    return tuple(dimensiones)
+
+
+def get_cit_citas_estadisticas(
+    db: Session,
+    settings: Settings,
+    dimensiones: str = None,
+    conjuntos: str = None,
+    estados: str = None,
+    fecha_de: str = "creado",
+    fecha: date = None,
+    fecha_desde: date = None,
+    fecha_hasta: date = None,
+    size: int = 100,
+) -> Any:
+    """Calcular las cantidades de citas por las dimensiones y sus subtotales en una sola consulta con GROUPING SETS"""
+
+    # Zonas horarias
+    local_huso_horario = pytz.timezone(settings.tz)
+    servidor_huso_horario = pytz.utc
+
+    # Validar la fecha con la que se agrupa por dia y se limita el rango
+    if fecha_de not in ("creado", "inicio"):
+        raise CitasNotValidParamError("No es válida la fecha, puede ser creado o inicio")
+    columna_fecha = getattr(CitCita, fecha_de)
+
+    # Con dimensiones se agrupa con ROLLUP en ese orden, con conjuntos separados por punto y coma cada uno es un GROUPING SET
+    if (dimensiones is None) == (conjuntos is None):
+        raise CitasNotValidParamError("Se deben indicar las dimensiones o los conjuntos")
+    if dimensiones is not None:
+        agrupaciones = [get_estadisticas_dimensiones(dimensiones)]
+    else:
+        agrupaciones = list(dict.fromkeys(get_estadisticas_dimensiones(conjunto) for conjunto in conjuntos.split(";")))
+        agrupaciones = [agrupacion for agrupacion in agrupaciones if len(agrupacion) > 0]
+    if len(agrupaciones) == 0 or len(agrupaciones[0]) == 0:
+        raise CitasNotValidParamError("No se indicaron las dimensiones")
+    if len(agrupaciones) > ESTADISTICAS_CONJUNTOS_MAXIMO:
+        raise CitasOutOfRangeParamError(f"No se pueden pedir mas de {ESTADISTICAS_CONJUNTOS_MAXIMO} conjuntos")
+    usadas = list(dict.fromkeys(dimension for agrupacion in agrupaciones for dimension in agrupacion))
+
+    # Validar los estados, por defecto ASISTIO y PENDIENTE
+    if estados is None:
+        estados_filtro = ["ASISTIO", "PENDIENTE"]
+    else:
+        estados_filtro = list(dict.fromkeys(estado.strip().upper() for estado in estados.split(",") if estado.strip() != ""))
+        for estado in estados_filtro:
+            if estado not in CitCita.ESTADOS:
+                raise CitasNotValidParamError(f"No es válido el estado {estado}")
+        if len(estados_filtro) == 0:
+            raise CitasNotValidParamError("No se indicaron los estados")
+
+    # Primero contar agrupando por los ids, asi se juntan con las oficinas, distritos y servicios muchos menos renglones
+    base = {
+        "dia": func.date(columna_fecha),
+        "oficina_id": CitCita.oficina_id,
+        "cit_servicio_id": CitCita.cit_servicio_id,
+        "estado": CitCita.estado,
+    }
+    necesarias = {"dia": "dia", "distrito": "oficina_id", "oficina": "oficina_id", "servicio": "cit_servicio_id", "estado": "estado"}
+    base_columnas = [base[nombre].label(nombre) for nombre in dict.fromkeys(necesarias[dimension] for dimension in usadas)]
+    consulta = db.query(*base_columnas, func.count(CitCita.id).label("cantidad"))
+
+    # Filtrar estatus y estados
+    consulta = consulta.filter(CitCita.estatus == "A")
+    consulta = consulta.filter(CitCita.estado.in_(estados_filtro))
+
+    # Si NO se reciben fechas, se limitan a los últimos "size" días
+    if fecha is None and fecha_desde is None and fecha_hasta is None:
+        hoy_servidor = datetime.now(servidor_huso_horario)
+        hoy = hoy_servidor.astimezone(local_huso_horario).date()
+        fecha_desde = hoy - timedelta(days=size - 1)
+        fecha_hasta = hoy
+
+    # Si se recibe fecha, se limita a esa fecha
+    if fecha is not None:
+        desde_dt = datetime(year=fecha.year, month=fecha.month, day=fecha.day, hour=0, minute=0, second=0).astimezone(servidor_huso_horario)
+        hasta_dt = datetime(year=fecha.year, month=fecha.month, day=fecha.day, hour=23, minute=59, second=59).astimezone(servidor_huso_horario)
+        consulta = consulta.filter(columna_fecha >= desde_dt).filter(columna_fecha <= hasta_dt)
+    if fecha is None and fecha_desde is not None:
+        desde_dt = datetime(year=fecha_desde.year, month=fecha_desde.month, day=fecha_desde.day, hour=0, minute=0, second=0).astimezone(servidor_huso_horario)
+        consulta = consulta.filter(columna_fecha >= desde_dt)
+    if fecha is None and fecha_hasta is not None:
+        hasta_dt = datetime(year=fecha_hasta.year, month=fecha_hasta.month, day=fecha_hasta.day, hour=23, minute=59, second=59).astimezone(servidor_huso_horario)
+        consulta = consulta.filter(columna_fecha <= hasta_dt)
+
+    # Contar por los ids
+    conteo = consulta.group_by(*base_columnas).subquery()
+
+    # Columnas de las dimensiones, cada una con su GROUPING que es 0 si el renglon esta agrupado por ella
+    columnas = {
+        "dia": conteo.c.get("dia"),
+        "distrito": Distrito.nombre_corto,
+        "oficina": Oficina.clave,
+        "servicio": CitServicio.clave,
+        "estado": conteo.c.get("estado"),
+    }
+    seleccion = []
+    for dimension in usadas:
+        seleccion.append(columnas[dimension].label(dimension))
+        seleccion.append(func.grouping(columnas[dimension]).label(f"{dimension}_agrupado"))
+    consulta = db.query(*seleccion, func.sum(conteo.c.cantidad).label("cantidad")).select_from(conteo)
+
+    # Juntar solo con las tablas de las dimensiones pedidas
+    if "distrito" in usadas or "oficina" in usadas:
+        consulta = consulta.join(Oficina, Oficina.id == conteo.c.oficina_id)
+    if "distrito" in usadas:
+        consulta = consulta.join(Distrito, Distrito.id == Oficina.distrito_id)
+    if "servicio" in usadas:
+        consulta = consulta.join(CitServicio, CitServicio.id == conteo.c.cit_servicio_id)
+
+    # Agrupar los conteos en un solo recorrido, los conjuntos llevan el total al final
+    if dimensiones is not None:
+        consulta = consulta.group_by(func.rollup(*[columnas[dimension] for dimension in agrupaciones[0]]))
+    else:
+        consulta = consulta.group_by(func.grouping_sets(*[tuple_(*[columnas[dimension] for dimension in agrupacion]) for agrupacion in agrupaciones], tuple_()))
+
+    # Ordenar, los subtotales quedan despues de sus renglones, y entregar
+    return consulta.order_by(*[columnas[dimension] for dimension in usadas])
+
+
 def create_cit_cita(
     db: Session,
     cit_cliente_id: int,
@@ -350,15 +553,14 @@ def create_cit_cita(
     if fecha not in get_cit_dias_disponibles(db=db, settings=settings):
         raise CitasNotValidParamError("No es valida la fecha")
 
+    # Bloquear al cliente hasta el commit, sus otras peticiones para crear citas esperan aqui y despues ven esta cita
+    # Antes de las horas disponibles, que pueden bloquear la oficina en la fecha, para tomar los bloqueos siempre en el mismo orden
+    db.execute(select(func.pg_advisory_xact_lock(BLOQUEO_CLIENTES, cit_cliente.id)))
+
     # Validar la hora_minuto, respecto a las horas disponibles
     if hora_minuto not in get_cit_horas_disponibles(db=db, cit_servicio_id=cit_servicio_id, fecha=fecha, oficina_id=oficina_id, settings=settings):
         raise CitasOutOfRangeParamError("No es valida la hora-minuto porque no esta disponible")
 
-    # Validar que las citas en ese tiempo para esa oficina NO hayan llegado al limite de personas
-    cit_citas_anonimas = get_cit_citas_anonimas(db=db, fecha=fecha, hora_minuto=hora_minuto, oficina_id=oficina_id)
-    if cit_citas_anonimas.count() >= oficina.limite_personas:
-        raise CitasOutOfRangeParamError("No se puede crear la cita porque ya se alcanzo el limite de personas en la oficina")
-
     # Validar que la cantidad de citas con estado PENDIENTE no haya llegado al limite de este cliente
     if get_cit_citas_disponibles_cantidad(db=db, cit_cliente_id=cit_cliente.id, settings=settings) <= 0:
         raise CitasOutOfRangeParamError("No se puede crear la cita porque ya se alcanzo el limite de citas pendientes")
@@ -377,7 +579,7 @@ def create_cit_cita(
     cancelar_antes = inicio_dt - timedelta(hours=24)
 
     # Si cancelar_antes es un dia inhabil, domingo o sabado, se busca el dia habil anterior
-    dias_inhabiles = get_cit_dias_inhabiles(db=db).all()
+    dias_inhabiles = get_cit_dias_inhabiles_fechas(db, date.today())
     while cancelar_antes.date() in dias_inhabiles or cancelar_antes.weekday() == 6 or cancelar_antes.weekday() == 5:
         if cancelar_antes.date() in dias_inhabiles:
             cancelar_antes = cancelar_antes - timedelta(days=1)
@@ -386,6 +588,11 @@ def create_cit_cita(
         if cancelar_antes.weekday() == 5:  # Si es sábado, se cambia a viernes
             cancelar_antes = cancelar_antes - timedelta(days=1)
 
+    # Ocupar un lugar, si las citas en ese tiempo para esa oficina ya llegaron al limite de personas no se ocupa
+    if not ocupar_lugar(db=db, oficina_id=oficina.id, inicio=inicio_dt, limite_personas=oficina.limite_personas):
+        db.rollback()
+        raise CitasOutOfRangeParamError("No se puede crear la cita porque ya se alcanzo el limite de personas en la oficina")
+
     # Insertar registro
     cit_cita = CitCita(
         cit_servicio_id=cit_servicio.id,
@@ -409,6 +616,59 @@ def create_cit_cita(
     return cit_cita
 
 
+def cancel_cit_citas_lote(
+    db: Session,
+    oficina_id: int = None,
+    inicio_desde: datetime = None,
+    inicio_hasta: datetime = None,
+    cit_citas_ids: List[int] = None,
+) -> List[int]:
+    """Cancelar las citas pendientes de una oficina en un rango de tiempo o por sus ids, con un solo UPDATE"""
+
+    # Validar que se indique la oficina con el rango de tiempo o los ids
+    if cit_citas_ids is None and oficina_id is None:
+        raise CitasNotValidParamError("Debe indicar la oficina o los ids de las citas")
+    if cit_citas_ids is None and (inicio_desde is None or inicio_hasta is None):
+        raise CitasNotValidParamError("Debe indicar el inicio desde y hasta para cancelar las citas de una oficina")
+    if inicio_desde is not None and inicio_hasta is not None and inicio_desde >= inicio_hasta:
+        raise CitasOutOfRangeParamError("El inicio desde debe ser anterior al inicio hasta")
+
+    # Solo las citas activas y pendientes
+    condiciones = [CitCita.estatus == "A", CitCita.estado == "PENDIENTE"]
+
+    # Filtrar por oficina
+    if oficina_id is not None:
+        oficina = get_oficina(db, oficina_id)
+        condiciones.append(CitCita.oficina_id == oficina.id)
+
+    # Filtrar por rango de tiempo
+    if inicio_desde is not None:
+        condiciones.append(CitCita.inicio >= inicio_desde)
+    if inicio_hasta is not None:
+        condiciones.append(CitCita.inicio < inicio_hasta)
+
+    # Filtrar por ids
+    if cit_citas_ids is not None:
+        if len(cit_citas_ids) == 0 or len(cit_citas_ids) > CANCELAR_LOTE_MAXIMO:
+            raise CitasOutOfRangeParamError(f"Se pueden cancelar de 1 a {CANCELAR_LOTE_MAXIMO} citas por sus ids")
+        condiciones.append(CitCita.id.in_(set(cit_citas_ids)))
+
+    # Cancelar en una sola sentencia
+    renglones = db.execute(update(CitCita).where(*condiciones).values(estado="CANCELO").returning(CitCita.id, CitCita.oficina_id, CitCita.inicio)).all()
+    canceladas = sorted(renglon.id for renglon in renglones)
+
+    # Liberar los lugares que ocupaban
+    liberar_lugares(db, [(renglon.oficina_id, renglon.inicio) for renglon in renglones])
+
+    # Avisar en la misma transaccion, se entrega al hacer commit, para que se envien los mensajes por correo electronico
+    for inicio in range(0, len(canceladas), CANCELADAS_POR_AVISO):
+        db.execute(select(func.pg_notify(CANAL_CITAS_CANCELADAS, json.dumps({"ids": canceladas[inicio : inicio + CANCELADAS_POR_AVISO]}))))
+    db.commit()
+
+    # Entregar los ids de las citas canceladas
+    return canceladas
+
+
 def get_cit_citas_pendientes(
     db: Session,
     settings: Settings,
@@ -484,9 +744,10 @@ def cancel_cit_cita(
     if cit_cita.puede_cancelarse is False:
         raise CitasNotExistsError("No se puede cancelar esta cita")
 
-    # Actualizar registro
+    # Actualizar registro y liberar el lugar que ocupaba
     cit_cita.estado = "CANCELO"
     db.add(cit_cita)
+    liberar_lugares(db, [(cit_cita.oficina_id, cit_cita.inicio)])
     db.commit()
     db.refresh(cit_cita)
 
@@ -494,3 +755,164 @@ def cancel_cit_cita(
 
     # Entregar
     return cit_cita
+
+
+def get_cit_citas_impacto(
+    db: Session,
+    horas_bloqueadas: List[CitHoraBloqueadaPropuestaIn],
+    dias_inhabiles: List[date],
+) -> CitCitasImpactoOut:
+    """Consultar las citas pendientes que afectarian las horas bloqueadas y los dias inhabiles propuestos, con un solo JOIN por rangos"""
+
+    # Validar las propuestas
+    if len(horas_bloqueadas) == 0 and len(dias_inhabiles) == 0:
+        raise CitasNotValidParamError("Debe indicar las horas bloqueadas o los dias inhabiles propuestos")
+    if len(horas_bloqueadas) + len(dias_inhabiles) > IMPACTO_PROPUESTAS_MAXIMO:
+        raise CitasOutOfRangeParamError(f"Se pueden analizar hasta {IMPACTO_PROPUESTAS_MAXIMO} horas bloqueadas y dias inhabiles a la vez")
+    for hora_bloqueada in horas_bloqueadas:
+        if hora_bloqueada.inicio >= hora_bloqueada.termino:
+            raise CitasOutOfRangeParamError("El inicio de la hora bloqueada debe ser anterior a su termino")
+
+    # Cada propuesta es un rango de tiempo en una oficina, el dia sirve para que el rango de inicio use el indice (oficina_id, inicio)
+    rangos = []
+    if len(horas_bloqueadas) > 0:
+        horas = values(column("hora_bloqueada", Integer), column("oficina_id", Integer), column("dia", DateTime), column("desde", DateTime), column("hasta", DateTime), name="horas",).data(
+            [
+                (
+                    indice,
+                    hora_bloqueada.oficina_id,
+                    datetime.combine(hora_bloqueada.fecha, time.min),
+                    datetime.combine(hora_bloqueada.fecha, hora_bloqueada.inicio),
+                    datetime.combine(hora_bloqueada.fecha, hora_bloqueada.termino),
+                )
+                for indice, hora_bloqueada in enumerate(horas_bloqueadas)
+            ]
+        )
+        rangos.append(select(horas.c.hora_bloqueada, literal(None, Date).label("dia_inhabil"), horas.c.oficina_id, horas.c.dia, horas.c.desde, horas.c.hasta))
+
+    # Los dias inhabiles son para todas las oficinas activas
+    if len(dias_inhabiles) > 0:
+        dias = values(column("dia_inhabil", Date), column("dia", DateTime), name="dias").data([(dia, datetime.combine(dia, time.min)) for dia in sorted(set(dias_inhabiles))])
+        rangos.append(
+            select(
+                null().label("hora_bloqueada"),
+                dias.c.dia_inhabil,
+                Oficina.id.label("oficina_id"),
+                dias.c.dia,
+                dias.c.dia.label("desde"),
+                (dias.c.dia + timedelta(days=1)).label("hasta"),
+            ).join(Oficina, Oficina.estatus == "A")
+        )
+    propuestas = (rangos[0] if len(rangos) == 1 else union_all(*rangos)).subquery("propuestas")
+
+    # Las citas pendientes que se traslapan con algun rango, cada cita una sola vez
+    consulta = (
+        select(
+            CitCita.id,
+            CitCita.oficina_id,
+            CitCita.cit_cliente_id,
+            CitCita.inicio,
+            CitCita.termino,
+            propuestas.c.hora_bloqueada,
+            propuestas.c.dia_inhabil,
+        )
+        .join(
+            propuestas,
+            and_(
+                CitCita.oficina_id == propuestas.c.oficina_id,
+                CitCita.inicio >= propuestas.c.dia,
+                CitCita.inicio < propuestas.c.hasta,
+                CitCita.termino > propuestas.c.desde,
+            ),
+        )
+        .filter(CitCita.estatus == "A")
+        .filter(CitCita.estado == "PENDIENTE")
+        .distinct(CitCita.id)
+        .order_by(CitCita.id, propuestas.c.hora_bloqueada, propuestas.c.dia_inhabil)
+    )
+    citas = sorted(db.execute(consulta).all(), key=lambda cita: (cita.oficina_id, cita.inicio))
+
+    # Contar por oficina
+    cantidades = {}
+    for cita in citas:
+        cantidades[cita.oficina_id] = cantidades.get(cita.oficina_id, 0) + 1
+    claves = dict(db.query(Oficina.id, Oficina.clave).filter(Oficina.id.in_(cantidades)).all()) if cantidades else {}
+
+    # Entregar
+    return CitCitasImpactoOut(
+        cantidad=len(citas),
+        oficinas=[CitCitasImpactoOficinaOut(oficina_id=oficina_id, oficina_clave=claves.get(oficina_id, ""), cantidad=cantidad) for oficina_id, cantidad in sorted(cantidades.items())],
+        citas=[CitCitaImpactoOut(**cita._mapping) for cita in citas],
+    )
+
+
+def get_cit_citas_ocupacion(
+    db: Session,
+    fecha_desde: date,
+    fecha_hasta: date,
+    intervalo_minutos: int = 15,
+    distrito_id: int = None,
+    oficina_id: int = None,
+) -> CitCitasOcupacionOut:
+    """Consultar la ocupacion por oficina, fecha e intervalo de tiempo con una sola consulta agrupada"""
+
+    # Validar el rango de fechas y el intervalo
+    if fecha_desde > fecha_hasta:
+        raise CitasOutOfRangeParamError("La fecha desde debe ser anterior o igual a la fecha hasta")
+    if (fecha_hasta - fecha_desde).days >= OCUPACION_DIAS_MAXIMO:
+        raise CitasOutOfRangeParamError(f"Se pueden consultar hasta {OCUPACION_DIAS_MAXIMO} dias a la vez")
+    if intervalo_minutos < 5 or intervalo_minutos > 240 or 1440 % intervalo_minutos != 0:
+        raise CitasNotValidParamError("El intervalo debe ser de 5 a 240 minutos y dividir al dia en partes iguales")
+
+    # Consultar las oficinas activas
+    oficinas = db.query(Oficina).filter_by(estatus="A")
+    if distrito_id is not None:
+        distrito = get_distrito(db, distrito_id)
+        oficinas = oficinas.filter(Oficina.distrito == distrito)
+    if oficina_id is not None:
+        oficina = get_oficina(db, oficina_id)
+        oficinas = oficinas.filter(Oficina.id == oficina.id)
+    oficinas = oficinas.order_by(Oficina.clave).all()
+
+    # Contar las citas que ocupan lugar, agrupadas por oficina, fecha e intervalo del dia
+    fecha = cast(CitCita.inicio, Date).label("fecha")
+    bloque = func.floor((extract("hour", CitCita.inicio) * 60 + extract("minute", CitCita.inicio)) / intervalo_minutos).label("bloque")
+    consulta = (
+        db.query(CitCita.oficina_id, fecha, bloque, func.count(CitCita.id))
+        .filter(CitCita.oficina_id.in_([oficina.id for oficina in oficinas]))
+        .filter(CitCita.inicio >= datetime.combine(fecha_desde, time.min))
+        .filter(CitCita.inicio < datetime.combine(fecha_hasta + timedelta(days=1), time.min))
+        .filter(CitCita.estado != "CANCELO")
+        .filter(CitCita.estatus == "A")
+        .group_by(CitCita.oficina_id, fecha, bloque)
+    )
+    cantidades = {}
+    for un_oficina_id, una_fecha, un_bloque, cantidad in consulta.all():
+        cantidades.setdefault(un_oficina_id, {})[(una_fecha, int(un_bloque))] = cantidad
+
+    # Armar una matriz densa por oficina, las columnas van de la apertura al cierre e incluyen las citas fuera de horario
+    fechas = [fecha_desde + timedelta(days=dias) for dias in range((fecha_hasta - fecha_desde).days + 1)]
+    resultados = []
+    for oficina in oficinas:
+        de_la_oficina = cantidades.get(oficina.id, {})
+        bloques = [un_bloque for _, un_bloque in de_la_oficina]
+        primero = min([(oficina.apertura.hour * 60 + oficina.apertura.minute) // intervalo_minutos] + bloques)
+        ultimo = max([(oficina.cierre.hour * 60 + oficina.cierre.minute - 1) // intervalo_minutos] + bloques)
+        resultados.append(
+            CitCitasOcupacionOficinaOut(
+                oficina_id=oficina.id,
+                oficina_clave=oficina.clave,
+                limite_personas=oficina.limite_personas,
+                horas=[time(hour=un_bloque * intervalo_minutos // 60, minute=un_bloque * intervalo_minutos % 60) for un_bloque in range(primero, ultimo + 1)],
+                ocupacion=[[de_la_oficina.get((una_fecha, un_bloque), 0) for un_bloque in range(primero, ultimo + 1)] for una_fecha in fechas],
+            )
+        )
+
+    # Entregar
+    return CitCitasOcupacionOut(
+        fecha_desde=fecha_desde,
+        fecha_hasta=fecha_hasta,
+        intervalo_minutos=intervalo_minutos,
+        fechas=fechas,
+        oficinas=resultados,
+    )
@@ -5,7 +5,7 @@ from collections import OrderedDict
 from datetime import datetime
 
 import pytz
-from sqlalchemy import Boolean, Column, DateTime, Enum, ForeignKey, Integer, String, Text
+from sqlalchemy import Boolean, Column, DateTime, Enum, ForeignKey, Index, Integer, String, Text, text
 from sqlalchemy.orm import relationship
 
 from lib.database import Base
@@ -27,6 +27,14 @@ class CitCita(Base, UniversalMixin):
     # Nombre de la tabla
     __tablename__ = "cit_citas"
 
+    # Indices para consultar por oficina y rango de tiempo, las citas que ocupan lugar, las de un cliente por estado y por rango de creado
+    __table_args__ = (
+        Index("ix_cit_citas_oficina_id_inicio", "oficina_id", "inicio"),
+        Index("ix_cit_citas_oficina_id_inicio_ocupan", "oficina_id", "inicio", postgresql_where=text("estatus = 'A' AND estado <> 'CANCELO'")),
+        Index("ix_cit_citas_cit_cliente_id_estado_inicio", "cit_cliente_id", "estado", "inicio"),
+        Index("ix_cit_citas_creado", "creado"),
+    )
+
     # Clave primaria
     id = Column(Integer, primary_key=True)
 
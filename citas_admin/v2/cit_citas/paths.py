@@ -1,20 +1,28 @@
 """
 Cit Citas v2, rutas (paths)
 """
-from datetime import date
+from datetime import date, datetime
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from fastapi_pagination.ext.sqlalchemy import paginate
 from sqlalchemy.orm import Session
+import pytz
 
 from config.settings import Settings, get_settings
+from lib.campos import get_campos_from_str, paginate_campos
+from lib.coalescencia import coalescer
 from lib.database import get_db
 from lib.exceptions import CitasAnyError
 from lib.fastapi_pagination_custom_page import CustomPage, custom_page_success_false
 from lib.fastapi_pagination_custom_list import CustomList, ListResult, custom_list_success_false
+from lib.incluidos import Incluidos, get_modulos_incluidos
+from lib.lotes import LoteIn, entregar_lote, get_ids_from_str, validar_ids
 
 from .crud import (
+    CIT_CITAS_INCLUIDOS,
+    ESTADISTICAS_DIMENSIONES,
     cancel_cit_cita,
+    cancel_cit_citas_lote,
     create_cit_cita,
     get_cit_cita,
     get_cit_citas,
@@ -22,16 +30,26 @@ from .crud import (
     get_cit_citas_creados_por_dia,
     get_cit_citas_creados_por_dia_distrito,
     get_cit_citas_disponibles_cantidad,
+    get_cit_citas_estadisticas,
+    get_cit_citas_impacto,
+    get_cit_citas_lote,
+    get_cit_citas_ocupacion,
     get_cit_citas_pendientes,
 )
 from .schemas import (
     CitCitaIn,
     CitCitaOut,
     CitCitaCancelIn,
+    CitCitasCanceladasOut,
+    CitCitasCancelLoteIn,
     CitCitasCreadosPorDiaOut,
     CitCitasCreadosPorDiaDistritoOut,
     CitCitasAgendadasPorServicioOficinaOut,
     CitCitasDisponiblesCantidadOut,
+    CitCitasEstadisticaOut,
+    CitCitasImpactoIn,
+    CitCitasImpactoOut,
+    CitCitasOcupacionOut,
     OneCitCitaOut,
 )
 from ..permisos.models import Permiso
@@ -40,6 +58,8 @@ from ..usuarios.schemas import UsuarioInDB
 
 cit_citas = APIRouter(prefix="/v2/cit_citas", tags=["citas citas"])
 
+OCUPACION_CACHE_SEGUNDOS = 86400
+
 
 @cit_citas.get("", response_model=CustomPage[CitCitaOut])
 async def listado_citas(
@@ -57,14 +77,22 @@ async def listado_citas(
     estatus: str = None,
     oficina_id: int = None,
     oficina_clave: str = None,
+    fields: str = None,
+    include: str = None,
     current_user: UsuarioInDB = Depends(get_current_active_user),
     db: Session = Depends(get_db),
     settings: Settings = Depends(get_settings),
 ):
-    """Listado de citas"""
+    """Listado de citas, con fields=id,inicio,estado se entregan solo esos campos y con include=cit_cliente,cit_servicio,oficina se incluyen esos registros"""
     if current_user.permissions.get("CIT CITAS", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    # Para incluir otros registros tambien se necesita poder ver sus modulos
+    for modulo in get_modulos_incluidos(CIT_CITAS_INCLUIDOS, include) if include is not None else []:
+        if current_user.permissions.get(modulo, 0) < Permiso.VER:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
     try:
+        campos = get_campos_from_str(fields, CitCitaOut) if fields is not None else None
+        incluidos = Incluidos(db, CIT_CITAS_INCLUIDOS, include) if include is not None else None
         resultados = get_cit_citas(
             db=db,
             cit_cliente_id=cit_cliente_id,
@@ -82,9 +110,12 @@ async def listado_citas(
             oficina_id=oficina_id,
             oficina_clave=oficina_clave,
             settings=settings,
+            campos=campos if campos is None or incluidos is None else campos + incluidos.columnas,
         )
     except CitasAnyError as error:
         return custom_page_success_false(error)
+    if campos is not None or incluidos is not None:
+        return paginate_campos(resultados, CitCitaOut, campos, incluidos)
     return paginate(resultados)
 
 
@@ -102,17 +133,21 @@ async def cantidades_citas_agendadas_por_servicio_oficina(
     if current_user.permissions.get("CIT CITAS", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
     try:
-        resultados = get_cit_citas_agendadas_por_servicio_oficina(
-            db=db,
-            inicio=inicio,
-            inicio_desde=inicio_desde,
-            inicio_hasta=inicio_hasta,
-            settings=settings,
-            size=size,
+        resultados = await coalescer(
+            db,
+            ("cit_citas_agendadas_por_servicio_oficina", inicio, inicio_desde, inicio_hasta, size),
+            lambda sesion: get_cit_citas_agendadas_por_servicio_oficina(
+                db=sesion,
+                inicio=inicio,
+                inicio_desde=inicio_desde,
+                inicio_hasta=inicio_hasta,
+                settings=settings,
+                size=size,
+            ).all(),
         )
     except CitasAnyError as error:
         return custom_list_success_false(error)
-    items = [CitCitasAgendadasPorServicioOficinaOut(oficina=oficina, servicio=servicio, cantidad=cantidad) for oficina, servicio, cantidad in resultados.all()]
+    items = [CitCitasAgendadasPorServicioOficinaOut(oficina=oficina, servicio=servicio, cantidad=cantidad) for oficina, servicio, cantidad in resultados]
     total = sum(item.cantidad for item in items)
     result = ListResult(total=total, items=items, size=size)
     return CustomList(result=result)
@@ -138,6 +173,28 @@ async def cancelar_cita(
     return OneCitCitaOut.from_orm(cit_cita)
 
 
+@cit_citas.post("/cancelar_lote", response_model=CitCitasCanceladasOut)
+async def cancelar_citas_lote(
+    datos: CitCitasCancelLoteIn,
+    current_user: UsuarioInDB = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """Cancelar las citas pendientes de una oficina en un rango de tiempo o por sus ids, por ejemplo al cerrar una oficina"""
+    if current_user.permissions.get("CIT CITAS", 0) < Permiso.MODIFICAR:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    try:
+        canceladas = cancel_cit_citas_lote(
+            db=db,
+            oficina_id=datos.oficina_id,
+            inicio_desde=datos.inicio_desde,
+            inicio_hasta=datos.inicio_hasta,
+            cit_citas_ids=datos.ids,
+        )
+    except CitasAnyError as error:
+        return CitCitasCanceladasOut(success=False, message=str(error))
+    return CitCitasCanceladasOut(cantidad=len(canceladas), ids=canceladas)
+
+
 @cit_citas.get("/creados_por_dia", response_model=CustomList[CitCitasCreadosPorDiaOut])
 async def cantidades_creados_por_dia(
     creado: date = None,
@@ -153,18 +210,22 @@ async def cantidades_creados_por_dia(
     if current_user.permissions.get("CIT CITAS", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
     try:
-        resultados = get_cit_citas_creados_por_dia(
-            db=db,
-            creado=creado,
-            creado_desde=creado_desde,
-            creado_hasta=creado_hasta,
-            distrito_id=distrito_id,
-            settings=settings,
-            size=size,
+        resultados = await coalescer(
+            db,
+            ("cit_citas_creados_por_dia", creado, creado_desde, creado_hasta, distrito_id, size),
+            lambda sesion: get_cit_citas_creados_por_dia(
+                db=sesion,
+                creado=creado,
+                creado_desde=creado_desde,
+                creado_hasta=creado_hasta,
+                distrito_id=distrito_id,
+                settings=settings,
+                size=size,
+            ).all(),
         )
     except CitasAnyError as error:
         return custom_list_success_false(error)
-    items = [CitCitasCreadosPorDiaOut(creado=creado, cantidad=cantidad) for creado, cantidad in resultados.all()]
+    items = [CitCitasCreadosPorDiaOut(creado=creado, cantidad=cantidad) for creado, cantidad in resultados]
     total = sum(item.cantidad for item in items)
     result = ListResult(total=total, items=items, size=size)
     return CustomList(result=result)
@@ -184,22 +245,72 @@ async def cantidades_creados_por_dia_distrito(
     if current_user.permissions.get("CIT CITAS", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
     try:
-        resultados = get_cit_citas_creados_por_dia_distrito(
-            db=db,
-            creado=creado,
-            creado_desde=creado_desde,
-            creado_hasta=creado_hasta,
-            settings=settings,
-            size=size,
+        resultados = await coalescer(
+            db,
+            ("cit_citas_creados_por_dia_distrito", creado, creado_desde, creado_hasta, size),
+            lambda sesion: get_cit_citas_creados_por_dia_distrito(
+                db=sesion,
+                creado=creado,
+                creado_desde=creado_desde,
+                creado_hasta=creado_hasta,
+                settings=settings,
+                size=size,
+            ).all(),
         )
     except CitasAnyError as error:
         return custom_list_success_false(error)
-    items = [CitCitasCreadosPorDiaDistritoOut(creado=creado, distrito=distrito, cantidad=cantidad) for creado, distrito, cantidad in resultados.all()]
+    items = [CitCitasCreadosPorDiaDistritoOut(creado=creado, distrito=distrito, cantidad=cantidad) for creado, distrito, cantidad in resultados]
     total = sum(item.cantidad for item in items)
     result = ListResult(total=total, items=items, size=size)
     return CustomList(result=result)
 
 
+@cit_citas.get("/estadisticas", response_model=CustomList[CitCitasEstadisticaOut])
+async def cantidades_estadisticas(
+    dimensiones: str = None,
+    conjuntos: str = None,
+    estados: str = None,
+    fecha_de: str = "creado",
+    fecha: date = None,
+    fecha_desde: date = None,
+    fecha_hasta: date = None,
+    current_user: UsuarioInDB = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+    settings: Settings = Depends(get_settings),
+    size: int = 100,
+):
+    """Calcular las cantidades de citas por dia, distrito, oficina, servicio o estado con sus subtotales"""
+    if current_user.permissions.get("CIT CITAS", 0) < Permiso.VER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    try:
+        resultados = await coalescer(
+            db,
+            ("cit_citas_estadisticas", dimensiones, conjuntos, estados, fecha_de, fecha, fecha_desde, fecha_hasta, size),
+            lambda sesion: get_cit_citas_estadisticas(
+                db=sesion,
+                dimensiones=dimensiones,
+                conjuntos=conjuntos,
+                estados=estados,
+                fecha_de=fecha_de,
+                fecha=fecha,
+                fecha_desde=fecha_desde,
+                fecha_hasta=fecha_hasta,
+                settings=settings,
+                size=size,
+            ).all(),
+        )
+    except CitasAnyError as error:
+        return custom_list_success_false(error)
+    items = []
+    for resultado in resultados:
+        valores = resultado._asdict()
+        agrupadas = [dimension for dimension in ESTADISTICAS_DIMENSIONES if valores.get(f"{dimension}_agrupado") == 0]
+        items.append(CitCitasEstadisticaOut(dimensiones=agrupadas, cantidad=valores["cantidad"], **{dimension: valores[dimension] for dimension in agrupadas}))
+    total = sum(item.cantidad for item in items if len(item.dimensiones) == 0)
+    result = ListResult(total=total, items=items, size=size)
+    return CustomList(result=result)
+
+
 @cit_citas.get("/disponibles", response_model=CitCitasDisponiblesCantidadOut)
 async def cantidad_cit_citas_disponibles(
     cit_cliente_id: int = None,
@@ -225,6 +336,60 @@ async def cantidad_cit_citas_disponibles(
     return CitCitasDisponiblesCantidadOut(success=True, cantidad=cantidad)
 
 
+@cit_citas.post("/impacto", response_model=CitCitasImpactoOut)
+async def impacto_horas_bloqueadas_dias_inhabiles(
+    datos: CitCitasImpactoIn,
+    current_user: UsuarioInDB = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """Citas pendientes que afectarian las horas bloqueadas y los dias inhabiles propuestos, antes de agregarlos"""
+    if current_user.permissions.get("CIT CITAS", 0) < Permiso.VER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    try:
+        impacto = get_cit_citas_impacto(
+            db=db,
+            horas_bloqueadas=datos.horas_bloqueadas,
+            dias_inhabiles=datos.dias_inhabiles,
+        )
+    except CitasAnyError as error:
+        return CitCitasImpactoOut(success=False, message=str(error))
+    return impacto
+
+
+@cit_citas.get("/ocupacion", response_model=CitCitasOcupacionOut)
+async def ocupacion_oficinas(
+    response: Response,
+    fecha_desde: date,
+    fecha_hasta: date,
+    intervalo_minutos: int = 15,
+    distrito_id: int = None,
+    oficina_id: int = None,
+    current_user: UsuarioInDB = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+    settings: Settings = Depends(get_settings),
+):
+    """Mapa de calor de la ocupacion por oficina, fecha e intervalo de tiempo, comparable con el limite de personas"""
+    if current_user.permissions.get("CIT CITAS", 0) < Permiso.VER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    try:
+        ocupacion = get_cit_citas_ocupacion(
+            db=db,
+            fecha_desde=fecha_desde,
+            fecha_hasta=fecha_hasta,
+            intervalo_minutos=intervalo_minutos,
+            distrito_id=distrito_id,
+            oficina_id=oficina_id,
+        )
+    except CitasAnyError as error:
+        return CitCitasOcupacionOut(success=False, message=str(error))
+    # Los dias que ya pasaron no cambian, se pueden guardar en cache
+    if fecha_hasta < datetime.now(tz=pytz.timezone(settings.tz)).date():
+        response.headers["Cache-Control"] = f"private, max-age={OCUPACION_CACHE_SEGUNDOS}"
+    else:
+        response.headers["Cache-Control"] = "no-cache"
+    return ocupacion
+
+
 @cit_citas.get("/mis_citas", response_model=CustomPage[CitCitaOut])
 async def mis_citas(
     cit_cliente_id: int = None,
@@ -276,6 +441,38 @@ async def nueva_cita(
     return OneCitCitaOut.from_orm(cit_cita)
 
 
+@cit_citas.get("/lote", response_model=CustomList[OneCitCitaOut])
+async def lote_citas(
+    ids: str,
+    current_user: UsuarioInDB = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """Lote de citas a partir de sus ids separados por comas, en el mismo orden"""
+    if current_user.permissions.get("CIT CITAS", 0) < Permiso.VER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    try:
+        lote = get_cit_citas_lote(db, get_ids_from_str(ids))
+    except CitasAnyError as error:
+        return custom_list_success_false(error)
+    return entregar_lote(lote, OneCitCitaOut)
+
+
+@cit_citas.post("/lote", response_model=CustomList[OneCitCitaOut])
+async def lote_citas_post(
+    datos: LoteIn,
+    current_user: UsuarioInDB = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """Lote de citas a partir de sus ids, en el mismo orden"""
+    if current_user.permissions.get("CIT CITAS", 0) < Permiso.VER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    try:
+        lote = get_cit_citas_lote(db, validar_ids(datos.ids))
+    except CitasAnyError as error:
+        return custom_list_success_false(error)
+    return entregar_lote(lote, OneCitCitaOut)
+
+
 @cit_citas.get("/{cit_cita_id}", response_model=OneCitCitaOut)
 async def detalle_cita(
     cit_cita_id: int,
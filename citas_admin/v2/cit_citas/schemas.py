@@ -2,6 +2,8 @@
 Cit Citas v2, esquemas de pydantic
 """
 from datetime import date, datetime, time
+from typing import List
+
 from pydantic import BaseModel
 
 from lib.schemas_base import OneBaseOut
@@ -14,6 +16,15 @@ class CitCitaCancelIn(BaseModel):
     cit_cliente_id: int
 
 
+class CitCitasCancelLoteIn(BaseModel):
+    """Esquema para cancelar citas de una oficina en un rango de tiempo o por sus ids"""
+
+    oficina_id: int | None
+    inicio_desde: datetime | None
+    inicio_hasta: datetime | None
+    ids: List[int] | None
+
+
 class CitCitaIn(BaseModel):
     """Esquema para agendar citas"""
 
@@ -82,7 +93,90 @@ class CitCitasAgendadasPorServicioOficinaOut(BaseModel):
     cantidad: int
 
 
+class CitCitasEstadisticaOut(BaseModel):
+    """Esquema para entregar una cantidad de citas con las dimensiones por las que se agrupo, sin dimensiones es el total"""
+
+    dimensiones: List[str]
+    dia: date | None
+    distrito: str | None
+    oficina: str | None
+    servicio: str | None
+    estado: str | None
+    cantidad: int
+
+
 class CitCitasDisponiblesCantidadOut(OneBaseOut):
     """Esquema para entregar la cantidad de citas disponibles"""
 
     cantidad: int | None
+
+
+class CitCitasCanceladasOut(OneBaseOut):
+    """Esquema para entregar las citas canceladas en lote"""
+
+    cantidad: int | None
+    ids: List[int] | None
+
+
+class CitHoraBloqueadaPropuestaIn(BaseModel):
+    """Esquema para recibir una hora bloqueada propuesta"""
+
+    oficina_id: int
+    fecha: date
+    inicio: time
+    termino: time
+
+
+class CitCitasImpactoIn(BaseModel):
+    """Esquema para recibir las horas bloqueadas y los dias inhabiles propuestos"""
+
+    horas_bloqueadas: List[CitHoraBloqueadaPropuestaIn] = []
+    dias_inhabiles: List[date] = []
+
+
+class CitCitaImpactoOut(BaseModel):
+    """Esquema para entregar una cita afectada, con el indice de la hora bloqueada o el dia inhabil que la afecta"""
+
+    id: int
+    oficina_id: int
+    cit_cliente_id: int
+    inicio: datetime
+    termino: datetime
+    hora_bloqueada: int | None
+    dia_inhabil: date | None
+
+
+class CitCitasImpactoOficinaOut(BaseModel):
+    """Esquema para entregar la cantidad de citas afectadas de una oficina"""
+
+    oficina_id: int
+    oficina_clave: str
+    cantidad: int
+
+
+class CitCitasImpactoOut(OneBaseOut):
+    """Esquema para entregar las citas pendientes que afectarian las horas bloqueadas y los dias inhabiles propuestos"""
+
+    cantidad: int | None
+    oficinas: List[CitCitasImpactoOficinaOut] | None
+    citas: List[CitCitaImpactoOut] | None
+
+
+class CitCitasOcupacionOficinaOut(BaseModel):
+    """Esquema para entregar la matriz de ocupacion de una oficina, un renglon por fecha y una columna por hora"""
+
+    oficina_id: int
+    oficina_clave: str
+    limite_personas: int
+    horas: List[time]
+    ocupacion: List[List[int]]
+
+
+class CitCitasOcupacionOut(OneBaseOut):
+    """Esquema para entregar la ocupacion por oficina, fecha y hora en columnas"""
+
+    fecha_desde: date | None
+    fecha_hasta: date | None
+    intervalo_minutos: int | None
+    fechas: List[date] | None
+    oficinas: List[CitCitasOcupacionOficinaOut] | None
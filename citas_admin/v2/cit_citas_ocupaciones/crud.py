@@ -0,0 +1,132 @@
+"""
+Cit Citas Ocupaciones v2, CRUD (create, read, update, and delete)
+
+Contadores de las citas que ocupan lugar por oficina y hora de inicio, se actualizan en la misma
+transaccion que crea o cancela la cita. Las citas que se crean o cancelan fuera de esta API no los
+actualizan, use verificar_ocupaciones para encontrar diferencias y reconstruir_ocupaciones para corregirlas.
+
+Cada cambio se avisa en el canal cit_citas_ocupaciones con la clave oficina_id/fecha y la nueva cantidad,
+y en la misma transaccion se actualizan los lugares de las disponibilidades precalculadas, con el bloqueo
+de la oficina en la fecha para que no se encimen con las horas que se estan guardando.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import Integer, and_, column, delete, func, select, text, update, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from lib.escucha import avisar
+
+from .models import CitCitaOcupacion
+from ..cit_citas.models import CitCita
+from ..cit_disponibilidades.crud import actualizar_cit_disponibilidades_lugares, bloquear_cit_disponibilidades, recalcular_cit_disponibilidades_lugares
+
+CANAL_OCUPACIONES = "cit_citas_ocupaciones"
+
+
+def get_clave(oficina_id: int, fecha: date) -> str:
+    """Clave de los avisos de una oficina en una fecha"""
+    return f"{oficina_id}/{fecha.isoformat()}"
+
+
+def avisar_ocupaciones(db: Session, ocupaciones: Iterable[Tuple[int, datetime, int]]):
+    """Avisar las nuevas cantidades, se entregan al hacer commit"""
+    avisar(db, CANAL_OCUPACIONES, [(get_clave(oficina_id, inicio.date()), {"inicio": inicio.isoformat(), "cantidad": cantidad}) for oficina_id, inicio, cantidad in ocupaciones])
+
+
+def get_cit_citas_ocupaciones_cantidades(db: Session, oficina_id: int, fecha: date) -> Dict[datetime, int]:
+    """Consultar las cantidades de citas de una oficina en una fecha, entrega un diccionario de inicio y cantidad"""
+    desde = datetime.combine(fecha, time.min)
+    consulta = db.query(CitCitaOcupacion.inicio, CitCitaOcupacion.cantidad).filter(CitCitaOcupacion.oficina_id == oficina_id).filter(CitCitaOcupacion.inicio >= desde).filter(CitCitaOcupacion.inicio < desde + timedelta(days=1))
+    return dict(consulta.all())
+
+
+def ocupar_lugar(db: Session, oficina_id: int, inicio: datetime, limite_personas: int) -> bool:
+    """Incrementar la cantidad solo si no ha llegado al limite, entrega falso si ya no hay lugar"""
+    if limite_personas <= 0:
+        return False
+    bloquear_cit_disponibilidades(db, [(oficina_id, inicio.date())])
+    sentencia = insert(CitCitaOcupacion).values(oficina_id=oficina_id, inicio=inicio, cantidad=1)
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=[CitCitaOcupacion.oficina_id, CitCitaOcupacion.inicio],
+        set_={"cantidad": CitCitaOcupacion.cantidad + 1},
+        where=CitCitaOcupacion.cantidad < limite_personas,
+    ).returning(CitCitaOcupacion.cantidad)
+    cantidad = db.execute(sentencia).scalar()
+    if cantidad is None:
+        return False
+    actualizar_cit_disponibilidades_lugares(db, [(oficina_id, inicio, cantidad)])
+    avisar_ocupaciones(db, [(oficina_id, inicio, cantidad)])
+    return True
+
+
+def liberar_lugares(db: Session, lugares: Iterable[Tuple[int, datetime]]):
+    """Decrementar las cantidades de los lugares de las citas canceladas, un lugar por cita, con una sola sentencia"""
+    cantidades = {}
+    for lugar in lugares:
+        cantidades[lugar] = cantidades.get(lugar, 0) + 1
+    if len(cantidades) == 0:
+        return
+    bloquear_cit_disponibilidades(db, [(oficina_id, inicio.date()) for oficina_id, inicio in cantidades])
+    liberados = values(column("oficina_id", Integer), column("inicio", CitCitaOcupacion.inicio.type), column("cantidad", Integer), name="liberados").data([(oficina_id, inicio, cantidad) for (oficina_id, inicio), cantidad in cantidades.items()])
+    ocupaciones = db.execute(
+        update(CitCitaOcupacion)
+        .where(and_(CitCitaOcupacion.oficina_id == liberados.c.oficina_id, CitCitaOcupacion.inicio == liberados.c.inicio))
+        .values(cantidad=func.greatest(CitCitaOcupacion.cantidad - liberados.c.cantidad, 0))
+        .returning(CitCitaOcupacion.oficina_id, CitCitaOcupacion.inicio, CitCitaOcupacion.cantidad)
+        .execution_options(synchronize_session=False)
+    ).all()
+    actualizar_cit_disponibilidades_lugares(db, ocupaciones)
+    avisar_ocupaciones(db, ocupaciones)
+
+
+def contar_citas(desde: datetime, hasta: datetime, oficina_id: int = None):
+    """Consulta que cuenta las citas que ocupan lugar, agrupadas por oficina e inicio"""
+    consulta = (
+        select(CitCita.oficina_id, CitCita.inicio, func.count(CitCita.id).label("cantidad"))
+        .filter(CitCita.inicio >= desde)
+        .filter(CitCita.inicio < hasta)
+        .filter(CitCita.estado != "CANCELO")
+        .filter(CitCita.estatus == "A")
+        .group_by(CitCita.oficina_id, CitCita.inicio)
+    )
+    if oficina_id is not None:
+        consulta = consulta.filter(CitCita.oficina_id == oficina_id)
+    return consulta
+
+
+def verificar_ocupaciones(db: Session, desde: datetime, hasta: datetime, oficina_id: int = None) -> List[Tuple[int, datetime, int, int]]:
+    """Comparar los contadores con las citas, entrega oficina, inicio, cantidad guardada y cantidad real de los que difieren"""
+    citas = contar_citas(desde, hasta, oficina_id).subquery("citas")
+    ocupaciones = select(CitCitaOcupacion).filter(CitCitaOcupacion.inicio >= desde).filter(CitCitaOcupacion.inicio < hasta)
+    if oficina_id is not None:
+        ocupaciones = ocupaciones.filter(CitCitaOcupacion.oficina_id == oficina_id)
+    ocupaciones = ocupaciones.subquery("ocupaciones")
+    guardada = func.coalesce(ocupaciones.c.cantidad, 0)
+    real = func.coalesce(citas.c.cantidad, 0)
+    consulta = (
+        select(
+            func.coalesce(ocupaciones.c.oficina_id, citas.c.oficina_id).label("oficina_id"),
+            func.coalesce(ocupaciones.c.inicio, citas.c.inicio).label("inicio"),
+            guardada.label("guardada"),
+            real.label("real"),
+        )
+        .select_from(ocupaciones.outerjoin(citas, and_(ocupaciones.c.oficina_id == citas.c.oficina_id, ocupaciones.c.inicio == citas.c.inicio), full=True))
+        .filter(guardada != real)
+        .order_by("oficina_id", "inicio")
+    )
+    return [tuple(renglon) for renglon in db.execute(consulta).all()]
+
+
+def reconstruir_ocupaciones(db: Session, desde: datetime, hasta: datetime, oficina_id: int = None) -> int:
+    """Volver a contar las citas en el rango, bloquea los contadores mientras tanto, entrega la cantidad de contadores"""
+    db.execute(text(f"LOCK TABLE {CitCitaOcupacion.__tablename__} IN SHARE ROW EXCLUSIVE MODE"))  # Las citas nuevas esperan a que termine
+    borrar = delete(CitCitaOcupacion).where(CitCitaOcupacion.inicio >= desde).where(CitCitaOcupacion.inicio < hasta)
+    if oficina_id is not None:
+        borrar = borrar.where(CitCitaOcupacion.oficina_id == oficina_id)
+    db.execute(borrar)
+    resultado = db.execute(insert(CitCitaOcupacion).from_select(["oficina_id", "inicio", "cantidad"], contar_citas(desde, hasta, oficina_id)))
+    recalcular_cit_disponibilidades_lugares(db, desde.date(), hasta.date(), oficina_id)
+    db.commit()
+    return resultado.rowcount
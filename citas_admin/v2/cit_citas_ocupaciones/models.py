@@ -0,0 +1,27 @@
+"""
+Cit Citas Ocupaciones v2, modelos
+"""
+from sqlalchemy import CheckConstraint, Column, DateTime, ForeignKey, Integer
+
+from lib.database import Base
+
+
+class CitCitaOcupacion(Base):
+    """CitCitaOcupacion, cantidad de citas que ocupan lugar en una oficina a una hora"""
+
+    # Nombre de la tabla
+    __tablename__ = "cit_citas_ocupaciones"
+
+    # La cantidad no puede ser negativa
+    __table_args__ = (CheckConstraint("cantidad >= 0", name="cit_citas_ocupaciones_cantidad_check"),)
+
+    # Clave primaria
+    oficina_id = Column(Integer, ForeignKey("oficinas.id"), primary_key=True)
+    inicio = Column(DateTime(), primary_key=True)
+
+    # Columnas
+    cantidad = Column(Integer(), nullable=False, default=0)
+
+    def __repr__(self):
+        """Representación"""
+        return f"<CitCitaOcupacion {self.oficina_id} {self.inicio} {self.cantidad}>"
@@ -2,18 +2,43 @@
 Cit Clientes v2, CRUD (create, read, update, and delete)
 """
 from datetime import date, datetime, timedelta
-from typing import Any
+from typing import Any, List, Tuple
 
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
 import pytz
 
 from config.settings import Settings
+from lib.campos import MapaCampos, cargar_campos
 from lib.exceptions import CitasIsDeletedError, CitasNotExistsError, CitasNotValidParamError
+from lib.lotes import consultar_lote
 from lib.safe_string import safe_curp, safe_email, safe_string, safe_telefono
 
 from .models import CitCliente
 
+# Columnas que necesita cada campo de CitClienteOut
+CIT_CLIENTES_CAMPOS: MapaCampos = {
+    "id": [CitCliente.id],
+    "nombres": [CitCliente.nombres],
+    "apellido_primero": [CitCliente.apellido_primero],
+    "apellido_segundo": [CitCliente.apellido_segundo],
+    "nombre": [CitCliente.nombres, CitCliente.apellido_primero, CitCliente.apellido_segundo],
+    "curp": [CitCliente.curp],
+    "telefono": [CitCliente.telefono],
+    "email": [CitCliente.email],
+    "contrasena_md5": [CitCliente.contrasena_md5],
+    "contrasena_sha256": [CitCliente.contrasena_sha256],
+    "renovacion": [CitCliente.renovacion],
+    "limite_citas_pendientes": [CitCliente.limite_citas_pendientes],
+    "autoriza_mensajes": [CitCliente.autoriza_mensajes],
+    "enviar_boletin": [CitCliente.enviar_boletin],
+    "es_adulto_mayor": [CitCliente.es_adulto_mayor],
+    "es_mujer": [CitCliente.es_mujer],
+    "es_identidad": [CitCliente.es_identidad],
+    "es_discapacidad": [CitCliente.es_discapacidad],
+    "creado": [CitCliente.creado],
+}
+
 
 def get_cit_clientes(
     db: Session,
@@ -31,8 +56,9 @@ def get_cit_clientes(
     nombres: str = None,
     telefono: str = None,
     tiene_contrasena_sha256: bool = None,
+    campos: List[str] = None,
 ) -> Any:
-    """Consultar los clientes activos"""
+    """Consultar los clientes activos, con campos solo se cargan las columnas que necesitan"""
 
     # Zonas horarias
     local_huso_horario = pytz.timezone(settings.tz)
@@ -104,6 +130,10 @@ def get_cit_clientes(
         else:
             consulta = consulta.filter(CitCliente.contrasena_sha256 == "")
 
+    # Cargar solo los campos pedidos
+    if campos is not None:
+        consulta = cargar_campos(consulta, CIT_CLIENTES_CAMPOS, campos)
+
     # Entregar
     return consulta.order_by(CitCliente.id.desc())
 
@@ -136,6 +166,14 @@ def get_cit_cliente(
     return cit_cliente
 
 
+def get_cit_clientes_lote(
+    db: Session,
+    cit_clientes_ids: List[int],
+) -> List[Tuple[int, Any]]:
+    """Consultar un lote de clientes por sus ids"""
+    return consultar_lote(db.query(CitCliente), CitCliente, cit_clientes_ids, "cliente")
+
+
 def get_cit_clientes_creados_por_dia(
     db: Session,
     settings: Settings,
@@ -1,7 +1,7 @@
 """
 Cit Clientes v2, modelos
 """
-from sqlalchemy import Boolean, Column, Date, Integer, String
+from sqlalchemy import Boolean, Column, Date, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from lib.database import Base
@@ -14,6 +14,9 @@ class CitCliente(Base, UniversalMixin):
     # Nombre de la tabla
     __tablename__ = "cit_clientes"
 
+    # Indice para consultar por rango de creado
+    __table_args__ = (Index("ix_cit_clientes_creado", "creado"),)
+
     # Clave primaria
     id = Column(Integer, primary_key=True)
 
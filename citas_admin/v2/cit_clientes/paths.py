@@ -8,12 +8,15 @@ from fastapi_pagination.ext.sqlalchemy import paginate
 from sqlalchemy.orm import Session
 
 from config.settings import Settings, get_settings
+from lib.campos import get_campos_from_str, paginate_campos
+from lib.coalescencia import coalescer
 from lib.database import get_db
 from lib.exceptions import CitasAnyError
 from lib.fastapi_pagination_custom_page import CustomPage, custom_page_success_false
 from lib.fastapi_pagination_custom_list import CustomList, ListResult, custom_list_success_false
+from lib.lotes import LoteIn, entregar_lote, get_ids_from_str, validar_ids
 
-from .crud import get_cit_clientes, get_cit_cliente, get_cit_clientes_creados_por_dia
+from .crud import get_cit_clientes, get_cit_cliente, get_cit_clientes_creados_por_dia, get_cit_clientes_lote
 from .schemas import CitClienteOut, CitClienteCreadosPorDiaOut, OneCitClienteOut
 from ..permisos.models import Permiso
 from ..usuarios.authentications import get_current_active_user
@@ -37,14 +40,16 @@ async def listado_clientes(
     nombres: str = None,
     telefono: str = None,
     tiene_contrasena_sha256: bool = None,
+    fields: str = None,
     current_user: UsuarioInDB = Depends(get_current_active_user),
     db: Session = Depends(get_db),
     settings: Settings = Depends(get_settings),
 ):
-    """Listado de clientes"""
+    """Listado de clientes, con fields=id,curp,email se entregan solo esos campos"""
     if current_user.permissions.get("CIT CLIENTES", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
     try:
+        campos = get_campos_from_str(fields, CitClienteOut) if fields is not None else None
         resultados = get_cit_clientes(
             db=db,
             apellido_primero=apellido_primero,
@@ -61,9 +66,12 @@ async def listado_clientes(
             settings=settings,
             telefono=telefono,
             tiene_contrasena_sha256=tiene_contrasena_sha256,
+            campos=campos,
         )
     except CitasAnyError as error:
         return custom_page_success_false(error)
+    if campos is not None:
+        return paginate_campos(resultados, CitClienteOut, campos)
     return paginate(resultados)
 
 
@@ -81,17 +89,21 @@ async def cantidades_clientes_creados_por_dia(
     if current_user.permissions.get("CIT CLIENTES", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
     try:
-        resultados = get_cit_clientes_creados_por_dia(
-            db=db,
-            creado=creado,
-            creado_desde=creado_desde,
-            creado_hasta=creado_hasta,
-            settings=settings,
-            size=size,
+        resultados = await coalescer(
+            db,
+            ("cit_clientes_creados_por_dia", creado, creado_desde, creado_hasta, size),
+            lambda sesion: get_cit_clientes_creados_por_dia(
+                db=sesion,
+                creado=creado,
+                creado_desde=creado_desde,
+                creado_hasta=creado_hasta,
+                settings=settings,
+                size=size,
+            ).all(),
         )
     except CitasAnyError as error:
         return custom_list_success_false(error)
-    items = [CitClienteCreadosPorDiaOut(creado=creado, cantidad=cantidad) for creado, cantidad in resultados.all()]
+    items = [CitClienteCreadosPorDiaOut(creado=creado, cantidad=cantidad) for creado, cantidad in resultados]
     total = sum(item.cantidad for item in items)
     result = ListResult(total=total, items=items, size=size)
     return CustomList(result=result)
@@ -120,6 +132,38 @@ async def perfil_cliente(
     return OneCitClienteOut.from_orm(cit_cliente)
 
 
+@cit_clientes.get("/lote", response_model=CustomList[OneCitClienteOut])
+async def lote_clientes(
+    ids: str,
+    current_user: UsuarioInDB = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """Lote de clientes a partir de sus ids separados por comas, en el mismo orden"""
+    if current_user.permissions.get("CIT CLIENTES", 0) < Permiso.VER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    try:
+        lote = get_cit_clientes_lote(db, get_ids_from_str(ids))
+    except CitasAnyError as error:
+        return custom_list_success_false(error)
+    return entregar_lote(lote, OneCitClienteOut)
+
+
+@cit_clientes.post("/lote", response_model=CustomList[OneCitClienteOut])
+async def lote_clientes_post(
+    datos: LoteIn,
+    current_user: UsuarioInDB = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """Lote de clientes a partir de sus ids, en el mismo orden"""
+    if current_user.permissions.get("CIT CLIENTES", 0) < Permiso.VER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    try:
+        lote = get_cit_clientes_lote(db, validar_ids(datos.ids))
+    except CitasAnyError as error:
+        return custom_list_success_false(error)
+    return entregar_lote(lote, OneCitClienteOut)
+
+
 @cit_clientes.get("/{cit_cliente_id}", response_model=OneCitClienteOut)
 async def detalle_cliente(
     cit_cliente_id: int,
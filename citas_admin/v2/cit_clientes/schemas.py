@@ -36,6 +36,33 @@ class CitClienteOut(BaseModel):
         orm_mode = True
 
 
+class CitClienteIncluidoOut(BaseModel):
+    """Esquema para incluir clientes en otros listados, sin las contraseñas"""
+
+    id: int | None
+    nombres: str | None
+    apellido_primero: str | None
+    apellido_segundo: str | None
+    nombre: str | None
+    curp: str | None
+    telefono: str | None
+    email: str | None
+    renovacion: date | None
+    limite_citas_pendientes: int | None
+    autoriza_mensajes: bool | None
+    enviar_boletin: bool | None
+    es_adulto_mayor: bool | None
+    es_mujer: bool | None
+    es_identidad: bool | None
+    es_discapacidad: bool | None
+    creado: datetime | None
+
+    class Config:
+        """SQLAlchemy config"""
+
+        orm_mode = True
+
+
 class OneCitClienteOut(CitClienteOut, OneBaseOut):
     """Esquema para entregar un cliente"""
 
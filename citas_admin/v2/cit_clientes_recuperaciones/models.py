@@ -1,7 +1,7 @@
 """
 Cit Clientes Recuperaciones v2, modelos
 """
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from lib.database import Base
@@ -14,6 +14,9 @@ class CitClienteRecuperacion(Base, UniversalMixin):
     # Nombre de la tabla
     __tablename__ = "cit_clientes_recuperaciones"
 
+    # Indice para consultar por rango de creado
+    __table_args__ = (Index("ix_cit_clientes_recuperaciones_creado", "creado"),)
+
     # Clave primaria
     id = Column(Integer, primary_key=True)
 
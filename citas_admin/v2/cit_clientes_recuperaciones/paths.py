@@ -8,6 +8,7 @@ from fastapi_pagination.ext.sqlalchemy import paginate
 from sqlalchemy.orm import Session
 
 from config.settings import Settings, get_settings
+from lib.coalescencia import coalescer
 from lib.database import get_db
 from lib.exceptions import CitasAnyError
 from lib.fastapi_pagination_custom_page import CustomPage, custom_page_success_false
@@ -69,17 +70,21 @@ async def cantidades_recuperaciones_creados_por_dia(
     if current_user.permissions.get("CIT CLIENTES RECUPERACIONES", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
     try:
-        resultados = get_cit_clientes_recuperaciones_creados_por_dia(
-            db=db,
-            creado=creado,
-            creado_desde=creado_desde,
-            creado_hasta=creado_hasta,
-            settings=settings,
-            size=size,
+        resultados = await coalescer(
+            db,
+            ("cit_clientes_recuperaciones_creados_por_dia", creado, creado_desde, creado_hasta, size),
+            lambda sesion: get_cit_clientes_recuperaciones_creados_por_dia(
+                db=sesion,
+                creado=creado,
+                creado_desde=creado_desde,
+                creado_hasta=creado_hasta,
+                settings=settings,
+                size=size,
+            ).all(),
         )
     except CitasAnyError as error:
         return custom_list_success_false(error)
-    items = [CitClientesRecuperacionesCreadosPorDiaOut(creado=creado, cantidad=cantidad) for creado, cantidad in resultados.all()]
+    items = [CitClientesRecuperacionesCreadosPorDiaOut(creado=creado, cantidad=cantidad) for creado, cantidad in resultados]
     total = sum(item.cantidad for item in items)
     result = ListResult(total=total, items=items, size=size)
     return CustomList(result=result)
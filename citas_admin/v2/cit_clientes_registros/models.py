@@ -1,7 +1,7 @@
 """
 Cit Clientes Registros v2, modelos
 """
-from sqlalchemy import Boolean, Column, DateTime, Integer, String
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, String
 
 from lib.database import Base
 from lib.universal_mixin import UniversalMixin
@@ -13,6 +13,9 @@ class CitClienteRegistro(Base, UniversalMixin):
     # Nombre de la tabla
     __tablename__ = "cit_clientes_registros"
 
+    # Indice para consultar por rango de creado
+    __table_args__ = (Index("ix_cit_clientes_registros_creado", "creado"),)
+
     # Clave primaria
     id = Column(Integer, primary_key=True)
 
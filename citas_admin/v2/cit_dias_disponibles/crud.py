@@ -9,7 +9,7 @@ import pytz
 
 from config.settings import Settings
 
-from ..cit_dias_inhabiles.crud import get_cit_dias_inhabiles
+from ..cit_dias_inhabiles.crud import get_cit_dias_inhabiles_fechas
 
 QUITAR_PRIMER_DIA_DESPUES_HORAS = 14
 
@@ -27,10 +27,7 @@ def get_cit_dias_disponibles(
     servidor_huso_horario = pytz.utc
 
     # Consultar dias inhabiles
-    fechas_inhabiles = []
-    cit_dias_inhabiles = get_cit_dias_inhabiles(db).all()
-    if len(cit_dias_inhabiles) > 0:
-        fechas_inhabiles = [item.fecha for item in cit_dias_inhabiles]
+    fechas_inhabiles = get_cit_dias_inhabiles_fechas(db, date.today())
 
     # Agregar cada dia hasta el limite a partir de manana
     for fecha in (date.today() + timedelta(n) for n in range(1, size)):
@@ -79,10 +76,7 @@ def get_cit_dia_disponible(db: Session) -> Any:
     """Obtener el proximo dia disponible, por ejemplo, si hoy es viernes y el lunes es dia inhabil, entrega el martes"""
 
     # Consultar dias inhabiles
-    fechas_inhabiles = []
-    cit_dias_inhabiles = get_cit_dias_inhabiles(db).all()
-    if len(cit_dias_inhabiles) > 0:
-        fechas_inhabiles = [item.fecha for item in cit_dias_inhabiles]
+    fechas_inhabiles = get_cit_dias_inhabiles_fechas(db, date.today())
 
     # Determinar la fecha, primero se usa el dia de mañana
     fecha = date.today() + timedelta(1)
@@ -5,6 +5,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from config.settings import Settings, get_settings
+from lib.coalescencia import coalescer
 from lib.database import get_db
 from lib.exceptions import CitasAnyError
 from lib.fastapi_pagination_custom_list import CustomList, ListResult, custom_list_success_false
@@ -29,10 +30,14 @@ async def listado_dias_disponibles(
     if current_user.permissions.get("CIT DIAS INHABILES", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
     try:
-        resultados = get_cit_dias_disponibles(
-            db=db,
-            settings=settings,
-            size=size,
+        resultados = await coalescer(
+            db,
+            ("cit_dias_disponibles", size),
+            lambda sesion: get_cit_dias_disponibles(
+                db=sesion,
+                settings=settings,
+                size=size,
+            ),
         )
     except CitasAnyError as error:
         return custom_list_success_false(error)
@@ -2,10 +2,11 @@
 Cit Dias Inhabiles v2, CRUD (create, read, update, and delete)
 """
 from datetime import date
-from typing import Any
+from typing import Any, Tuple
 from sqlalchemy.orm import Session
 
 from lib.exceptions import CitasIsDeletedError, CitasNotExistsError
+from lib.invalidacion import cache_invalidable
 
 from .models import CitDiaInhabil
 
@@ -24,6 +25,16 @@ def get_cit_dias_inhabiles(
     return consulta.order_by(CitDiaInhabil.fecha)
 
 
+@cache_invalidable("cit_dias_inhabiles")
+def get_cit_dias_inhabiles_fechas(
+    db: Session,
+    desde: date,
+) -> Tuple[date, ...]:
+    """Consultar las fechas de los dias inhabiles activos desde una fecha, en cache hasta que cambie la tabla"""
+    consulta = db.query(CitDiaInhabil.fecha).filter_by(estatus="A").filter(CitDiaInhabil.fecha >= desde)
+    return tuple(fecha for fecha, in consulta.order_by(CitDiaInhabil.fecha))
+
+
 def get_cit_dia_inhabil(
     db: Session,
     cit_dia_inhabil_id: int,
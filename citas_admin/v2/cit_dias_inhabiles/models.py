@@ -1,7 +1,7 @@
 """
 Cit Dias Inhabiles v2, modelos
 """
-from sqlalchemy import Column, Date, Integer, String
+from sqlalchemy import Column, Date, Index, Integer, String
 
 from lib.database import Base
 from lib.universal_mixin import UniversalMixin
@@ -13,6 +13,9 @@ class CitDiaInhabil(Base, UniversalMixin):
     # Nombre de la tabla
     __tablename__ = "cit_dias_inhabiles"
 
+    # Indice para consultar por fecha
+    __table_args__ = (Index("ix_cit_dias_inhabiles_fecha", "fecha"),)
+
     # Clave primaria
     id = Column(Integer, primary_key=True)
 
@@ -0,0 +1,242 @@
+"""
+Cit Disponibilidades v2, CRUD (create, read, update, and delete)
+
+Horas en que se puede agendar cada servicio en cada oficina con los lugares que quedan, precalculadas para
+los dias disponibles, asi las horas disponibles se leen con un solo recorrido del indice. Los lugares se actualizan
+en la misma transaccion que ocupa o libera un lugar. Los disparadores de la migracion 5d8a2b6e4c31 borran
+las horas que dejan de valer cuando cambian las horas bloqueadas, los dias inhabiles, los horarios y lugares
+de las oficinas o los horarios y duraciones de los servicios. Lo que falta se calcula y se guarda en la primera
+consulta, y cada noche extender_cit_disponibilidades agrega los dias nuevos y verificar_cit_disponibilidades
+lo compara con el calculo en vivo.
+
+Guardar, ocupar y liberar lugares toman el bloqueo de la oficina en la fecha hasta terminar su transaccion,
+asi los lugares que se guardan se calculan con los contadores ya confirmados y ninguna cita queda fuera de ellos.
+"""
+from datetime import date, datetime, time, timedelta
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Date, Integer, Time, and_, column, delete, func, select, update, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from lib.exceptions import CitasNotValidParamError
+
+from .models import CitDisponibilidad
+from ..cit_citas_ocupaciones.models import CitCitaOcupacion
+from ..cit_horas_bloqueadas.models import CitHoraBloqueada
+from ..cit_oficinas_servicios.models import CitOficinaServicio
+from ..cit_servicios.models import CitServicio
+from ..oficinas.models import Oficina
+
+# Servicio, fecha y las horas con sus lugares
+Disponibilidades = Dict[Tuple[int, date], List[Tuple[time, int]]]
+
+BLOQUEO_DISPONIBILIDADES = 2  # Primer entero de pg_advisory_xact_lock para los bloqueos por oficina y fecha, el 1 es de los clientes
+
+
+def calcular_tiempos(fecha: date, oficina: Oficina, cit_servicio: CitServicio, horas_bloqueadas: Iterable[Tuple[time, time]]) -> List[datetime]:
+    """Calcular los tiempos en que se puede agendar el servicio en la oficina en la fecha, sin las horas bloqueadas"""
+
+    # Tomar los tiempos de inicio y termino de la oficina
+    apertura = oficina.apertura
+    cierre = oficina.cierre
+
+    # Si el servicio tiene un tiempo desde
+    if cit_servicio.desde and apertura < cit_servicio.desde:
+        apertura = cit_servicio.desde
+
+    # Si el servicio tiene un tiempo hasta
+    if cit_servicio.hasta and cierre > cit_servicio.hasta:
+        cierre = cit_servicio.hasta
+
+    # Definir los tiempos de inicio, de final y el timedelta de la duracion
+    tiempo_inicial = datetime(year=fecha.year, month=fecha.month, day=fecha.day, hour=apertura.hour, minute=apertura.minute)
+    tiempo_final = datetime(year=fecha.year, month=fecha.month, day=fecha.day, hour=cierre.hour, minute=cierre.minute)
+    duracion = timedelta(hours=cit_servicio.duracion.hour, minutes=cit_servicio.duracion.minute)
+    if duracion <= timedelta(0):
+        raise CitasNotValidParamError("No es valida la duracion del servicio")
+
+    # Convertir las horas bloqueadas a datetime para compararlas
+    tiempos_bloqueados = []
+    for inicio, termino in horas_bloqueadas:
+        tiempo_bloqueado_inicia = datetime(year=fecha.year, month=fecha.month, day=fecha.day, hour=inicio.hour, minute=inicio.minute)
+        tiempo_bloqueado_termina = datetime(year=fecha.year, month=fecha.month, day=fecha.day, hour=termino.hour, minute=termino.minute) - timedelta(minutes=1)
+        tiempos_bloqueados.append((tiempo_bloqueado_inicia, tiempo_bloqueado_termina))
+
+    # Bucle por los intervalos, sin las horas bloqueadas
+    listado = []
+    tiempo = tiempo_inicial
+    while tiempo < tiempo_final:
+        if not any(inicia <= tiempo <= termina for inicia, termina in tiempos_bloqueados):
+            listado.append(tiempo)
+        tiempo = tiempo + duracion
+
+    # Entregar
+    return listado
+
+
+def bloquear_cit_disponibilidades(db: Session, claves: Iterable[Tuple[int, date]]):
+    """Bloquear las oficinas en las fechas hasta terminar la transaccion, para que guardar, ocupar y liberar lugares no se encimen"""
+    # El segundo entero es el crc32 de oficina_id/fecha, en orden para que dos transacciones no se esperen una a la otra
+    for bloqueo in sorted({zlib.crc32(f"{oficina_id}/{fecha.isoformat()}".encode()) & 0x7FFFFFFF for oficina_id, fecha in claves}):
+        db.execute(select(func.pg_advisory_xact_lock(BLOQUEO_DISPONIBILIDADES, bloqueo)))
+
+
+def get_cit_disponibilidades(
+    db: Session,
+    oficina_id: int,
+    cit_servicio_id: int,
+    fecha: date,
+) -> Any:
+    """Consultar las horas precalculadas y sus lugares del servicio en la oficina en la fecha"""
+    consulta = db.query(CitDisponibilidad.hora, CitDisponibilidad.lugares)
+    consulta = consulta.filter_by(oficina_id=oficina_id, cit_servicio_id=cit_servicio_id, fecha=fecha)
+    return consulta.order_by(CitDisponibilidad.hora)
+
+
+def guardar_cit_disponibilidades(
+    db: Session,
+    oficina: Oficina,
+    cit_servicio_id: int,
+    fecha: date,
+    tiempos: List[datetime],
+) -> List[Tuple[time, int]]:
+    """Guardar las horas calculadas con los lugares que dejan los contadores, entrega las horas y los lugares"""
+    if len(tiempos) == 0:
+        return []
+    # En un SAVEPOINT de la transaccion de la sesion, quien la use hace el commit
+    with db.begin_nested():
+        # Con el bloqueo, las citas que se crean o cancelan esperan y la consulta de los contadores ve las ya confirmadas
+        bloquear_cit_disponibilidades(db, [(oficina.id, fecha)])
+        desde = datetime.combine(fecha, time.min)
+        consulta = db.query(CitCitaOcupacion.inicio, CitCitaOcupacion.cantidad).filter(CitCitaOcupacion.oficina_id == oficina.id).filter(CitCitaOcupacion.inicio >= desde).filter(CitCitaOcupacion.inicio < desde + timedelta(days=1))
+        cantidades = dict(consulta.all())
+        horas_lugares = [(tiempo.time(), oficina.limite_personas - cantidades.get(tiempo, 0)) for tiempo in tiempos]
+        db.execute(insert(CitDisponibilidad).values([{"oficina_id": oficina.id, "cit_servicio_id": cit_servicio_id, "fecha": fecha, "hora": hora, "lugares": lugares} for hora, lugares in horas_lugares]).on_conflict_do_nothing())
+    return horas_lugares
+
+
+def actualizar_cit_disponibilidades_lugares(db: Session, ocupaciones: Iterable[Tuple[int, datetime, int]]):
+    """Actualizar los lugares de todos los servicios en los tiempos que cambiaron, en la transaccion que ocupa o libera"""
+    renglones = [(oficina_id, inicio.date(), inicio.time(), cantidad) for oficina_id, inicio, cantidad in ocupaciones]
+    if len(renglones) == 0:
+        return
+    cambios = values(column("oficina_id", Integer), column("fecha", Date), column("hora", Time), column("cantidad", Integer), name="cambios").data(renglones)
+    db.execute(
+        update(CitDisponibilidad)
+        .where(and_(CitDisponibilidad.oficina_id == cambios.c.oficina_id, CitDisponibilidad.fecha == cambios.c.fecha, CitDisponibilidad.hora == cambios.c.hora))
+        .where(Oficina.id == cambios.c.oficina_id)
+        .values(lugares=Oficina.limite_personas - cambios.c.cantidad)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def recalcular_cit_disponibilidades_lugares(db: Session, desde: date, hasta: date, oficina_id: int = None):
+    """Volver a calcular los lugares con los contadores, despues de reconstruirlos"""
+    cantidad = select(CitCitaOcupacion.cantidad).where(CitCitaOcupacion.oficina_id == CitDisponibilidad.oficina_id).where(CitCitaOcupacion.inicio == CitDisponibilidad.fecha + CitDisponibilidad.hora).scalar_subquery()
+    sentencia = (
+        update(CitDisponibilidad)
+        .where(Oficina.id == CitDisponibilidad.oficina_id)
+        .where(CitDisponibilidad.fecha >= desde)
+        .where(CitDisponibilidad.fecha < hasta)
+        .values(lugares=Oficina.limite_personas - func.coalesce(cantidad, 0))
+        .execution_options(synchronize_session=False)
+    )
+    if oficina_id is not None:
+        sentencia = sentencia.where(CitDisponibilidad.oficina_id == oficina_id)
+    db.execute(sentencia)
+
+
+def calcular_cit_disponibilidades_oficina(db: Session, oficina: Oficina, cit_servicios: List[CitServicio], fechas: List[date]) -> Disponibilidades:
+    """Calcular en vivo las horas y los lugares de los servicios en la oficina en las fechas"""
+    if len(cit_servicios) == 0 or len(fechas) == 0:
+        return {}
+
+    # Consultar las horas bloqueadas y las ocupaciones de la oficina en las fechas
+    horas_bloqueadas = {}
+    consulta = db.query(CitHoraBloqueada.fecha, CitHoraBloqueada.inicio, CitHoraBloqueada.termino).filter_by(oficina_id=oficina.id, estatus="A").filter(CitHoraBloqueada.fecha.in_(fechas))
+    for fecha, inicio, termino in consulta.all():
+        horas_bloqueadas.setdefault(fecha, []).append((inicio, termino))
+    desde = datetime.combine(min(fechas), time.min)
+    hasta = datetime.combine(max(fechas) + timedelta(days=1), time.min)
+    consulta = db.query(CitCitaOcupacion.inicio, CitCitaOcupacion.cantidad).filter(CitCitaOcupacion.oficina_id == oficina.id).filter(CitCitaOcupacion.inicio >= desde).filter(CitCitaOcupacion.inicio < hasta)
+    cantidades = dict(consulta.all())
+
+    # Calcular las horas de cada servicio en cada fecha
+    disponibilidades = {}
+    for cit_servicio in cit_servicios:
+        for fecha in fechas:
+            try:
+                tiempos = calcular_tiempos(fecha, oficina, cit_servicio, horas_bloqueadas.get(fecha, []))
+            except CitasNotValidParamError:
+                continue
+            disponibilidades[(cit_servicio.id, fecha)] = [(tiempo.time(), oficina.limite_personas - cantidades.get(tiempo, 0)) for tiempo in tiempos]
+    return disponibilidades
+
+
+def get_oficinas_activas(db: Session, oficina_id: Optional[int] = None) -> List[Oficina]:
+    """Consultar las oficinas activas, o solo una"""
+    consulta = db.query(Oficina).filter_by(estatus="A")
+    if oficina_id is not None:
+        consulta = consulta.filter_by(id=oficina_id)
+    return consulta.order_by(Oficina.id).all()
+
+
+def get_guardadas(db: Session, oficina_id: int, fechas: List[date]) -> Disponibilidades:
+    """Consultar las horas y los lugares guardados de la oficina en las fechas"""
+    guardadas = {}
+    consulta = db.query(CitDisponibilidad.cit_servicio_id, CitDisponibilidad.fecha, CitDisponibilidad.hora, CitDisponibilidad.lugares)
+    consulta = consulta.filter_by(oficina_id=oficina_id).filter(CitDisponibilidad.fecha.in_(fechas))
+    for cit_servicio_id, fecha, hora, lugares in consulta.order_by(CitDisponibilidad.cit_servicio_id, CitDisponibilidad.fecha, CitDisponibilidad.hora).all():
+        guardadas.setdefault((cit_servicio_id, fecha), []).append((hora, lugares))
+    return guardadas
+
+
+def insertar(db: Session, oficina_id: int, disponibilidades: Disponibilidades) -> int:
+    """Insertar las horas y los lugares, entrega la cantidad de renglones"""
+    renglones = [{"oficina_id": oficina_id, "cit_servicio_id": cit_servicio_id, "fecha": fecha, "hora": hora, "lugares": lugares} for (cit_servicio_id, fecha), horas_lugares in disponibilidades.items() for hora, lugares in horas_lugares]
+    if len(renglones) > 0:
+        db.execute(insert(CitDisponibilidad).on_conflict_do_nothing(), renglones)
+    return len(renglones)
+
+
+def extender_cit_disponibilidades(db: Session, fechas: List[date], oficina_id: int = None) -> int:
+    """Borrar las fechas pasadas y calcular los servicios de cada oficina en las fechas que faltan, entrega la cantidad de horas agregadas"""
+    db.execute(delete(CitDisponibilidad).where(CitDisponibilidad.fecha < date.today()))
+    db.commit()
+    cantidad = 0
+    for oficina in get_oficinas_activas(db, oficina_id):
+        bloquear_cit_disponibilidades(db, [(oficina.id, fecha) for fecha in fechas])
+        consulta = db.query(CitServicio).join(CitOficinaServicio, CitOficinaServicio.cit_servicio_id == CitServicio.id)
+        cit_servicios = consulta.filter(CitOficinaServicio.oficina_id == oficina.id).filter(CitOficinaServicio.estatus == "A").filter(CitServicio.estatus == "A").all()
+        guardadas = get_guardadas(db, oficina.id, fechas)
+        faltan = {clave: horas_lugares for clave, horas_lugares in calcular_cit_disponibilidades_oficina(db, oficina, cit_servicios, fechas).items() if clave not in guardadas}
+        cantidad += insertar(db, oficina.id, faltan)
+        db.commit()  # Una transaccion por oficina
+    return cantidad
+
+
+def verificar_cit_disponibilidades(db: Session, fechas: List[date], oficina_id: int = None, corregir: bool = False) -> List[Tuple[int, int, date, time, Optional[int], Optional[int]]]:
+    """Comparar lo guardado con el calculo en vivo, entrega oficina, servicio, fecha, hora, lugares guardados y calculados de lo que difiere"""
+    diferencias = []
+    for oficina in get_oficinas_activas(db, oficina_id):
+        if corregir:
+            bloquear_cit_disponibilidades(db, [(oficina.id, fecha) for fecha in fechas])
+        guardadas = get_guardadas(db, oficina.id, fechas)
+        cit_servicios = db.query(CitServicio).filter(CitServicio.id.in_({cit_servicio_id for cit_servicio_id, _ in guardadas})).filter_by(estatus="A").all()
+        calculadas = calcular_cit_disponibilidades_oficina(db, oficina, cit_servicios, fechas)
+        corregidas = {}
+        for clave, horas_lugares in guardadas.items():
+            guardada = dict(horas_lugares)
+            calculada = dict(calculadas.get(clave, []))
+            for hora in sorted(set(guardada) | set(calculada)):
+                if guardada.get(hora) != calculada.get(hora):
+                    diferencias.append((oficina.id, clave[0], clave[1], hora, guardada.get(hora), calculada.get(hora)))
+                    corregidas[clave] = calculadas.get(clave, [])
+        if corregir:
+            for cit_servicio_id, fecha in corregidas:
+                db.execute(delete(CitDisponibilidad).where(CitDisponibilidad.oficina_id == oficina.id).where(CitDisponibilidad.cit_servicio_id == cit_servicio_id).where(CitDisponibilidad.fecha == fecha))
+            insertar(db, oficina.id, corregidas)
+            db.commit()  # Una transaccion por oficina, tambien suelta el bloqueo
+    return diferencias
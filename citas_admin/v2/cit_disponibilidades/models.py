@@ -0,0 +1,29 @@
+"""
+Cit Disponibilidades v2, modelos
+"""
+from sqlalchemy import Column, Date, Index, Integer, Time
+
+from lib.database import Base
+
+
+class CitDisponibilidad(Base):
+    """CitDisponibilidad, lugares que quedan en una hora en que se puede agendar el servicio en la oficina"""
+
+    # Nombre de la tabla
+    __tablename__ = "cit_disponibilidades"
+
+    # Indice para actualizar los lugares de todos los servicios de la oficina al ocupar o liberar
+    __table_args__ = (Index("ix_cit_disponibilidades_oficina_id_fecha_hora", "oficina_id", "fecha", "hora"),)
+
+    # Clave primaria, sin llaves foraneas porque se calcula de las otras tablas y sus disparadores la borran
+    oficina_id = Column(Integer, primary_key=True)
+    cit_servicio_id = Column(Integer, primary_key=True)
+    fecha = Column(Date(), primary_key=True)
+    hora = Column(Time(), primary_key=True)
+
+    # Columnas
+    lugares = Column(Integer(), nullable=False)
+
+    def __repr__(self):
+        """Representación"""
+        return f"<CitDisponibilidad {self.oficina_id} {self.cit_servicio_id} {self.fecha} {self.hora} {self.lugares}>"
@@ -1,11 +1,12 @@
 """
 Cit Horas Bloqueadas v2, CRUD (create, read, update, and delete)
 """
-from datetime import date
-from typing import Any
+from datetime import date, time
+from typing import Any, Tuple
 from sqlalchemy.orm import Session
 
 from lib.exceptions import CitasIsDeletedError, CitasNotExistsError
+from lib.invalidacion import cache_invalidable
 
 from .models import CitHoraBloqueada
 from ..oficinas.crud import get_oficina
@@ -32,6 +33,17 @@ def get_cit_horas_bloqueadas(
     return consulta.order_by(CitHoraBloqueada.fecha, CitHoraBloqueada.inicio)
 
 
+@cache_invalidable("cit_horas_bloqueadas")
+def get_cit_horas_bloqueadas_tiempos(
+    db: Session,
+    oficina_id: int,
+    fecha: date,
+) -> Tuple[Tuple[time, time], ...]:
+    """Consultar el inicio y termino de las horas bloqueadas activas de la oficina en la fecha, en cache hasta que cambie la tabla"""
+    consulta = db.query(CitHoraBloqueada.inicio, CitHoraBloqueada.termino).filter_by(oficina_id=oficina_id, fecha=fecha, estatus="A")
+    return tuple((inicio, termino) for inicio, termino in consulta.order_by(CitHoraBloqueada.inicio))
+
+
 def get_cit_hora_bloqueada(
     db: Session,
     cit_hora_bloqueada_id: int,
@@ -1,7 +1,7 @@
 """
 Cit Horas Bloqueadas v2, modelos
 """
-from sqlalchemy import Column, Date, ForeignKey, Integer, String, Time
+from sqlalchemy import Column, Date, ForeignKey, Index, Integer, String, Time
 from sqlalchemy.orm import relationship
 
 from lib.database import Base
@@ -14,6 +14,9 @@ class CitHoraBloqueada(Base, UniversalMixin):
     # Nombre de la tabla
     __tablename__ = "cit_horas_bloqueadas"
 
+    # Indice para consultar por oficina y fecha
+    __table_args__ = (Index("ix_cit_horas_bloqueadas_oficina_id_fecha", "oficina_id", "fecha"),)
+
     # Clave primaria
     id = Column(Integer, primary_key=True)
 
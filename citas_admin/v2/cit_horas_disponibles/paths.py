@@ -1,24 +1,39 @@
 """
 Cit Horas Disponibles v2, rutas (paths)
 """
-from datetime import date
+from datetime import date, datetime
+import json
+
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from fastapi_pagination.ext.sqlalchemy import paginate
 from sqlalchemy.orm import Session
 
 from config.settings import Settings, get_settings
+from lib.coalescencia import coalescer
 from lib.database import get_db
+from lib.escucha import get_escucha
 from lib.exceptions import CitasAnyError
 from lib.fastapi_pagination_custom_list import CustomList, ListResult, custom_list_success_false
 
-from .crud import get_cit_horas_disponibles
+from .crud import get_cit_horas_disponibles, get_cit_horas_posibles
 from .schemas import CitHoraDisponibleOut
+from ..cit_citas_ocupaciones.crud import CANAL_OCUPACIONES, get_cit_citas_ocupaciones_cantidades, get_clave
+from ..oficinas.crud import get_oficina
 from ..permisos.models import Permiso
 from ..usuarios.authentications import get_current_active_user
 from ..usuarios.schemas import UsuarioInDB
 
 cit_horas_disponibles = APIRouter(prefix="/v2/cit_horas_disponibles", tags=["citas horas disponibles"])
 
+EVENTOS_PING_SEGUNDOS = 15  # Para que los proxies no cierren la conexion y para detectar al cliente que se fue
+EVENTOS_REINTENTAR_MILISEGUNDOS = 3000
+
+
+def evento(nombre: str, datos: dict) -> str:
+    """Evento en formato de Server-Sent Events"""
+    return f"event: {nombre}\ndata: {json.dumps(datos)}\n\n"
+
 
 @cit_horas_disponibles.get("", response_model=CustomList[CitHoraDisponibleOut])
 async def listado_cit_horas_disponibles(
@@ -30,20 +45,80 @@ async def listado_cit_horas_disponibles(
     settings: Settings = Depends(get_settings),
     size: int = 100,
 ):
-    """Listado de horas disponibles"""
+    """Listado de horas disponibles, si no estan precalculadas las calcula y las guarda con commit"""
     if current_user.permissions.get("CIT HORAS BLOQUEADAS", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
     try:
-        resultados = get_cit_horas_disponibles(
-            db=db,
-            cit_servicio_id=cit_servicio_id,
-            fecha=fecha,
-            oficina_id=oficina_id,
-            settings=settings,
-            size=size,
+        # Aunque es GET escribe: con confirmar=True las horas que se calculan se guardan en cit_disponibilidades
+        resultados = await coalescer(
+            db,
+            ("cit_horas_disponibles", cit_servicio_id, fecha, oficina_id, size),
+            lambda sesion: get_cit_horas_disponibles(
+                db=sesion,
+                cit_servicio_id=cit_servicio_id,
+                fecha=fecha,
+                oficina_id=oficina_id,
+                settings=settings,
+                size=size,
+                confirmar=True,
+            ),
         )
     except CitasAnyError as error:
         return custom_list_success_false(error)
     items = [CitHoraDisponibleOut(horas_minutos=item) for item in resultados]
     result = ListResult(total=len(items), items=items, size=size)
     return CustomList(result=result)
+
+
+@cit_horas_disponibles.get("/eventos")
+async def eventos_cit_horas_disponibles(
+    cit_servicio_id: int,
+    fecha: date,
+    oficina_id: int,
+    current_user: UsuarioInDB = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+    settings: Settings = Depends(get_settings),
+):
+    """Eventos de las horas disponibles, primero el evento horas con todas y despues el evento hora cada vez que una cambia"""
+    if current_user.permissions.get("CIT HORAS BLOQUEADAS", 0) < Permiso.VER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+    # Suscribirse antes de consultar, para no perder los cambios que ocurran mientras tanto
+    escucha = get_escucha(CANAL_OCUPACIONES)
+    try:
+        suscripcion = await escucha.suscribir(get_clave(oficina_id, fecha))
+    except CitasAnyError as error:
+        return custom_list_success_false(error)
+    try:
+        oficina = get_oficina(db, oficina_id)
+        limite_personas = oficina.limite_personas
+        tiempos = get_cit_horas_posibles(db=db, cit_servicio_id=cit_servicio_id, fecha=fecha, oficina_id=oficina_id, settings=settings)
+        cantidades = get_cit_citas_ocupaciones_cantidades(db=db, oficina_id=oficina_id, fecha=fecha)
+    except CitasAnyError as error:
+        escucha.desuscribir(suscripcion)
+        return custom_list_success_false(error)
+    except BaseException:
+        escucha.desuscribir(suscripcion)  # Con cualquier otro error tampoco debe quedar suscrita
+        raise
+    finally:
+        db.close()  # Devolver la conexion al pool, la transmision puede durar horas
+    disponibles = {tiempo: cantidades.get(tiempo, 0) < limite_personas for tiempo in tiempos}
+
+    async def transmitir():
+        try:
+            yield f"retry: {EVENTOS_REINTENTAR_MILISEGUNDOS}\n\n"
+            yield evento("horas", {"horas_minutos": [tiempo.time().isoformat() for tiempo, disponible in disponibles.items() if disponible]})
+            while not suscripcion.cerrada:
+                datos = await suscripcion.siguiente(EVENTOS_PING_SEGUNDOS)
+                if datos is None:
+                    yield ": ping\n\n"
+                    continue
+                tiempo = datetime.fromisoformat(datos["inicio"])
+                disponible = datos["cantidad"] < limite_personas
+                if tiempo in disponibles and disponibles[tiempo] != disponible:
+                    disponibles[tiempo] = disponible
+                    yield evento("hora", {"horas_minutos": tiempo.time().isoformat(), "disponible": disponible})
+        finally:
+            escucha.desuscribir(suscripcion)
+
+    return StreamingResponse(transmitir(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
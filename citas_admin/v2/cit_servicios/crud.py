@@ -1,10 +1,11 @@
 """
 Cit Servicios v2, CRUD (create, read, update, and delete)
 """
-from typing import Any
-from sqlalchemy.orm import Session
+from typing import Any, List, Tuple
+from sqlalchemy.orm import Session, joinedload
 
 from lib.exceptions import CitasIsDeletedError, CitasNotExistsError
+from lib.lotes import consultar_lote
 
 from .models import CitServicio
 from ..cit_categorias.crud import get_cit_categoria
@@ -38,3 +39,12 @@ def get_cit_servicio(
     if cit_servicio.estatus != "A":
         raise CitasIsDeletedError("No es activo ese servicio, está eliminado")
     return cit_servicio
+
+
+def get_cit_servicios_lote(
+    db: Session,
+    cit_servicios_ids: List[int],
+) -> List[Tuple[int, Any]]:
+    """Consultar un lote de servicios por sus ids, con la categoria en la misma consulta"""
+    consulta = db.query(CitServicio).options(joinedload(CitServicio.cit_categoria))
+    return consultar_lote(consulta, CitServicio, cit_servicios_ids, "servicio")
@@ -0,0 +1,72 @@
+"""
+Cit Tableros v2, CRUD (create, read, update, and delete)
+"""
+from datetime import date
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload
+
+from config.settings import Settings
+
+from .schemas import CitTableroOut
+from ..cit_citas.crud import get_cit_citas
+from ..cit_citas.models import CitCita
+from ..cit_citas.schemas import CitCitaOut
+from ..cit_clientes.crud import get_cit_cliente
+from ..enc_servicios.crud import get_enc_servicio_url_from_id
+from ..enc_servicios.models import EncServicio
+from ..enc_sistemas.crud import get_enc_sistema_url_from_id
+from ..enc_sistemas.models import EncSistema
+
+
+def get_cit_tablero(
+    db: Session,
+    settings: Settings,
+    cit_cliente_id: int = None,
+    cit_cliente_curp: str = None,
+    cit_cliente_email: str = None,
+) -> CitTableroOut:
+    """Consultar el tablero de un cliente, lo que antes eran mis_citas, disponibles y las dos encuestas pendientes"""
+
+    # Consultar el cliente una sola vez, las siguientes consultas lo toman por su id de la sesion
+    cit_cliente = get_cit_cliente(
+        db=db,
+        cit_cliente_id=cit_cliente_id,
+        cit_cliente_curp=cit_cliente_curp,
+        cit_cliente_email=cit_cliente_email,
+    )
+
+    # Consultar las citas PENDIENTE en el futuro, con el servicio y la oficina en la misma consulta
+    cit_citas = (
+        get_cit_citas(
+            db=db,
+            cit_cliente_id=cit_cliente.id,
+            estado="PENDIENTE",
+            inicio_desde=date.today(),
+            settings=settings,
+        )
+        .options(joinedload(CitCita.cit_servicio), joinedload(CitCita.oficina))
+        .all()
+    )
+
+    # Las citas disponibles son su limite menos las pendientes, que son las mismas que ya se consultaron
+    limite = max(settings.limite_citas_pendientes, cit_cliente.limite_citas_pendientes)
+    disponibles = max(limite - len(cit_citas), 0)
+
+    # Consultar las dos encuestas PENDIENTE en una sola consulta
+    enc_servicio_id, enc_sistema_id = db.execute(
+        select(
+            select(EncServicio.id).filter(EncServicio.cit_cliente_id == cit_cliente.id).filter(EncServicio.estado == "PENDIENTE").limit(1).scalar_subquery(),
+            select(EncSistema.id).filter(EncSistema.cit_cliente_id == cit_cliente.id).filter(EncSistema.estado == "PENDIENTE").limit(1).scalar_subquery(),
+        )
+    ).one()
+
+    # Entregar
+    return CitTableroOut(
+        cit_cliente_id=cit_cliente.id,
+        cit_cliente_nombre=cit_cliente.nombre,
+        cit_citas_pendientes=[CitCitaOut.from_orm(cit_cita) for cit_cita in cit_citas],
+        cit_citas_disponibles_cantidad=disponibles,
+        enc_servicio_url=get_enc_servicio_url_from_id(settings, enc_servicio_id) if enc_servicio_id is not None else None,
+        enc_sistema_url=get_enc_sistema_url_from_id(settings, enc_sistema_id) if enc_sistema_id is not None else None,
+    )
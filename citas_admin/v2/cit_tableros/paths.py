@@ -0,0 +1,44 @@
+"""
+Cit Tableros v2, rutas (paths)
+"""
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from config.settings import Settings, get_settings
+from lib.database import get_db
+from lib.exceptions import CitasAnyError
+
+from .crud import get_cit_tablero
+from .schemas import CitTableroOut
+from ..permisos.models import Permiso
+from ..usuarios.authentications import get_current_active_user
+from ..usuarios.schemas import UsuarioInDB
+
+cit_tableros = APIRouter(prefix="/v2/cit_tableros", tags=["citas tableros"])
+
+
+@cit_tableros.get("", response_model=CitTableroOut)
+async def tablero_cliente(
+    cit_cliente_id: int = None,
+    cit_cliente_curp: str = None,
+    cit_cliente_email: str = None,
+    current_user: UsuarioInDB = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+    settings: Settings = Depends(get_settings),
+):
+    """Tablero del cliente en una sola llamada: citas pendientes, cantidad de citas disponibles y URLs de las encuestas pendientes"""
+    # Se necesitan los permisos de las llamadas que reemplaza, citas y las dos encuestas
+    for modulo in ("CIT CITAS", "ENC SERVICIOS", "ENC SISTEMAS"):
+        if current_user.permissions.get(modulo, 0) < Permiso.VER:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    try:
+        tablero = get_cit_tablero(
+            db=db,
+            settings=settings,
+            cit_cliente_id=cit_cliente_id,
+            cit_cliente_curp=cit_cliente_curp,
+            cit_cliente_email=cit_cliente_email,
+        )
+    except CitasAnyError as error:
+        return CitTableroOut(success=False, message=str(error))
+    return tablero
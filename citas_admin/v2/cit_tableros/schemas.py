@@ -0,0 +1,19 @@
+"""
+Cit Tableros v2, esquemas de pydantic
+"""
+from typing import List
+
+from lib.schemas_base import OneBaseOut
+
+from ..cit_citas.schemas import CitCitaOut
+
+
+class CitTableroOut(OneBaseOut):
+    """Esquema para entregar el tablero de un cliente: sus citas pendientes, las que puede agendar y sus encuestas pendientes"""
+
+    cit_cliente_id: int | None
+    cit_cliente_nombre: str | None
+    cit_citas_pendientes: List[CitCitaOut] | None
+    cit_citas_disponibles_cantidad: int | None
+    enc_servicio_url: str | None
+    enc_sistema_url: str | None
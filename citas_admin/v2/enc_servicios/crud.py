@@ -2,21 +2,30 @@
 Encuestas Servicios v2, CRUD (create, read, update, and delete)
 """
 from datetime import date, datetime
-from typing import Any, Optional
+from typing import Any, Dict, Optional
 
-from hashids import Hashids
 import pytz
 from sqlalchemy.orm import Session
 
 from config.settings import Settings
 from lib.exceptions import CitasIsDeletedError, CitasNotExistsError, CitasNotValidParamError
+from lib.hashids import cifrar_id
+from lib.incluidos import Relacion
 from lib.safe_string import safe_clave, safe_curp, safe_email, safe_string
 
 from .models import EncServicio
-from ..cit_clientes.crud import get_cit_cliente
+from ..cit_clientes.crud import get_cit_cliente, get_cit_clientes_lote
 from ..cit_clientes.models import CitCliente
-from ..oficinas.crud import get_oficina
+from ..cit_clientes.schemas import CitClienteIncluidoOut
+from ..oficinas.crud import get_oficina, get_oficinas_lote
 from ..oficinas.models import Oficina
+from ..oficinas.schemas import OficinaOut
+
+# Relaciones que se pueden incluir en el listado de encuestas de servicios
+ENC_SERVICIOS_INCLUIDOS: Dict[str, Relacion] = {
+    "cit_cliente": Relacion("cit_cliente_id", get_cit_clientes_lote, CitClienteIncluidoOut, "CIT CLIENTES"),
+    "oficina": Relacion("oficina_id", get_oficinas_lote, OficinaOut, "OFICINAS"),
+}
 
 
 def get_enc_servicios(
@@ -147,8 +156,10 @@ def get_enc_servicio_url(
     if enc_servicio is None:
         return None
 
-    # Preparar el cifrado
-    hashids = Hashids(settings.salt, min_length=8)
-
     # Entregar la URL
-    return f"{settings.poll_service_url}?hashid={hashids.encode(enc_servicio.id)}"
+    return get_enc_servicio_url_from_id(settings, enc_servicio.id)
+
+
+def get_enc_servicio_url_from_id(settings: Settings, enc_servicio_id: int) -> str:
+    """Obtener la URL de la encuesta de servicio a partir de su id"""
+    return f"{settings.poll_service_url}?hashid={cifrar_id(enc_servicio_id)}"
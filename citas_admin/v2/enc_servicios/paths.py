@@ -8,11 +8,13 @@ from fastapi_pagination.ext.sqlalchemy import paginate
 from sqlalchemy.orm import Session
 
 from config.settings import Settings, get_settings
+from lib.campos import paginate_campos
 from lib.database import get_db
 from lib.exceptions import CitasAnyError
 from lib.fastapi_pagination_custom_page import CustomPage, custom_page_success_false
+from lib.incluidos import Incluidos, get_modulos_incluidos
 
-from .crud import get_enc_servicios, get_enc_servicio, get_enc_servicio_url
+from .crud import ENC_SERVICIOS_INCLUIDOS, get_enc_servicios, get_enc_servicio, get_enc_servicio_url
 from .schemas import EncServicioOut, OneEncServicioOut, OneEncServicioURLOut
 from ..permisos.models import Permiso
 from ..usuarios.authentications import get_current_active_user
@@ -32,14 +34,20 @@ async def listado_encuestas_servicios(
     estatus: str = None,
     oficina_id: int = None,
     oficina_clave: str = None,
+    include: str = None,
     current_user: UsuarioInDB = Depends(get_current_active_user),
     db: Session = Depends(get_db),
     settings: Settings = Depends(get_settings),
 ):
-    """Listado de encuestas de servicios"""
+    """Listado de encuestas de servicios, con include=cit_cliente,oficina se incluyen esos registros"""
     if current_user.permissions.get("ENC SERVICIOS", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    # Para incluir otros registros tambien se necesita poder ver sus modulos
+    for modulo in get_modulos_incluidos(ENC_SERVICIOS_INCLUIDOS, include) if include is not None else []:
+        if current_user.permissions.get(modulo, 0) < Permiso.VER:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
     try:
+        incluidos = Incluidos(db, ENC_SERVICIOS_INCLUIDOS, include) if include is not None else None
         resultados = get_enc_servicios(
             db=db,
             cit_cliente_id=cit_cliente_id,
@@ -55,6 +63,8 @@ async def listado_encuestas_servicios(
         )
     except CitasAnyError as error:
         return custom_page_success_false(error)
+    if incluidos is not None:
+        return paginate_campos(resultados, EncServicioOut, None, incluidos)
     return paginate(resultados)
 
 
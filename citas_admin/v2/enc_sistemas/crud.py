@@ -4,12 +4,12 @@ Encuestas Sistemas v2, CRUD (create, read, update, and delete)
 from datetime import date, datetime
 from typing import Any, Optional
 
-from hashids import Hashids
 import pytz
 from sqlalchemy.orm import Session
 
 from config.settings import Settings
 from lib.exceptions import CitasIsDeletedError, CitasNotExistsError, CitasNotValidParamError
+from lib.hashids import cifrar_id
 from lib.safe_string import safe_curp, safe_email, safe_string
 
 from .models import EncSistema
@@ -132,8 +132,10 @@ def get_enc_sistema_url(
     if enc_sistema is None:
         return None
 
-    # Preparar el cifrado
-    hashids = Hashids(settings.salt, min_length=8)
-
     # Entregar la URL
-    return f"{settings.poll_system_url}?hashid={hashids.encode(enc_sistema.id)}"
+    return get_enc_sistema_url_from_id(settings, enc_sistema.id)
+
+
+def get_enc_sistema_url_from_id(settings: Settings, enc_sistema_id: int) -> str:
+    """Obtener la URL de la encuesta de sistema a partir de su id"""
+    return f"{settings.poll_system_url}?hashid={cifrar_id(enc_sistema_id)}"
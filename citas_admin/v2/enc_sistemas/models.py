@@ -2,7 +2,7 @@
 Encuestas Sistemas v2, modelos
 """
 from collections import OrderedDict
-from sqlalchemy import Column, Enum, ForeignKey, Integer, String
+from sqlalchemy import Column, Enum, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from lib.database import Base
@@ -23,6 +23,9 @@ class EncSistema(Base, UniversalMixin):
     # Nombre de la tabla
     __tablename__ = "enc_sistemas"
 
+    # Indice para consultar por rango de creado
+    __table_args__ = (Index("ix_enc_sistemas_creado", "creado"),)
+
     # Clave primaria
     id = Column(Integer, primary_key=True)
 
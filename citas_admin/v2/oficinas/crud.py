@@ -1,10 +1,11 @@
 """
 Oficinas v2, CRUD (create, read, update, and delete)
 """
-from typing import Any
-from sqlalchemy.orm import Session
+from typing import Any, List, Tuple
+from sqlalchemy.orm import Session, joinedload
 
 from lib.exceptions import CitasIsDeletedError, CitasNotExistsError, CitasNotValidParamError
+from lib.lotes import consultar_lote
 from lib.safe_string import safe_clave
 
 from .models import Oficina
@@ -54,6 +55,12 @@ def get_oficina(db: Session, oficina_id: int) -> Oficina:
     return oficina
 
 
+def get_oficinas_lote(db: Session, oficinas_ids: List[int]) -> List[Tuple[int, Any]]:
+    """Consultar un lote de oficinas por sus ids, con el distrito y el domicilio en la misma consulta"""
+    consulta = db.query(Oficina).options(joinedload(Oficina.distrito), joinedload(Oficina.domicilio))
+    return consultar_lote(consulta, Oficina, oficinas_ids, "oficina")
+
+
 def get_oficina_from_clave(db: Session, clave: str) -> Oficina:
     """Consultar un oficina por su id"""
     clave = safe_clave(clave)
@@ -7,9 +7,11 @@ from sqlalchemy.orm import Session
 
 from lib.database import get_db
 from lib.exceptions import CitasAnyError, CitasNotExistsError, CitasIsDeletedError
+from lib.fastapi_pagination_custom_list import CustomList, custom_list_success_false
 from lib.fastapi_pagination_custom_page import CustomPage, custom_page_success_false
+from lib.lotes import LoteIn, entregar_lote, get_ids_from_str, validar_ids
 
-from .crud import get_oficinas, get_oficina
+from .crud import get_oficinas, get_oficina, get_oficinas_lote
 from .schemas import OficinaOut, OneOficinaOut
 from ..permisos.models import Permiso
 from ..usuarios.authentications import get_current_active_user
@@ -47,6 +49,38 @@ async def listado_oficinas(
     return paginate(resultados)
 
 
+@oficinas.get("/lote", response_model=CustomList[OneOficinaOut])
+async def lote_oficinas(
+    ids: str,
+    current_user: UsuarioInDB = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """Lote de oficinas a partir de sus ids separados por comas, en el mismo orden"""
+    if current_user.permissions.get("OFICINAS", 0) < Permiso.VER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    try:
+        lote = get_oficinas_lote(db, get_ids_from_str(ids))
+    except CitasAnyError as error:
+        return custom_list_success_false(error)
+    return entregar_lote(lote, OneOficinaOut)
+
+
+@oficinas.post("/lote", response_model=CustomList[OneOficinaOut])
+async def lote_oficinas_post(
+    datos: LoteIn,
+    current_user: UsuarioInDB = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """Lote de oficinas a partir de sus ids, en el mismo orden"""
+    if current_user.permissions.get("OFICINAS", 0) < Permiso.VER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    try:
+        lote = get_oficinas_lote(db, validar_ids(datos.ids))
+    except CitasAnyError as error:
+        return custom_list_success_false(error)
+    return entregar_lote(lote, OneOficinaOut)
+
+
 @oficinas.get("/{oficina_id}", response_model=OneOficinaOut)
 async def detalle_oficina(
     oficina_id: int,
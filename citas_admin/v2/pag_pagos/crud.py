@@ -2,22 +2,48 @@
 Pagos Pagos v2, CRUD (create, read, update, and delete)
 """
 from datetime import datetime, timedelta
-from typing import Any
+from typing import Any, Dict, List
 
-import nest_asyncio
 from sqlalchemy.orm import Session
 
 from config.settings import Settings
+from lib.campos import MapaCampos, cargar_campos
 from lib.exceptions import CitasAnyError, CitasIsDeletedError, CitasNotExistsError, CitasNotValidParamError
 from lib.hashids import descifrar_id
+from lib.incluidos import Relacion
 from lib.safe_string import safe_curp, safe_email, safe_string, safe_telefono
-from lib.santander_web_pay_plus import create_pay_link, convert_xml_encrypt_to_dict, RESPUESTA_EXITO
 
 from .models import PagPago
 from .schemas import PagCarroIn, OnePagCarroOut, PagResultadoIn, OnePagResultadoOut
-from ..cit_clientes.crud import get_cit_cliente
+from ..cit_clientes.crud import get_cit_cliente, get_cit_clientes_lote
 from ..cit_clientes.models import CitCliente
-from ..pag_tramites_servicios.crud import get_pag_tramite_servicio_from_clave
+from ..cit_clientes.schemas import CitClienteIncluidoOut
+from ..pag_tramites_servicios.crud import get_pag_tramite_servicio_from_clave, get_pag_tramites_servicios_lote
+from ..pag_tramites_servicios.models import PagTramiteServicio
+from ..pag_tramites_servicios.schemas import PagTramiteServicioOut
+
+# Columnas y relaciones que necesita cada campo de PagPagoOut
+PAG_PAGOS_CAMPOS: MapaCampos = {
+    "id": [PagPago.id],
+    "cit_cliente_id": [PagPago.cit_cliente_id],
+    "cit_cliente_nombre": [(PagPago.cit_cliente, CitCliente.nombres), (PagPago.cit_cliente, CitCliente.apellido_primero), (PagPago.cit_cliente, CitCliente.apellido_segundo)],
+    "cit_cliente_curp": [(PagPago.cit_cliente, CitCliente.curp)],
+    "cit_cliente_email": [(PagPago.cit_cliente, CitCliente.email)],
+    "pag_tramite_servicio_id": [PagPago.pag_tramite_servicio_id],
+    "pag_tramite_servicio_clave": [(PagPago.pag_tramite_servicio, PagTramiteServicio.clave)],
+    "pag_tramite_servicio_descripcion": [(PagPago.pag_tramite_servicio, PagTramiteServicio.descripcion)],
+    "email": [PagPago.email],
+    "estado": [PagPago.estado],
+    "folio": [PagPago.folio],
+    "total": [PagPago.total],
+    "ya_se_envio_comprobante": [PagPago.ya_se_envio_comprobante],
+}
+
+# Relaciones que se pueden incluir en el listado de pagos
+PAG_PAGOS_INCLUIDOS: Dict[str, Relacion] = {
+    "cit_cliente": Relacion("cit_cliente_id", get_cit_clientes_lote, CitClienteIncluidoOut, "CIT CLIENTES"),
+    "pag_tramite_servicio": Relacion("pag_tramite_servicio_id", get_pag_tramites_servicios_lote, PagTramiteServicioOut, "PAG TRAMITES SERVICIOS"),
+}
 
 
 def get_pag_pagos(
@@ -29,8 +55,9 @@ def get_pag_pagos(
     estado: str = None,
     estatus: str = None,
     ya_se_envio_comprobante: bool = None,
+    campos: List[str] = None,
 ) -> Any:
-    """Consultar los pagos activos"""
+    """Consultar los pagos activos, con campos solo se cargan las columnas y relaciones que necesitan"""
 
     # Consulta
     consulta = db.query(PagPago)
@@ -72,6 +99,10 @@ def get_pag_pagos(
     if ya_se_envio_comprobante is not None:
         consulta = consulta.filter_by(ya_se_envio_comprobante=ya_se_envio_comprobante)
 
+    # Cargar solo los campos pedidos
+    if campos is not None:
+        consulta = cargar_campos(consulta, PAG_PAGOS_CAMPOS, campos)
+
     # Entregar
     return consulta.order_by(PagPago.id)
 
@@ -185,7 +216,11 @@ def create_payment(
     db.commit()
     db.refresh(pag_pago)
 
-    # Crear URL al banco
+    # Crear URL al banco, el cliente del banco se importa hasta aqui porque carga requests y cryptography
+    # pylint: disable=import-outside-toplevel
+    import nest_asyncio
+    from lib.santander_web_pay_plus import create_pay_link
+
     nest_asyncio.apply()
     try:
         url = create_pay_link(
@@ -218,7 +253,10 @@ def update_payment(
     if datos.xml_encriptado.strip() == "":
         raise CitasNotValidParamError("El XML está vacío")
 
-    # Desencriptar el XML que mando el banco
+    # Desencriptar el XML que mando el banco, el cliente del banco se importa hasta aqui porque carga requests y cryptography
+    # pylint: disable=import-outside-toplevel
+    from lib.santander_web_pay_plus import convert_xml_encrypt_to_dict, RESPUESTA_EXITO
+
     try:
         respuesta = convert_xml_encrypt_to_dict(datos.xml_encriptado)
     except CitasAnyError as error:
@@ -2,7 +2,7 @@
 Pagos Pagos v2, modelos
 """
 from collections import OrderedDict
-from sqlalchemy import Boolean, Column, Enum, ForeignKey, Integer, String, Numeric
+from sqlalchemy import Boolean, Column, Enum, ForeignKey, Index, Integer, Numeric, String
 from sqlalchemy.orm import relationship
 
 from lib.database import Base
@@ -24,6 +24,9 @@ class PagPago(Base, UniversalMixin):
     # Nombre de la tabla
     __tablename__ = "pag_pagos"
 
+    # Indice para consultar los pagos por estado que falta enviar el comprobante
+    __table_args__ = (Index("ix_pag_pagos_estado_ya_se_envio_comprobante", "estado", "ya_se_envio_comprobante"),)
+
     # Clave primaria
     id = Column(Integer, primary_key=True)
 
@@ -6,11 +6,13 @@ from fastapi_pagination.ext.sqlalchemy import paginate
 from sqlalchemy.orm import Session
 
 from config.settings import Settings, get_settings
+from lib.campos import get_campos_from_str, paginate_campos
 from lib.database import get_db
 from lib.exceptions import CitasAnyError
 from lib.fastapi_pagination_custom_page import CustomPage, custom_page_success_false
+from lib.incluidos import Incluidos, get_modulos_incluidos
 
-from .crud import get_pag_pagos, get_pag_pago, create_payment, update_payment
+from .crud import PAG_PAGOS_INCLUIDOS, get_pag_pagos, get_pag_pago, create_payment, update_payment
 from .schemas import PagPagoOut, OnePagPagoOut, PagCarroIn, OnePagCarroOut, PagResultadoIn, OnePagResultadoOut
 from ..permisos.models import Permiso
 from ..usuarios.authentications import get_current_active_user
@@ -28,13 +30,21 @@ async def listado_pag_pagos(
     estado: str = None,
     estatus: str = None,
     ya_se_envio_comprobante: bool = None,
+    fields: str = None,
+    include: str = None,
     current_user: UsuarioInDB = Depends(get_current_active_user),
     db: Session = Depends(get_db),
 ):
-    """Listado de pagos"""
+    """Listado de pagos, con fields=id,estado,total se entregan solo esos campos y con include=cit_cliente,pag_tramite_servicio se incluyen esos registros"""
     if current_user.permissions.get("PAG PAGOS", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    # Para incluir otros registros tambien se necesita poder ver sus modulos
+    for modulo in get_modulos_incluidos(PAG_PAGOS_INCLUIDOS, include) if include is not None else []:
+        if current_user.permissions.get(modulo, 0) < Permiso.VER:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
     try:
+        campos = get_campos_from_str(fields, PagPagoOut) if fields is not None else None
+        incluidos = Incluidos(db, PAG_PAGOS_INCLUIDOS, include) if include is not None else None
         resultados = get_pag_pagos(
             db=db,
             cit_cliente_id=cit_cliente_id,
@@ -44,9 +54,12 @@ async def listado_pag_pagos(
             estado=estado,
             estatus=estatus,
             ya_se_envio_comprobante=ya_se_envio_comprobante,
+            campos=campos if campos is None or incluidos is None else campos + incluidos.columnas,
         )
     except CitasAnyError as error:
         return custom_page_success_false(error)
+    if campos is not None or incluidos is not None:
+        return paginate_campos(resultados, PagPagoOut, campos, incluidos)
     return paginate(resultados)
 
 
@@ -1,10 +1,11 @@
 """
 Pagos Tramites y Servicios v2, CRUD (create, read, update, and delete)
 """
-from typing import Any
+from typing import Any, List, Tuple
 from sqlalchemy.orm import Session
 
 from lib.exceptions import CitasIsDeletedError, CitasNotExistsError, CitasNotValidParamError
+from lib.lotes import consultar_lote
 from lib.safe_string import safe_clave
 
 from .models import PagTramiteServicio
@@ -39,6 +40,11 @@ def get_pag_tramite_servicio(db: Session, pag_tramite_servicio_id: int) -> PagTr
     return pag_tramite_servicio
 
 
+def get_pag_tramites_servicios_lote(db: Session, pag_tramites_servicios_ids: List[int]) -> List[Tuple[int, Any]]:
+    """Consultar un lote de tramites y servicios por sus ids"""
+    return consultar_lote(db.query(PagTramiteServicio), PagTramiteServicio, pag_tramites_servicios_ids, "tramite y servicio")
+
+
 def get_pag_tramite_servicio_from_clave(db: Session, clave: str) -> PagTramiteServicio:
     """Consultar un tramite y servicio por su clave"""
     clave = safe_clave(clave)
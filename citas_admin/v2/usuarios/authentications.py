@@ -5,15 +5,18 @@ from datetime import datetime
 import re
 from typing import Optional
 
-from hashids import Hashids
 from fastapi.security.api_key import APIKeyHeader
-from fastapi import HTTPException, Depends
+from fastapi import HTTPException, Depends, Request
 from sqlalchemy.orm import Session
-from starlette.status import HTTP_403_FORBIDDEN
+from starlette.status import HTTP_403_FORBIDDEN, HTTP_429_TOO_MANY_REQUESTS
 from unidecode import unidecode
 
+from config.settings import Settings, get_settings
 from lib.database import get_db
 from lib.exceptions import CitasAuthenticationError
+from lib.hashids import cifrar_email
+from lib.invalidacion import cache_invalidable
+from lib.rate_limit import consumir_ficha, get_modulo_from_path, get_retry_after
 
 from .models import Usuario
 from .schemas import UsuarioInDB
@@ -22,11 +25,12 @@ API_KEY_REGEXP = r"^\w+\.\w+\.\w+$"
 X_API_KEY = APIKeyHeader(name="X-Api-Key")
 
 
+@cache_invalidable("usuarios", "usuarios_roles", "roles", "permisos", "modulos", "autoridades", "distritos", "oficinas", por_id="usuarios")
 def get_user(
     usuario_id: int,
     db: Session = Depends(get_db),
 ) -> Optional[UsuarioInDB]:
-    """Get user from email"""
+    """Get user from id, queda en cache hasta que cambie el usuario, sus roles, sus permisos o su adscripcion"""
     usuario = db.query(Usuario).get(usuario_id)
     if usuario:
         return UsuarioInDB(
@@ -88,7 +92,7 @@ def authenticate_user(
         raise CitasAuthenticationError("No es igual la api_key al dato en la base de datos")
 
     # Validar el email
-    if api_key_email != Hashids(salt=usuario.email, min_length=8).encode(1):
+    if api_key_email != cifrar_email(usuario.email):
         raise CitasAuthenticationError("No coincide el correo electronico")
 
     # Validar el tiempo de expiracion
@@ -104,8 +108,10 @@ def authenticate_user(
 
 
 async def get_current_active_user(
+    request: Request,
     api_key: str = Depends(X_API_KEY),
     db: Session = Depends(get_db),
+    settings: Settings = Depends(get_settings),
 ):
     """Get current active user"""
 
@@ -115,5 +121,10 @@ async def get_current_active_user(
     except CitasAuthenticationError as error:
         raise HTTPException(status_code=HTTP_403_FORBIDDEN, detail=str(error)) from error
 
+    # Limitar las peticiones del usuario en el modulo de la ruta
+    espera = await consumir_ficha(usuario.id, get_modulo_from_path(request.url.path), settings)
+    if espera > 0:
+        raise HTTPException(status_code=HTTP_429_TOO_MANY_REQUESTS, detail="Too Many Requests", headers={"Retry-After": get_retry_after(espera)})
+
     # Entregar
     return usuario
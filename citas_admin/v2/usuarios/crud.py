@@ -7,6 +7,7 @@ from typing import Any
 from sqlalchemy.orm import Session
 
 from lib.exceptions import CitasIsDeletedError, CitasNotExistsError, CitasNotValidParamError
+from lib.invalidacion import invalidar
 from lib.pwgen import generar_api_key
 from lib.safe_string import safe_email
 
@@ -73,5 +74,6 @@ def get_new_api_key(db: Session, usuario_id: int, dias: int = 90) -> str:
     usuario.api_key = generar_api_key(hashid=usuario.encode_id(), email=usuario.email)
     usuario.api_key_expiracion = datetime.now() + timedelta(days=dias)
     db.add(usuario)
+    invalidar(db, "usuarios", usuario.id)  # Los workers quitan de su cache la api_key anterior
     db.commit()
     return usuario.api_key
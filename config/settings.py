@@ -8,16 +8,32 @@ from pydantic import BaseSettings
 class Settings(BaseSettings):
     """Settings"""
 
+    cache_invalidacion: bool = True
+    compresion_brotli: bool = True
+    compresion_minimo: int = 1024
+    compresion_nivel_brotli: int = 4
+    compresion_nivel_gzip: int = 6
     db_host: str
     db_port: int
     db_name: str
     db_pass: str
     db_user: str
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: int = 30
     limite_citas_pendientes: int
+    metrics_dir: str = ""
+    metrics_token: str = ""
+    openapi_file: str = ""
     origins: str
     poll_system_url: str
     poll_service_url: str
+    rate_limits: str = ""
+    rate_limit_file: str = "rate_limit.sqlite3"
+    rate_limit_store: str = "memory"
     salt: str
+    sql_profiler: bool = False
+    sql_profiler_budget: int = 0
     tz: str
 
     class Config:
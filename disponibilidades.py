@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Extender o verificar las horas disponibles precalculadas de cada servicio en cada oficina
+
+Cada noche, despues de reconstruir los contadores de citas, borre las fechas pasadas y agregue los dias nuevos
+
+    python ocupaciones.py reconstruir
+    python disponibilidades.py extender
+
+Para comparar lo guardado con el calculo en vivo, entrega 1 si hay diferencias, con --corregir las vuelve a calcular
+
+    python disponibilidades.py verificar --oficina 12
+    python disponibilidades.py verificar --corregir
+"""
+import argparse
+import sys
+
+# pylint: disable=unused-import
+import citas_admin.app  # Cargar todos los modelos para que se resuelvan las relaciones
+from citas_admin.v2.cit_dias_disponibles.crud import get_cit_dias_disponibles
+from citas_admin.v2.cit_disponibilidades.crud import extender_cit_disponibilidades, verificar_cit_disponibilidades
+from config.settings import get_settings
+from lib.database import get_session_local
+
+
+def main():
+    """Main"""
+
+    # Parsear argumentos
+    parser = argparse.ArgumentParser(description="Extender o verificar las horas disponibles precalculadas")
+    parser.add_argument("accion", type=str, choices=["extender", "verificar"])
+    parser.add_argument("--oficina", type=int, default=None, help="ID de la oficina, default todas")
+    parser.add_argument("--corregir", action="store_true", help="Al verificar, volver a calcular lo que difiere")
+    args = parser.parse_args()
+
+    # Ejecutar en los dias disponibles
+    db = get_session_local()()
+    try:
+        fechas = get_cit_dias_disponibles(db=db, settings=get_settings())
+        if args.accion == "extender":
+            cantidad = extender_cit_disponibilidades(db, fechas, args.oficina)
+            print(f"Se agregaron {cantidad} horas del {fechas[0]} al {fechas[-1]}")
+            return 0
+        diferencias = verificar_cit_disponibilidades(db, fechas, args.oficina, args.corregir)
+        for oficina_id, cit_servicio_id, fecha, hora, guardada, calculada in diferencias:
+            print(f"Oficina {oficina_id} servicio {cit_servicio_id} {fecha} {hora}: guardada {guardada} y calculada {calculada}")
+        print(f"Hay {len(diferencias)} diferencias del {fechas[0]} al {fechas[-1]}" + (", se corrigieron" if args.corregir and diferencias else ""))
+        return 1 if diferencias else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Generar el esquema OpenAPI en un archivo, para que la API lo lea en lugar de construirlo
+
+Se ejecuta al construir la imagen, despues la API lo usa con la variable de entorno OPENAPI_FILE
+
+    python generar_openapi.py openapi.json
+"""
+import argparse
+import json
+import os
+import sys
+
+# Valores por defecto para poder importar la aplicacion sin un archivo .env, el esquema no depende de ellos
+for variable, valor in {
+    "DB_HOST": "127.0.0.1",
+    "DB_PORT": "5432",
+    "DB_NAME": "openapi",
+    "DB_PASS": "openapi",
+    "DB_USER": "openapi",
+    "LIMITE_CITAS_PENDIENTES": "30",
+    "ORIGINS": "http://127.0.0.1",
+    "POLL_SYSTEM_URL": "http://127.0.0.1/poll_system",
+    "POLL_SERVICE_URL": "http://127.0.0.1/poll_service",
+    "SALT": "openapi",
+    "TZ": "America/Mexico_City",
+}.items():
+    os.environ.setdefault(variable, valor)
+os.environ["OPENAPI_FILE"] = ""
+
+
+def main():
+    """Main"""
+
+    # Parsear argumentos
+    parser = argparse.ArgumentParser(description="Generar el esquema OpenAPI")
+    parser.add_argument("archivo", type=str, nargs="?", default="openapi.json", help="Archivo default openapi.json")
+    args = parser.parse_args()
+
+    # Construir el esquema
+    # pylint: disable=import-outside-toplevel
+    from citas_admin.app import app
+
+    # Guardar
+    with open(args.archivo, "w", encoding="utf8") as archivo:
+        json.dump(app.openapi(), archivo, ensure_ascii=False)
+    print(f"Esquema OpenAPI en {args.archivo}")
+
+
+if __name__ == "__main__":
+    main()
+    sys.exit(0)
@@ -0,0 +1,83 @@
+"""
+Campos, entregar solo los campos pedidos en los listados con fields=id,inicio,estado
+
+Los campos se validan contra el esquema de la respuesta. Cada CRUD declara que columnas de su modelo
+y que columnas de sus relaciones necesita cada campo, asi el SELECT solo trae esas columnas
+y solo se hace JOIN con las relaciones que se usan. La respuesta se entrega con un esquema
+reducido a los campos pedidos, sin las demas llaves. Tambien entrega los incluidos, vea lib/incluidos.py
+"""
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi_pagination.api import resolve_params
+from fastapi_pagination.ext.sqlalchemy import paginate_query
+from pydantic import BaseModel, create_model
+from sqlalchemy.orm import Query, joinedload, load_only
+
+from lib.exceptions import CitasNotValidParamError
+from lib.fastapi_pagination_custom_page import CustomPage, PageResult
+from lib.incluidos import Incluidos
+
+# Cada campo del esquema con lo que necesita cargar: columnas del modelo o tuplas con la relacion y la columna
+MapaCampos = Dict[str, Sequence[Any]]
+
+
+def get_campos_from_str(fields: str, esquema: Type[BaseModel]) -> List[str]:
+    """Convertir los campos separados por comas en una lista, sin repetidos y validados contra el esquema"""
+    campos = []
+    for campo in fields.split(","):
+        campo = campo.strip()
+        if campo == "" or campo in campos:
+            continue
+        if campo not in esquema.__fields__:
+            raise CitasNotValidParamError(f"No es válido el campo {campo}")
+        campos.append(campo)
+    if len(campos) == 0:
+        raise CitasNotValidParamError("No se indicaron los campos")
+    return campos
+
+
+def cargar_campos(consulta: Query, mapa: MapaCampos, campos: List[str]) -> Query:
+    """Cargar solo las columnas y las relaciones que necesitan los campos"""
+    columnas = []
+    relaciones = {}
+    for campo in campos:
+        for carga in mapa[campo]:
+            if isinstance(carga, tuple):
+                relacion, columna = carga
+                relaciones.setdefault(relacion, []).append(columna)
+            else:
+                columnas.append(carga)
+    # Sin columnas propias igual se necesita load_only para no traer las demas, la llave primaria siempre se carga
+    opciones = [load_only(*(columnas or mapa["id"]))]
+    opciones += [joinedload(relacion).load_only(*columnas_relacion) for relacion, columnas_relacion in relaciones.items()]
+    return consulta.options(*opciones)
+
+
+@lru_cache(maxsize=256)
+def get_esquema_campos(esquema: Type[BaseModel], campos: Tuple[str, ...]) -> Type[BaseModel]:
+    """Esquema reducido a los campos pedidos, se crea una vez por combinacion de campos"""
+    definiciones = {campo: (esquema.__fields__[campo].outer_type_, None) for campo in campos}
+    return create_model(f"{esquema.__name__}Campos", __config__=esquema.__config__, **definiciones)
+
+
+def paginate_campos(consulta: Query, esquema: Type[BaseModel], campos: Optional[List[str]], incluidos: Optional[Incluidos] = None) -> JSONResponse:
+    """Paginar como paginate, pero entregando solo los campos pedidos y con los registros relacionados incluidos"""
+    params = resolve_params()
+    total = consulta.count()
+    registros = paginate_query(consulta, params).all()
+    # Los incluidos se cargan antes, asi las relaciones de los registros se toman de la sesion sin consultar una por una
+    incluidos_cargados = incluidos.cargar(registros) if incluidos is not None else None
+    if campos is None:
+        esquema_campos = esquema
+        items = [esquema.from_orm(registro) for registro in registros]
+    else:
+        esquema_campos = get_esquema_campos(esquema, tuple(campos))
+        items = [esquema_campos(**{campo: getattr(registro, campo) for campo in campos}) for registro in registros]
+    raw_params = params.to_raw_params()
+    pagina = jsonable_encoder(CustomPage[esquema_campos](result=PageResult(total=total, items=items, limit=raw_params.limit, offset=raw_params.offset)))
+    if incluidos_cargados is not None:
+        pagina["included"] = jsonable_encoder(incluidos_cargados)
+    return JSONResponse(content=pagina)
@@ -0,0 +1,55 @@
+"""
+Coalescencia, una sola consulta para las peticiones identicas que llegan al mismo tiempo
+
+Las rutas de disponibilidad y de estadisticas calculan en el threadpool con coalescer, asi no detienen
+el event loop. Si mientras se calcula llega otra peticion con la misma clave, la de los parametros normalizados,
+espera el mismo resultado en lugar de consultar otra vez. No es un cache, al terminar el calculo
+la clave se quita y la siguiente peticion vuelve a consultar. Los errores tambien se entregan a todas.
+
+El resultado se comparte entre las peticiones, debe ser un valor ya consultado que las rutas no modifiquen.
+Antes de esperar se cierra la sesion de la peticion, asi la conexion que uso la autenticacion vuelve al pool
+y las peticiones que esperan no lo agotan mientras el event loop atiende a las que siguen llegando.
+La funcion recibe su propia sesion, abierta y cerrada en el threadpool, no la de la peticion: si se cancela
+la peticion que empezo el calculo, get_db cierra su sesion mientras el calculo sigue en el otro hilo.
+"""
+import asyncio
+from typing import Any, Callable, Dict, Tuple
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from lib.database import get_session_local
+from lib.metrics import COALESCENCIA_PETICIONES
+
+EN_VUELO: Dict[Tuple, asyncio.Future] = {}
+
+
+def ejecutar_con_sesion(funcion: Callable[[Session], Any]) -> Any:
+    """Ejecutar la funcion con una sesion propia y cerrarla al terminar"""
+    sesion = get_session_local()()
+    try:
+        return funcion(sesion)
+    finally:
+        sesion.close()
+
+
+async def coalescer(db: Session, clave: Tuple, funcion: Callable[[Session], Any]) -> Any:
+    """Ejecutar la funcion en el threadpool o esperar a la que ya se ejecuta con la misma clave, el primer elemento es el nombre"""
+    db.close()  # La funcion recibe su propia sesion
+    futuro = EN_VUELO.get(clave)
+    if futuro is not None:
+        COALESCENCIA_PETICIONES.inc(1.0, clave[0], "coalesced")
+        return await asyncio.shield(futuro)
+    COALESCENCIA_PETICIONES.inc(1.0, clave[0], "executed")
+    futuro = asyncio.ensure_future(run_in_threadpool(ejecutar_con_sesion, funcion))
+    EN_VUELO[clave] = futuro
+
+    def aterrizar(_):
+        if EN_VUELO.get(clave) is futuro:
+            del EN_VUELO[clave]
+        if not futuro.cancelled():
+            futuro.exception()  # Marcar el error como recibido aunque ya no lo espere nadie
+
+    futuro.add_done_callback(aterrizar)
+    # Con shield, si se cancela la peticion que empezo el calculo las demas siguen esperando el resultado
+    return await asyncio.shield(futuro)
@@ -0,0 +1,161 @@
+"""
+Compresion de las respuestas con gzip o brotli
+
+Middleware ASGI que comprime segun Accept-Encoding. Las respuestas completas menores al minimo
+se entregan sin comprimir. Las respuestas que llegan en partes, como las exportaciones,
+se comprimen parte por parte y cada una se vacia al cliente, sin esperar a tener el cuerpo completo.
+No se comprimen los Server-Sent Events, las imagenes ni lo que ya viene comprimido.
+
+Brotli es opcional, se usa si esta instalado el paquete brotli y el cliente lo acepta.
+"""
+from typing import List, Optional, Tuple
+import zlib
+
+from lib.metrics import COMPRESION_BYTES_ENTRADA, COMPRESION_BYTES_SALIDA
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+TIPOS_SIN_COMPRIMIR = ("text/event-stream", "image/", "video/", "audio/", "application/zip", "application/gzip", "application/pdf")
+
+
+def elegir_codificacion(accept_encoding: str, con_brotli: bool) -> Optional[str]:
+    """Elegir br o gzip de lo que acepta el cliente, entrega None si no acepta ninguna"""
+    aceptadas = {}
+    for parte in accept_encoding.lower().split(","):
+        codificacion, _, parametros = parte.strip().partition(";")
+        calidad = 1.0
+        if parametros.strip().startswith("q="):
+            try:
+                calidad = float(parametros.strip()[2:])
+            except ValueError:
+                calidad = 0.0
+        aceptadas[codificacion.strip()] = calidad
+    if con_brotli and brotli is not None and aceptadas.get("br", 0.0) > 0:
+        return "br"
+    if aceptadas.get("gzip", aceptadas.get("*", 0.0)) > 0:
+        return "gzip"
+    return None
+
+
+class Compresor:
+    """Compresor de gzip o brotli que puede vaciar lo comprimido despues de cada parte"""
+
+    def __init__(self, codificacion: str, nivel_gzip: int, nivel_brotli: int):
+        self.codificacion = codificacion
+        if codificacion == "br":
+            self.compresor = brotli.Compressor(quality=nivel_brotli)
+        else:
+            self.compresor = zlib.compressobj(nivel_gzip, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def comprimir(self, datos: bytes, terminar: bool) -> bytes:
+        """Comprimir una parte, si no es la ultima se vacia para que el cliente la reciba ya"""
+        COMPRESION_BYTES_ENTRADA.inc(len(datos), self.codificacion)
+        if self.codificacion == "br":
+            salida = self.compresor.process(datos) + (self.compresor.finish() if terminar else self.compresor.flush())
+        else:
+            salida = self.compresor.compress(datos) + self.compresor.flush(zlib.Z_FINISH if terminar else zlib.Z_SYNC_FLUSH)
+        COMPRESION_BYTES_SALIDA.inc(len(salida), self.codificacion)
+        return salida
+
+
+class CompresionMiddleware:
+    """Middleware ASGI que comprime las respuestas con gzip o brotli"""
+
+    def __init__(self, app, minimo: int = 1024, nivel_gzip: int = 6, nivel_brotli: int = 4, con_brotli: bool = True):
+        self.app = app
+        self.minimo = minimo
+        self.nivel_gzip = nivel_gzip
+        self.nivel_brotli = nivel_brotli
+        self.con_brotli = con_brotli
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = ""
+        for nombre, valor in scope["headers"]:
+            if nombre == b"accept-encoding":
+                accept_encoding = valor.decode("latin-1")
+                break
+        codificacion = elegir_codificacion(accept_encoding, self.con_brotli)
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, RespuestaComprimida(self, codificacion, send).enviar)
+
+
+class RespuestaComprimida:
+    """Estado de la compresion de una respuesta"""
+
+    def __init__(self, middleware: CompresionMiddleware, codificacion: str, send):
+        self.middleware = middleware
+        self.codificacion = codificacion
+        self.send = send
+        self.inicio: Optional[dict] = None
+        self.compresor: Optional[Compresor] = None
+        self.sin_comprimir = False
+
+    def debe_comprimir(self, headers: List[Tuple[bytes, bytes]]) -> bool:
+        """Revisar el tipo, la codificacion y el tamaño que anuncian los encabezados"""
+        if self.inicio["status"] < 200 or self.inicio["status"] in (204, 304):
+            return False
+        for nombre, valor in headers:
+            if nombre == b"content-encoding":
+                return False
+            if nombre == b"content-type" and valor.decode("latin-1").lower().startswith(TIPOS_SIN_COMPRIMIR):
+                return False
+            if nombre == b"content-length" and int(valor) < self.middleware.minimo:
+                return False
+        return True
+
+    def encabezados_comprimidos(self, largo: Optional[int]) -> List[Tuple[bytes, bytes]]:
+        """Encabezados con Content-Encoding y Vary, sin Content-Length si se transmite en partes"""
+        headers = [(nombre, valor) for nombre, valor in self.inicio["headers"] if nombre not in (b"content-length", b"vary")]
+        vary = [valor for nombre, valor in self.inicio["headers"] if nombre == b"vary"]
+        headers.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+        headers.append((b"content-encoding", self.codificacion.encode()))
+        if largo is not None:
+            headers.append((b"content-length", str(largo).encode()))
+        return headers
+
+    async def enviar(self, message):
+        """Send que retiene el inicio de la respuesta hasta saber si se comprime"""
+        if message["type"] == "http.response.start":
+            self.inicio = message
+            if not self.debe_comprimir(message.get("headers", [])):
+                self.sin_comprimir = True
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.sin_comprimir:
+            await self.send(message)
+            return
+        cuerpo = message.get("body", b"")
+        mas = message.get("more_body", False)
+
+        # Primera parte
+        if self.compresor is None:
+            # Respuesta completa, solo se comprime si alcanza el minimo
+            if not mas:
+                if len(cuerpo) < self.middleware.minimo:
+                    self.sin_comprimir = True
+                    await self.send(self.inicio)
+                    await self.send(message)
+                    return
+                comprimido = self.nuevo_compresor().comprimir(cuerpo, terminar=True)
+                await self.send({**self.inicio, "headers": self.encabezados_comprimidos(len(comprimido))})
+                await self.send({"type": "http.response.body", "body": comprimido})
+                return
+            # Respuesta en partes
+            await self.send({**self.inicio, "headers": self.encabezados_comprimidos(None)})
+            self.nuevo_compresor()
+
+        # Cada parte se comprime y se vacia, la ultima termina el flujo comprimido
+        await self.send({"type": "http.response.body", "body": self.compresor.comprimir(cuerpo, terminar=not mas), "more_body": mas})
+
+    def nuevo_compresor(self) -> Compresor:
+        """Crear el compresor de esta respuesta"""
+        self.compresor = Compresor(self.codificacion, self.middleware.nivel_gzip, self.middleware.nivel_brotli)
+        return self.compresor
@@ -1,25 +1,54 @@
 """
 Database
 """
-from fastapi import Depends
+from functools import lru_cache
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-from config.settings import Settings, get_settings
+from config.settings import get_settings
+from lib.metrics import instrumentar_engine
+from lib.sql_profiler import instrumentar_perfil
 
 Base = declarative_base()
 
 
-def get_db(settings: Settings = Depends(get_settings)):
-    """Database dependency"""
+@lru_cache()
+def get_engine() -> Engine:
+    """Engine compartido por el proceso, con su pool de conexiones"""
+    settings = get_settings()
+    engine = create_engine(
+        f"postgresql+psycopg2://{settings.db_user}:{settings.db_pass}@{settings.db_host}:{settings.db_port}/{settings.db_name}",
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_pre_ping=True,
+    )
+    instrumentar_engine(engine, settings.db_max_overflow)
+    if settings.sql_profiler:
+        instrumentar_perfil(engine)
+    return engine
+
+
+@lru_cache()
+def get_session_local() -> sessionmaker:
+    """Fabrica de sesiones ligada al engine compartido"""
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
 
-    # Create engine
-    engine = create_engine(f"postgresql+psycopg2://{settings.db_user}:{settings.db_pass}@{settings.db_host}:{settings.db_port}/{settings.db_name}")
+def reiniciar_pool():
+    """Despues del fork de gunicorn, dejar al proceso padre las conexiones heredadas y empezar un pool nuevo"""
+    if get_engine.cache_info().currsize > 0:
+        get_engine().dispose(close=False)
+
+
+def get_db():
+    """Database dependency"""
 
     # Create session
-    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    session_local = get_session_local()
 
     try:
         db = session_local()
@@ -0,0 +1,177 @@
+"""
+Escucha, un LISTEN de Postgres por proceso que reparte los avisos a las suscripciones
+
+Los avisos se mandan con pg_notify en la misma transaccion que hace el cambio y Postgres
+los entrega a todos los workers al hacer commit. Cada worker abre una sola conexion para escuchar,
+fuera del pool, y la registra en el event loop, asi cada suscripcion solo cuesta una cola en memoria.
+La conexion se abre con la primera suscripcion, por eso psycopg2 se importa hasta entonces, y se abre en el threadpool
+para no detener el event loop; si no se puede conectar se eleva CitasConnectionError.
+
+Cada aviso es una lista JSON de pares [clave, datos], los datos se entregan a las suscripciones de su clave.
+"""
+import asyncio
+import json
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from config.settings import get_settings
+from lib.exceptions import CitasConnectionError
+from lib.metrics import SUSCRIPCIONES
+
+AVISOS_POR_NOTIFY = 50  # El payload de NOTIFY debe ser menor a 8000 bytes
+COLA_MAXIMA = 256
+
+
+def avisar(db: Session, canal: str, avisos: List[Tuple[str, Any]]):
+    """Mandar los avisos con pg_notify en la transaccion en curso, se entregan al hacer commit"""
+    for inicio in range(0, len(avisos), AVISOS_POR_NOTIFY):
+        db.execute(select(func.pg_notify(canal, json.dumps(avisos[inicio : inicio + AVISOS_POR_NOTIFY], default=str))))
+
+
+class Suscripcion:
+    """Cola de los avisos de una clave, si se llena se cierra para que el cliente se vuelva a conectar"""
+
+    __slots__ = ("clave", "cola", "cerrada")
+
+    def __init__(self, clave: str):
+        self.clave = clave
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=COLA_MAXIMA)
+        self.cerrada = False
+
+    def entregar(self, datos: Any):
+        """Agregar los datos a la cola"""
+        if self.cerrada:
+            return
+        try:
+            self.cola.put_nowait(datos)
+        except asyncio.QueueFull:
+            self.cerrada = True
+
+    def cerrar(self):
+        """Cerrar y despertar al que espera"""
+        self.cerrada = True
+        if not self.cola.full():
+            self.cola.put_nowait(None)
+
+    async def siguiente(self, espera: float) -> Optional[Any]:
+        """Esperar los datos del siguiente aviso, entrega None si pasa la espera o si se cerro"""
+        try:
+            return await asyncio.wait_for(self.cola.get(), espera)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Escucha:
+    """LISTEN de un canal en una conexion dedicada, reparte los avisos por clave"""
+
+    def __init__(self, canal: str):
+        self.canal = canal
+        self.conexion = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.suscripciones: Dict[str, Set[Suscripcion]] = {}
+
+    def conectar(self):
+        """Abrir una conexion que escucha el canal, bloquea hasta conectar"""
+        # pylint: disable=import-outside-toplevel
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+        settings = get_settings()
+        try:
+            conexion = psycopg2.connect(host=settings.db_host, port=settings.db_port, dbname=settings.db_name, user=settings.db_user, password=settings.db_pass)
+        except psycopg2.Error as error:
+            raise CitasConnectionError("No se pudo conectar para escuchar los cambios") from error
+        try:
+            conexion.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conexion.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.canal}")
+        except psycopg2.Error as error:
+            conexion.close()
+            raise CitasConnectionError("No se pudo escuchar el canal de los cambios") from error
+        return conexion
+
+    async def iniciar(self):
+        """Abrir la conexion en el threadpool y escuchar el canal en el event loop en curso, si no se ha hecho"""
+        loop = asyncio.get_running_loop()
+        if self.conexion is not None and self.loop is loop:
+            return
+        conexion = await run_in_threadpool(self.conectar)
+        if self.conexion is not None and self.loop is loop:
+            conexion.close()  # Mientras se conectaba, otra suscripcion ya la abrio
+            return
+        self.detener()
+        loop.add_reader(conexion.fileno(), self.recibir)
+        self.conexion = conexion
+        self.loop = loop
+
+    def detener(self):
+        """Dejar de escuchar y cerrar las suscripciones, los clientes se vuelven a conectar"""
+        loop_abierto = self.loop is not None and not self.loop.is_closed()
+        if self.conexion is not None:
+            if loop_abierto:
+                self.loop.remove_reader(self.conexion.fileno())
+            self.conexion.close()
+            self.conexion = None
+        for suscripciones in self.suscripciones.values():
+            for suscripcion in suscripciones:
+                if loop_abierto:
+                    suscripcion.cerrar()
+                else:
+                    suscripcion.cerrada = True
+
+    def recibir(self):
+        """Leer los avisos que llegaron y entregarlos a las suscripciones de cada clave"""
+        # pylint: disable=import-outside-toplevel
+        import psycopg2
+
+        try:
+            self.conexion.poll()
+        except psycopg2.Error:
+            self.detener()  # Se perdio la conexion, la siguiente suscripcion la vuelve a abrir
+            return
+        while self.conexion.notifies:
+            notificacion = self.conexion.notifies.pop(0)
+            try:
+                avisos = json.loads(notificacion.payload)
+            except ValueError:
+                continue
+            for clave, datos in avisos:
+                for suscripcion in self.suscripciones.get(clave, ()):
+                    suscripcion.entregar(datos)
+
+    async def suscribir(self, clave: str) -> Suscripcion:
+        """Suscribirse a los avisos de una clave"""
+        await self.iniciar()
+        suscripcion = Suscripcion(clave)
+        self.suscripciones.setdefault(clave, set()).add(suscripcion)
+        SUSCRIPCIONES.inc(1.0, self.canal)
+        return suscripcion
+
+    def desuscribir(self, suscripcion: Suscripcion):
+        """Quitar la suscripcion"""
+        suscripciones = self.suscripciones.get(suscripcion.clave)
+        if suscripciones is None or suscripcion not in suscripciones:
+            return
+        suscripciones.discard(suscripcion)
+        if len(suscripciones) == 0:
+            del self.suscripciones[suscripcion.clave]
+        SUSCRIPCIONES.dec(1.0, self.canal)
+
+
+ESCUCHAS: Dict[str, Escucha] = {}
+
+
+def get_escucha(canal: str) -> Escucha:
+    """Escucha compartida por el proceso para el canal"""
+    if canal not in ESCUCHAS:
+        ESCUCHAS[canal] = Escucha(canal)
+    return ESCUCHAS[canal]
+
+
+def detener_escuchas():
+    """Al apagar el worker, cerrar las conexiones que escuchan"""
+    for escucha in ESCUCHAS.values():
+        escucha.detener()
@@ -1,27 +1,57 @@
 """
 Cifrado y descrifado de ID por medio de Hashids
+
+Hay un solo codec para el salt de la configuracion, y los resultados se memorizan
+con lru_cache de tamaño limitado, porque los mismos IDs y correos se repiten en cada peticion.
 """
-from typing import Any
+from functools import lru_cache
+from typing import Any, Optional
 import re
 
 from hashids import Hashids
 
 from config.settings import get_settings
 
-settings = get_settings()
-hashids = Hashids(settings.salt, min_length=8)
 hashid_regexp = re.compile("[0-9a-zA-Z]{8,16}")
 
+CACHE_SIZE = 4096
+
+
+@lru_cache()
+def get_hashids() -> Hashids:
+    """Codec compartido para el salt de la configuracion"""
+    return Hashids(get_settings().salt, min_length=8)
+
 
+@lru_cache(maxsize=CACHE_SIZE)
 def cifrar_id(un_id: int) -> str:
     """Cifrar ID"""
-    return hashids.encode(un_id)
+    return get_hashids().encode(un_id)
 
 
+@lru_cache(maxsize=CACHE_SIZE)
 def descifrar_id(un_id_hasheado: str) -> Any:
     """Descifrar ID"""
     if hashid_regexp.match(un_id_hasheado):
-        pag_pago_id = hashids.decode(un_id_hasheado)
+        pag_pago_id = get_hashids().decode(un_id_hasheado)
         if len(pag_pago_id) == 1:
             return pag_pago_id[0]
     return None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def decode_id(id_encoded: str) -> Optional[int]:
+    """Descifrar ID, la cadena completa debe ser un hashid y entrega el primer numero"""
+    if hashid_regexp.fullmatch(id_encoded) is None:
+        return None
+    descifrado = get_hashids().decode(id_encoded)
+    try:
+        return descifrado[0]
+    except IndexError:
+        return None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def cifrar_email(email: str) -> str:
+    """Cifrar el segmento del email que va en la API key, usa el email como salt"""
+    return Hashids(salt=email, min_length=8).encode(1)
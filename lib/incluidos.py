@@ -0,0 +1,70 @@
+"""
+Incluidos, entregar junto con un listado los registros relacionados con include=cit_cliente,oficina
+
+Cada relacion se consulta con un solo IN con los ids distintos de la pagina, con la misma funcion
+de lote que usan las rutas /lote. Se entregan en included, un diccionario por relacion con cada registro
+por su id, sin repetir. Los que no existen o estan eliminados no se incluyen, igual que no los entrega su detalle.
+Cada relacion declara el modulo de sus rutas, las rutas revisan con get_modulos_incluidos que el usuario
+pueda ver esos modulos antes de incluirlos.
+"""
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple, Type
+
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from lib.exceptions import CitasAnyError, CitasNotValidParamError
+
+
+class Relacion(NamedTuple):
+    """Relacion que se puede incluir: la columna con su id, la funcion que consulta un lote, el esquema y el modulo que se necesita ver"""
+
+    columna: str
+    consultar_lote: Callable[[Session, List[int]], List[Tuple[int, Any]]]
+    esquema: Type[BaseModel]
+    modulo: str
+
+
+def get_modulos_incluidos(relaciones: Dict[str, Relacion], include: str) -> List[str]:
+    """Entregar los modulos de las relaciones pedidas con include, para revisar los permisos antes de incluirlas"""
+    return sorted({relaciones[nombre.strip()].modulo for nombre in include.split(",") if nombre.strip() in relaciones})
+
+
+class Incluidos:
+    """Relaciones pedidas con include, validadas contra las que tiene el listado"""
+
+    def __init__(self, db: Session, relaciones: Dict[str, Relacion], include: str):
+        self.db = db
+        self.relaciones = {}
+        self.registros = []
+        for nombre in include.split(","):
+            nombre = nombre.strip()
+            if nombre == "" or nombre in self.relaciones:
+                continue
+            if nombre not in relaciones:
+                raise CitasNotValidParamError(f"No se puede incluir {nombre}, se puede incluir {','.join(relaciones)}")
+            self.relaciones[nombre] = relaciones[nombre]
+        if len(self.relaciones) == 0:
+            raise CitasNotValidParamError("No se indicaron las relaciones a incluir")
+
+    @property
+    def columnas(self) -> List[str]:
+        """Columnas con los ids de las relaciones, deben cargarse aunque no se pidan en fields"""
+        return [relacion.columna for relacion in self.relaciones.values()]
+
+    def cargar(self, registros: List[Any]) -> Dict[str, Dict[int, BaseModel]]:
+        """Consultar cada relacion con un solo IN con los ids distintos de los registros
+
+        Los registros relacionados se guardan para que sigan en el identity map de la sesion,
+        asi las propiedades como cit_cliente_nombre los toman de ahi sin consultarlos uno por uno.
+        """
+        incluidos = {}
+        for nombre, relacion in self.relaciones.items():
+            ids = sorted({getattr(registro, relacion.columna) for registro in registros} - {None})
+            incluidos[nombre] = {}
+            if len(ids) == 0:
+                continue
+            for un_id, resultado in relacion.consultar_lote(self.db, ids):
+                if not isinstance(resultado, CitasAnyError):
+                    self.registros.append(resultado)
+                    incluidos[nombre][un_id] = relacion.esquema.from_orm(resultado)
+        return incluidos
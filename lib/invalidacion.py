@@ -0,0 +1,231 @@
+"""
+Invalidacion, caches en memoria que se vacian cuando cambian sus tablas en cualquier worker
+
+Los disparadores de la migracion 9c5e1f3a7b20 mandan con pg_notify el nombre de la tabla y el id
+del renglon que cambio, asi avisan tambien los cambios que hacen los otros sistemas. Desde la aplicacion
+se puede avisar igual con invalidar. Cada worker tiene un hilo con una conexion que escucha el canal
+y quita de sus caches las entradas de esa tabla, en el orden en que Postgres entrega los avisos.
+
+Una funcion se vuelve cache con el decorador cache_invalidable, indicando las tablas de las que depende.
+Mientras no se escucha, porque no ha iniciado o porque se perdio la conexion, los caches no entregan
+ni guardan nada y cada llamada consulta la base de datos. Al volver a conectar se vacian todos,
+porque los avisos que llegaron mientras tanto se perdieron.
+"""
+from collections import OrderedDict
+from functools import wraps
+import json
+import select
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from config.settings import get_settings
+from lib.escucha import avisar
+from lib.metrics import CACHE_CONSULTAS, CACHE_ESCUCHA_CONECTADA, CACHE_INVALIDACIONES
+
+CANAL = "cache_invalidacion"
+ESPERA_SELECT = 1.0
+ESPERA_RECONEXION = 1.0
+ESPERA_RECONEXION_MAXIMA = 30.0
+
+
+def invalidar(db: Session, tabla: str, clave: Optional[int] = None):
+    """Avisar en la transaccion en curso que cambio un renglon de la tabla, o toda si no se da la clave"""
+    avisar(db, CANAL, [(tabla, clave)])
+
+
+class CacheInvalidable:
+    """Cache LRU de una funcion, sus entradas se quitan con los avisos de sus tablas"""
+
+    def __init__(self, nombre: str, tablas: Tuple[str, ...], por_id: Optional[str], maxsize: int):
+        self.nombre = nombre
+        self.tablas = tablas
+        self.por_id = por_id
+        self.maxsize = maxsize
+        self.entradas: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self.generacion = 0
+        self.candado = threading.Lock()
+
+    def obtener(self, llave: Tuple) -> Tuple[bool, Any, int]:
+        """Entrega si se encontro, el valor y la generacion con la que se debe guardar si no se encontro"""
+        with self.candado:
+            if llave in self.entradas:
+                self.entradas.move_to_end(llave)
+                return True, self.entradas[llave], self.generacion
+            return False, None, self.generacion
+
+    def guardar(self, llave: Tuple, valor: Any, generacion: int):
+        """Guardar solo si no llego un aviso mientras se consultaba, si llego el valor puede ser viejo"""
+        with self.candado:
+            if generacion != self.generacion:
+                return
+            self.entradas[llave] = valor
+            self.entradas.move_to_end(llave)
+            while len(self.entradas) > self.maxsize:
+                self.entradas.popitem(last=False)
+
+    def invalidar(self, tabla: str, clave: Optional[Any]):
+        """Quitar la entrada de la clave si la tabla es la de por_id, o todas si es otra tabla"""
+        with self.candado:
+            self.generacion += 1
+            if tabla == self.por_id and clave is not None:
+                self.entradas.pop((clave,), None)
+            else:
+                self.entradas.clear()
+
+    def limpiar(self):
+        """Quitar todas las entradas"""
+        with self.candado:
+            self.generacion += 1
+            self.entradas.clear()
+
+
+class BusInvalidaciones:
+    """Hilo que escucha el canal en una conexion dedicada y reparte los avisos a los caches"""
+
+    def __init__(self, canal: str = CANAL):
+        self.canal = canal
+        self.caches: Dict[str, List[CacheInvalidable]] = {}
+        self.conectado = threading.Event()
+        self.detenido = threading.Event()
+        self.hilo: Optional[threading.Thread] = None
+        self.conexion = None
+        self.conexiones = 0
+
+    def registrar(self, cache: CacheInvalidable):
+        """Registrar un cache en cada una de sus tablas"""
+        for tabla in cache.tablas:
+            self.caches.setdefault(tabla, []).append(cache)
+
+    def todos(self) -> List[CacheInvalidable]:
+        """Caches registrados, sin repetir"""
+        caches = []
+        for en_tabla in self.caches.values():
+            caches.extend(cache for cache in en_tabla if cache not in caches)
+        return caches
+
+    def iniciar(self):
+        """Arrancar el hilo que escucha, si no se ha hecho"""
+        if self.hilo is not None and self.hilo.is_alive():
+            return
+        self.detenido.clear()
+        self.hilo = threading.Thread(target=self.escuchar, name="invalidaciones", daemon=True)
+        self.hilo.start()
+
+    def detener(self):
+        """Detener el hilo y cerrar la conexion"""
+        self.detenido.set()
+        if self.hilo is not None:
+            self.hilo.join(ESPERA_SELECT * 2)
+            self.hilo = None
+        self.desconectar()
+
+    def conectar(self):
+        """Abrir la conexion, escuchar el canal y vaciar los caches, los avisos anteriores se perdieron"""
+        # pylint: disable=import-outside-toplevel
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+        settings = get_settings()
+        conexion = psycopg2.connect(host=settings.db_host, port=settings.db_port, dbname=settings.db_name, user=settings.db_user, password=settings.db_pass)
+        conexion.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with conexion.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.canal}")
+        self.conexion = conexion
+        self.conexiones += 1
+        for cache in self.todos():
+            cache.limpiar()
+        self.conectado.set()
+        CACHE_ESCUCHA_CONECTADA.set(1.0)
+
+    def desconectar(self):
+        """Dejar de usar los caches y cerrar la conexion"""
+        self.conectado.clear()
+        CACHE_ESCUCHA_CONECTADA.set(0.0)
+        for cache in self.todos():
+            cache.limpiar()
+        if self.conexion is not None:
+            try:
+                self.conexion.close()
+            except Exception:  # pylint: disable=broad-except
+                pass
+            self.conexion = None
+
+    def escuchar(self):
+        """Bucle del hilo, si se pierde la conexion se vuelve a abrir esperando cada vez el doble"""
+        # pylint: disable=import-outside-toplevel
+        import psycopg2
+
+        espera = ESPERA_RECONEXION
+        while not self.detenido.is_set():
+            try:
+                if self.conexion is None:
+                    self.conectar()
+                    espera = ESPERA_RECONEXION
+                listos, _, _ = select.select([self.conexion], [], [], ESPERA_SELECT)
+                if listos:
+                    self.conexion.poll()
+                    while self.conexion.notifies:
+                        self.recibir(self.conexion.notifies.pop(0).payload)
+            except (psycopg2.Error, OSError, ValueError):
+                self.desconectar()
+                self.detenido.wait(espera)
+                espera = min(espera * 2, ESPERA_RECONEXION_MAXIMA)
+
+    def recibir(self, payload: str):
+        """Quitar de los caches de cada tabla las entradas de los avisos"""
+        try:
+            avisos = json.loads(payload)
+        except ValueError:
+            return
+        for tabla, clave in avisos:
+            CACHE_INVALIDACIONES.inc(1.0, tabla)
+            for cache in self.caches.get(tabla, ()):
+                cache.invalidar(tabla, clave)
+
+
+BUS = BusInvalidaciones()
+
+
+def cache_invalidable(*tablas: str, por_id: Optional[str] = None, maxsize: int = 1024) -> Callable:
+    """Decorador para guardar en un cache los resultados de la funcion, se vacia con los avisos de las tablas
+
+    La llave son los argumentos sin la sesion. Con por_id, un aviso de esa tabla solo quita la entrada
+    cuyo primer argumento es el id del renglon, los avisos de las demas tablas vacian todo el cache.
+    Los resultados se comparten entre peticiones, deben ser valores que no se modifiquen ni ligados a la sesion.
+    """
+
+    def decorador(funcion: Callable) -> Callable:
+        cache = CacheInvalidable(funcion.__qualname__, tablas + ((por_id,) if por_id and por_id not in tablas else ()), por_id, maxsize)
+        BUS.registrar(cache)
+
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not BUS.conectado.is_set():
+                CACHE_CONSULTAS.inc(1.0, cache.nombre, "sin_escucha")
+                return funcion(*args, **kwargs)
+            llave = tuple(arg for arg in args if not isinstance(arg, Session)) + tuple(sorted((nombre, valor) for nombre, valor in kwargs.items() if not isinstance(valor, Session)))
+            encontrado, valor, generacion = cache.obtener(llave)
+            if encontrado:
+                CACHE_CONSULTAS.inc(1.0, cache.nombre, "acierto")
+                return valor
+            CACHE_CONSULTAS.inc(1.0, cache.nombre, "fallo")
+            valor = funcion(*args, **kwargs)
+            cache.guardar(llave, valor, generacion)
+            return valor
+
+        envoltura.cache = cache
+        return envoltura
+
+    return decorador
+
+
+def iniciar_invalidaciones():
+    """Al arrancar el worker, empezar a escuchar los avisos"""
+    BUS.iniciar()
+
+
+def detener_invalidaciones():
+    """Al apagar el worker, dejar de escuchar los avisos"""
+    BUS.detener()
@@ -0,0 +1,67 @@
+"""
+Lotes, consultar varios registros por sus ids con una sola consulta
+
+Se entregan en el orden en que se pidieron, los que no existen o estan eliminados
+van con success en falso y el mismo mensaje que el detalle de un registro.
+"""
+from typing import Any, List, Tuple, Type
+
+from pydantic import BaseModel
+from sqlalchemy.orm import Query
+
+from lib.exceptions import CitasAnyError, CitasIsDeletedError, CitasNotExistsError, CitasNotValidParamError
+from lib.fastapi_pagination_custom_list import CustomList, ListResult
+
+LOTE_MAXIMO = 100
+
+
+class LoteIn(BaseModel):
+    """Esquema para recibir un lote de ids"""
+
+    ids: List[int]
+
+
+def validar_ids(ids: List[int]) -> List[int]:
+    """Validar la cantidad de ids y que sean positivos"""
+    if len(ids) == 0:
+        raise CitasNotValidParamError("No se indicaron los ids")
+    if len(ids) > LOTE_MAXIMO:
+        raise CitasNotValidParamError(f"Se pueden consultar hasta {LOTE_MAXIMO} ids a la vez")
+    if any(un_id <= 0 for un_id in ids):
+        raise CitasNotValidParamError("No son válidos los ids")
+    return ids
+
+
+def get_ids_from_str(ids_str: str) -> List[int]:
+    """Convertir los ids separados por comas, como 1,2,3, en una lista de enteros"""
+    try:
+        ids = [int(elemento) for elemento in ids_str.split(",") if elemento.strip() != ""]
+    except ValueError as error:
+        raise CitasNotValidParamError("No son válidos los ids") from error
+    return validar_ids(ids)
+
+
+def consultar_lote(consulta: Query, modelo: Type, ids: List[int], nombre: str) -> List[Tuple[int, Any]]:
+    """Consultar los ids con un solo IN, entrega cada id con su registro o con la excepcion que tendria el detalle"""
+    registros = {registro.id: registro for registro in consulta.filter(modelo.id.in_(set(ids))).all()}
+    lote = []
+    for un_id in ids:
+        registro = registros.get(un_id)
+        if registro is None:
+            lote.append((un_id, CitasNotExistsError(f"No existe ese {nombre}")))
+        elif registro.estatus != "A":
+            lote.append((un_id, CitasIsDeletedError(f"No es activo ese {nombre}, está eliminado")))
+        else:
+            lote.append((un_id, registro))
+    return lote
+
+
+def entregar_lote(lote: List[Tuple[int, Any]], esquema: Type[BaseModel]) -> CustomList:
+    """Entregar el lote como lista personalizada, el esquema debe heredar de OneBaseOut"""
+    items = []
+    for un_id, resultado in lote:
+        if isinstance(resultado, CitasAnyError):
+            items.append(esquema(id=un_id, success=False, message=str(resultado)))
+        else:
+            items.append(esquema.from_orm(resultado))
+    return CustomList(result=ListResult(total=len(items), items=items, size=len(items)))
@@ -0,0 +1,395 @@
+"""
+Metricas en formato de texto de Prometheus
+
+Cada worker lleva sus propias metricas en memoria, las escribe el middleware,
+los eventos del engine de SQLAlchemy y el cliente del banco.
+
+Con gunicorn cada peticion a /metrics llega a un worker distinto, por eso con MetricasCompartidas cada worker
+guarda sus metricas en un archivo de un directorio compartido y la respuesta suma las de todos. Los contadores
+y los histogramas de los workers que terminan se acumulan en otro archivo para que los totales nunca bajen,
+los medidores solo suman a los workers vivos.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+import fcntl
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DURACION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SENTENCIAS_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+RUTA_NO_ENCONTRADA = "no_encontrada"
+
+
+def escapar_etiqueta(valor: str) -> str:
+    """Escapar el valor de una etiqueta"""
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def formatear_etiquetas(nombres: Tuple[str, ...], valores: Tuple[str, ...], extra: str = "") -> str:
+    """Formatear las etiquetas como {nombre="valor",...}"""
+    pares = [f'{nombre}="{escapar_etiqueta(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    if len(pares) == 0:
+        return ""
+    return "{" + ",".join(pares) + "}"
+
+
+class Metrica:
+    """Metrica con etiquetas"""
+
+    tipo = "untyped"
+
+    def __init__(self, nombre: str, descripcion: str, etiquetas: Tuple[str, ...] = ()):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.etiquetas = etiquetas
+        self.valores: Dict[Tuple[str, ...], float] = {}
+        self.candado = threading.Lock()
+        REGISTRO.append(self)
+
+    def inc(self, cantidad: float = 1.0, *valores: str):
+        """Incrementar"""
+        with self.candado:
+            self.valores[valores] = self.valores.get(valores, 0.0) + cantidad
+
+    def set(self, cantidad: float, *valores: str):
+        """Definir el valor"""
+        with self.candado:
+            self.valores[valores] = cantidad
+
+    def exportar(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        """Copiar las etiquetas y los valores"""
+        with self.candado:
+            return list(self.valores.items())
+
+    def renglones(self, valores: Optional[Dict[Tuple[str, ...], float]] = None) -> List[str]:
+        """Renglones con los valores, los propios o los sumados de todos los workers"""
+        if valores is None:
+            valores = dict(self.exportar())
+        return [f"{self.nombre}{formatear_etiquetas(self.etiquetas, etiquetas)} {cantidad}" for etiquetas, cantidad in valores.items()]
+
+
+class Counter(Metrica):
+    """Contador"""
+
+    tipo = "counter"
+
+
+class Gauge(Metrica):
+    """Medidor"""
+
+    tipo = "gauge"
+
+    def dec(self, cantidad: float = 1.0, *valores: str):
+        """Decrementar"""
+        self.inc(-cantidad, *valores)
+
+
+class Histogram(Metrica):
+    """Histograma, solo incrementa el bucket que corresponde y acumula al entregar"""
+
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, descripcion: str, etiquetas: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DURACION_BUCKETS):
+        super().__init__(nombre, descripcion, etiquetas)
+        self.buckets = buckets
+        self.series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, cantidad: float, *valores: str):
+        """Observar un valor"""
+        posicion = bisect_left(self.buckets, cantidad)
+        with self.candado:
+            serie = self.series.get(valores)
+            if serie is None:
+                serie = [0.0] * (len(self.buckets) + 3)  # Un lugar por bucket, +Inf, suma y cuenta
+                self.series[valores] = serie
+            serie[posicion] += 1
+            serie[-2] += cantidad
+            serie[-1] += 1
+
+    def exportar(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        """Copiar las etiquetas y las series"""
+        with self.candado:
+            return [(valores, list(serie)) for valores, serie in self.series.items()]
+
+    def renglones(self, valores: Optional[Dict[Tuple[str, ...], List[float]]] = None) -> List[str]:
+        """Renglones con los buckets acumulados, la suma y la cuenta"""
+        if valores is None:
+            valores = dict(self.exportar())
+        renglones = []
+        for etiquetas, serie in valores.items():
+            acumulado = 0.0
+            for limite, cantidad in zip(self.buckets + ("+Inf",), serie):
+                acumulado += cantidad
+                le = f'le="{limite}"'
+                renglones.append(f"{self.nombre}_bucket{formatear_etiquetas(self.etiquetas, etiquetas, le)} {acumulado}")
+            renglones.append(f"{self.nombre}_sum{formatear_etiquetas(self.etiquetas, etiquetas)} {serie[-2]}")
+            renglones.append(f"{self.nombre}_count{formatear_etiquetas(self.etiquetas, etiquetas)} {serie[-1]}")
+        return renglones
+
+
+REGISTRO: List[Metrica] = []
+RECOLECTORES: List[Callable[[], None]] = []
+
+HTTP_EN_CURSO = Gauge("http_requests_in_progress", "Peticiones HTTP en curso", ("method",))
+HTTP_DURACION = Histogram("http_request_duration_seconds", "Duracion de las peticiones HTTP", ("method", "route", "status"))
+SQL_SENTENCIAS = Counter("db_statements_total", "Sentencias SQL ejecutadas")
+SQL_SENTENCIAS_POR_PETICION = Histogram("db_statements_per_request", "Sentencias SQL por peticion", ("route",), SENTENCIAS_BUCKETS)
+SQL_DURACION_POR_PETICION = Histogram("db_time_per_request_seconds", "Tiempo en la base de datos por peticion", ("route",))
+POOL_TAMANO = Gauge("db_pool_size", "Conexiones permanentes del pool")
+POOL_OCUPADAS = Gauge("db_pool_checked_out", "Conexiones del pool en uso")
+POOL_EXCEDENTES = Gauge("db_pool_overflow", "Conexiones abiertas por encima del tamano del pool")
+POOL_SATURACIONES = Counter("db_pool_saturations_total", "Veces que se entrego la ultima conexion disponible del pool")
+COMPRESION_BYTES_ENTRADA = Counter("http_response_bytes_uncompressed_total", "Bytes de las respuestas antes de comprimir", ("encoding",))
+COMPRESION_BYTES_SALIDA = Counter("http_response_bytes_compressed_total", "Bytes de las respuestas despues de comprimir", ("encoding",))
+SUSCRIPCIONES = Gauge("event_subscriptions", "Suscripciones abiertas a eventos", ("channel",))
+CACHE_CONSULTAS = Counter("cache_requests_total", "Consultas a los caches invalidables", ("cache", "result"))
+CACHE_INVALIDACIONES = Counter("cache_invalidations_total", "Avisos de cambios recibidos para invalidar los caches", ("table",))
+CACHE_ESCUCHA_CONECTADA = Gauge("cache_invalidation_listener_connected", "Si el worker esta escuchando los avisos para invalidar los caches")
+COALESCENCIA_PETICIONES = Counter("coalescing_requests_total", "Peticiones que ejecutaron el calculo o esperaron el de otra identica", ("operation", "result"))
+BANCO_DURACION = Histogram("bank_request_duration_seconds", "Duracion de las peticiones al banco", ("result",))
+
+
+class EstadisticasSQL:
+    """Sentencias y tiempo en la base de datos de una peticion"""
+
+    __slots__ = ("sentencias", "duracion")
+
+    def __init__(self):
+        self.sentencias = 0
+        self.duracion = 0.0
+
+
+ESTADISTICAS_SQL: ContextVar[Optional[EstadisticasSQL]] = ContextVar("estadisticas_sql", default=None)
+
+
+def instrumentar_engine(engine: Engine, max_overflow: int):
+    """Escuchar los eventos del engine para contar sentencias, tiempo y uso del pool"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metricas_inicio", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+        duracion = time.perf_counter() - conn.info["metricas_inicio"].pop()
+        SQL_SENTENCIAS.inc()
+        estadisticas = ESTADISTICAS_SQL.get()
+        if estadisticas is not None:
+            estadisticas.sentencias += 1
+            estadisticas.duracion += duracion
+
+    @event.listens_for(engine, "checkout")
+    def al_entregar_conexion(dbapi_connection, connection_record, connection_proxy):
+        if engine.pool.checkedout() >= engine.pool.size() + max_overflow:
+            POOL_SATURACIONES.inc()
+
+    def recolectar_pool():
+        POOL_TAMANO.set(engine.pool.size())
+        POOL_OCUPADAS.set(engine.pool.checkedout())
+        POOL_EXCEDENTES.set(max(0, engine.pool.overflow()))
+
+    RECOLECTORES.append(recolectar_pool)
+
+
+def render_metrics(sumadas: Optional[Dict[str, Dict[Tuple[str, ...], Any]]] = None) -> str:
+    """Entregar todas las metricas en formato de texto de Prometheus, las del worker o las sumadas de todos"""
+    if sumadas is None:
+        for recolector in RECOLECTORES:
+            recolector()
+    renglones = []
+    for metrica in REGISTRO:
+        renglones.append(f"# HELP {metrica.nombre} {metrica.descripcion}")
+        renglones.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+        renglones.extend(metrica.renglones(None if sumadas is None else sumadas.get(metrica.nombre, {})))
+    return "\n".join(renglones) + "\n"
+
+
+def exportar_metricas() -> Dict[str, List]:
+    """Metricas del worker para guardarlas en JSON, las etiquetas como listas"""
+    for recolector in RECOLECTORES:
+        recolector()
+    return {metrica.nombre: [[list(etiquetas), valor] for etiquetas, valor in metrica.exportar()] for metrica in REGISTRO}
+
+
+def sumar_metricas(sumadas: Dict[str, Dict[Tuple[str, ...], Any]], exportadas: Dict[str, List], medidores: bool = True):
+    """Sumar las metricas exportadas de un worker, sin medidores para las de los workers que terminaron"""
+    tipos = {metrica.nombre: metrica.tipo for metrica in REGISTRO}
+    for nombre, renglones in exportadas.items():
+        if nombre not in tipos or (not medidores and tipos[nombre] == "gauge"):
+            continue
+        destino = sumadas.setdefault(nombre, {})
+        for etiquetas, valor in renglones:
+            clave = tuple(etiquetas)
+            if isinstance(valor, list):
+                serie = destino.setdefault(clave, [0.0] * len(valor))
+                for posicion, cantidad in enumerate(valor):
+                    serie[posicion] += cantidad
+            else:
+                destino[clave] = destino.get(clave, 0.0) + valor
+
+
+class MetricasCompartidas:
+    """Metricas de los workers en archivos de un directorio, cada worker guarda las suyas y /metrics las suma"""
+
+    TERMINADOS = "terminados.json"
+
+    def __init__(self, directorio: str, intervalo: float = 5.0):
+        self.directorio = directorio
+        self.intervalo = intervalo
+        self.detener = threading.Event()
+        self.hilo: Optional[threading.Thread] = None
+
+    def get_archivo(self, pid: int) -> str:
+        """Archivo de las metricas de un worker"""
+        return os.path.join(self.directorio, f"{pid}.json")
+
+    @contextmanager
+    def bloquear(self) -> Iterator[None]:
+        """Bloquear el directorio entre procesos, para no sumar un worker que se esta acumulando"""
+        with open(os.path.join(self.directorio, ".candado"), "a", encoding="utf8") as candado:
+            fcntl.flock(candado, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(candado, fcntl.LOCK_UN)
+
+    def leer(self, archivo: str) -> Dict[str, List]:
+        """Leer un archivo de metricas, vacio si no existe"""
+        try:
+            with open(archivo, "r", encoding="utf8") as entrada:
+                return json.load(entrada)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def escribir(self, archivo: str, exportadas: Dict[str, List]):
+        """Escribir un archivo de metricas de una vez, quien lo lea nunca lo encuentra a medias"""
+        temporal = f"{archivo}.{os.getpid()}.tmp"
+        with open(temporal, "w", encoding="utf8") as salida:
+            json.dump(exportadas, salida)
+        os.replace(temporal, archivo)
+
+    def acumular(self, archivo: str, exportadas: Dict[str, List]):
+        """Pasar los contadores y los histogramas de un worker que termino al archivo de los terminados, con el directorio bloqueado"""
+        terminados = os.path.join(self.directorio, self.TERMINADOS)
+        sumadas: Dict[str, Dict[Tuple[str, ...], Any]] = {}
+        sumar_metricas(sumadas, self.leer(terminados))
+        sumar_metricas(sumadas, exportadas, medidores=False)
+        self.escribir(terminados, {nombre: [[list(etiquetas), valor] for etiquetas, valor in valores.items()] for nombre, valores in sumadas.items()})
+        if os.path.exists(archivo):
+            os.remove(archivo)
+
+    def guardar(self):
+        """Guardar las metricas de este worker"""
+        exportadas = exportar_metricas()
+        with self.bloquear():
+            self.escribir(self.get_archivo(os.getpid()), exportadas)
+
+    def iniciar(self):
+        """Al arrancar el worker, guardar sus metricas cada intervalo en un hilo"""
+        os.makedirs(self.directorio, exist_ok=True)
+        self.detener.clear()
+        self.hilo = threading.Thread(target=self.guardar_cada_intervalo, name="metricas", daemon=True)
+        self.hilo.start()
+
+    def guardar_cada_intervalo(self):
+        """Guardar hasta que se detenga"""
+        while not self.detener.wait(self.intervalo):
+            self.guardar()
+
+    def terminar(self):
+        """Al apagar el worker, acumular sus contadores y sus histogramas y quitar su archivo"""
+        self.detener.set()
+        if self.hilo is not None:
+            self.hilo.join()
+            self.hilo = None
+        exportadas = exportar_metricas()
+        with self.bloquear():
+            self.acumular(self.get_archivo(os.getpid()), exportadas)
+
+    def render(self) -> str:
+        """Entregar la suma de las metricas de todos los workers, los que murieron sin terminar se acumulan aqui"""
+        exportadas = exportar_metricas()
+        sumadas: Dict[str, Dict[Tuple[str, ...], Any]] = {}
+        with self.bloquear():
+            self.escribir(self.get_archivo(os.getpid()), exportadas)
+            for nombre in sorted(os.listdir(self.directorio)):
+                pid = nombre[: -len(".json")]
+                if not nombre.endswith(".json") or not pid.isdigit():
+                    continue
+                archivo = os.path.join(self.directorio, nombre)
+                if not proceso_vivo(int(pid)):
+                    self.acumular(archivo, self.leer(archivo))
+                    continue
+                sumar_metricas(sumadas, self.leer(archivo))
+            sumar_metricas(sumadas, self.leer(os.path.join(self.directorio, self.TERMINADOS)))
+        return render_metrics(sumadas)
+
+
+def proceso_vivo(pid: int) -> bool:
+    """Revisar si el proceso existe"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que mide la duracion, las sentencias SQL y las peticiones en curso por ruta"""
+
+    def __init__(self, app):
+        self.app = app
+        self.rutas: Dict[Callable, str] = {}
+
+    def get_ruta(self, scope) -> str:
+        """Entregar la plantilla de la ruta, por ejemplo /v2/cit_citas/{cit_cita_id}"""
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return RUTA_NO_ENCONTRADA
+        if endpoint not in self.rutas:
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    self.rutas[endpoint] = route.path
+                    break
+            else:
+                self.rutas[endpoint] = RUTA_NO_ENCONTRADA
+        return self.rutas[endpoint]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        metodo = scope["method"]
+        estatus = 500
+
+        async def enviar(message):
+            nonlocal estatus
+            if message["type"] == "http.response.start":
+                estatus = message["status"]
+            await send(message)
+
+        estadisticas = EstadisticasSQL()
+        token = ESTADISTICAS_SQL.set(estadisticas)
+        HTTP_EN_CURSO.inc(1.0, metodo)
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion = time.perf_counter() - inicio
+            HTTP_EN_CURSO.dec(1.0, metodo)
+            ruta = self.get_ruta(scope)
+            HTTP_DURACION.observe(duracion, metodo, ruta, str(estatus))
+            SQL_SENTENCIAS_POR_PETICION.observe(estadisticas.sentencias, ruta)
+            SQL_DURACION_POR_PETICION.observe(estadisticas.duracion, ruta)
+            ESTADISTICAS_SQL.reset(token)
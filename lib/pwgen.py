@@ -5,15 +5,14 @@ import random
 import re
 import string
 
-from hashids import Hashids
-
+from lib.hashids import cifrar_email
 from lib.safe_string import CONTRASENA_REGEXP
 
 
 def generar_api_key(hashid: str, email: str, length: int = 24) -> str:
     """Generar API key que se compone de un hashid y una cadena aleatoria"""
     aleatorio = "".join(random.sample(string.ascii_letters + string.digits, k=length))
-    hash_email = Hashids(salt=email, min_length=8).encode(1)
+    hash_email = cifrar_email(email)
     return hashid + "." + hash_email + "." + aleatorio
 
 
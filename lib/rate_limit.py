@@ -0,0 +1,166 @@
+"""
+Limite de peticiones por usuario y modulo con cubetas de fichas (token buckets)
+
+La configuracion se declara en la variable de entorno RATE_LIMITS con el formato
+
+    MODULO=CAPACIDAD/SEGUNDOS,MODULO=CAPACIDAD/SEGUNDOS,*=CAPACIDAD/SEGUNDOS
+
+Donde MODULO es el nombre del modulo como aparece en los permisos (por ejemplo CIT CITAS)
+y el asterisco es el limite para los modulos que no esten declarados.
+
+El almacen file bloquea mientras espera el archivo SQLite, por eso se consulta en el threadpool;
+si el archivo sigue bloqueado al pasar la espera se deja pasar la peticion en lugar de entregar un error.
+"""
+from abc import ABC, abstractmethod
+from functools import lru_cache
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from config.settings import Settings
+
+MODULO_POR_DEFECTO = "*"
+
+bitacora = logging.getLogger(__name__)
+
+
+class RateLimitStore(ABC):
+    """Almacen de cubetas de fichas, las subclases deben implementar consume"""
+
+    bloqueante = False  # Si consume espera entrada y salida, se ejecuta en el threadpool
+
+    @abstractmethod
+    def consume(self, key: str, capacidad: int, periodo: float, costo: int = 1) -> float:
+        """Consumir fichas de la cubeta, entrega cero si se permite o los segundos de espera si no"""
+
+
+def recargar_cubeta(fichas: float, actualizado: float, ahora: float, capacidad: int, periodo: float) -> float:
+    """Calcular las fichas de la cubeta despues de recargarla por el tiempo transcurrido"""
+    tasa = capacidad / periodo
+    return min(float(capacidad), fichas + max(0.0, ahora - actualizado) * tasa)
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """Cubetas en la memoria del proceso, solo sirve para un worker"""
+
+    def __init__(self):
+        self.cubetas: Dict[str, Tuple[float, float]] = {}
+        self.candado = threading.Lock()
+
+    def consume(self, key: str, capacidad: int, periodo: float, costo: int = 1) -> float:
+        """Consumir fichas de la cubeta"""
+        ahora = time.monotonic()
+        with self.candado:
+            fichas, actualizado = self.cubetas.get(key, (float(capacidad), ahora))
+            fichas = recargar_cubeta(fichas, actualizado, ahora, capacidad, periodo)
+            if fichas >= costo:
+                self.cubetas[key] = (fichas - costo, ahora)
+                return 0.0
+            self.cubetas[key] = (fichas, ahora)
+        return (costo - fichas) * periodo / capacidad
+
+
+class FileRateLimitStore(RateLimitStore):
+    """Cubetas en un archivo SQLite local, lo comparten los workers de gunicorn del mismo nodo"""
+
+    bloqueante = True
+
+    def __init__(self, ruta: str, espera: float = 1.0):
+        self.ruta = ruta
+        self.espera = espera
+        self.local = threading.local()
+
+    def conexion(self) -> sqlite3.Connection:
+        """Abrir una conexion por proceso e hilo, despues del fork de gunicorn"""
+        if getattr(self.local, "pid", None) != os.getpid():
+            conexion = sqlite3.connect(self.ruta, timeout=self.espera, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("CREATE TABLE IF NOT EXISTS cubetas (clave TEXT PRIMARY KEY, fichas REAL NOT NULL, actualizado REAL NOT NULL)")
+            self.local.conexion = conexion
+            self.local.pid = os.getpid()
+        return self.local.conexion
+
+    def consume(self, key: str, capacidad: int, periodo: float, costo: int = 1) -> float:
+        """Consumir fichas de la cubeta dentro de una transaccion exclusiva, si el archivo sigue bloqueado se permite"""
+        try:
+            return self.consumir(key, capacidad, periodo, costo)
+        except sqlite3.OperationalError as error:
+            bitacora.warning("Se permite la peticion sin limite porque no se pudo usar %s: %s", self.ruta, error)
+            return 0.0
+
+    def consumir(self, key: str, capacidad: int, periodo: float, costo: int) -> float:
+        """Consumir fichas de la cubeta, eleva sqlite3.OperationalError si pasa la espera"""
+        conexion = self.conexion()
+        ahora = time.time()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            renglon = conexion.execute("SELECT fichas, actualizado FROM cubetas WHERE clave = ?", (key,)).fetchone()
+            fichas, actualizado = renglon if renglon is not None else (float(capacidad), ahora)
+            fichas = recargar_cubeta(fichas, actualizado, ahora, capacidad, periodo)
+            espera = 0.0
+            if fichas >= costo:
+                fichas = fichas - costo
+            else:
+                espera = (costo - fichas) * periodo / capacidad
+            conexion.execute("INSERT OR REPLACE INTO cubetas (clave, fichas, actualizado) VALUES (?, ?, ?)", (key, fichas, ahora))
+            conexion.execute("COMMIT")
+        except Exception:
+            if conexion.in_transaction:
+                conexion.execute("ROLLBACK")
+            raise
+        return espera
+
+
+@lru_cache()
+def get_limites(rate_limits: str) -> Dict[str, Tuple[int, float]]:
+    """Interpretar la configuracion de limites, entrega un diccionario de modulo con capacidad y periodo"""
+    limites = {}
+    for elemento in rate_limits.split(","):
+        if elemento.strip() == "":
+            continue
+        modulo, limite = elemento.rsplit("=", 1)
+        capacidad, periodo = limite.split("/")
+        limites[modulo.strip().upper()] = (int(capacidad), float(periodo))
+    return limites
+
+
+@lru_cache()
+def get_rate_limit_store(store: str, ruta: str) -> RateLimitStore:
+    """Elegir el almacen de cubetas, memory o file"""
+    if store == "file":
+        return FileRateLimitStore(ruta)
+    return MemoryRateLimitStore()
+
+
+def get_modulo_from_path(path: str) -> str:
+    """Obtener el nombre del modulo a partir de la ruta, por ejemplo /v2/cit_citas/123 es CIT CITAS"""
+    partes = path.strip("/").split("/")
+    if len(partes) < 2:
+        return MODULO_POR_DEFECTO
+    return partes[1].replace("_", " ").upper()
+
+
+async def consumir_ficha(usuario_id: int, modulo: str, settings: Settings) -> float:
+    """Consumir una ficha del usuario en el modulo, entrega cero si se permite o los segundos de espera"""
+    limites = get_limites(settings.rate_limits)
+    if modulo in limites:
+        capacidad, periodo = limites[modulo]
+    elif MODULO_POR_DEFECTO in limites:
+        capacidad, periodo = limites[MODULO_POR_DEFECTO]
+    else:
+        return 0.0
+    store = get_rate_limit_store(settings.rate_limit_store, settings.rate_limit_file)
+    if store.bloqueante:
+        return await run_in_threadpool(store.consume, f"{usuario_id}:{modulo}", capacidad, periodo)
+    return store.consume(f"{usuario_id}:{modulo}", capacidad, periodo)
+
+
+def get_retry_after(espera: float) -> str:
+    """Segundos enteros del encabezado Retry-After, redondeados hacia arriba para no reintentar antes de tiempo"""
+    return str(math.ceil(espera))
@@ -1,8 +1,14 @@
 """
 Safe string
+
+Las expresiones regulares estan precompiladas, las cadenas ASCII no pasan por unidecode
+y los resultados de las entradas repetidas se memorizan.
 """
 from datetime import date
+from functools import lru_cache
 import re
+from typing import Optional
+
 from unidecode import unidecode
 
 CONTRASENA_REGEXP = r"^(?=.*[a-z])(?=.*[A-Z])(?=.*\d)[A-Za-z\d]{8,24}$"
@@ -10,59 +16,97 @@ CURP_REGEXP = r"^[A-Z]{4}\d{6}[A-Z]{6}[A-Z0-9]{2}$"
 EMAIL_REGEXP = r"^[\w.-]+@[\w.-]+\.\w+$"
 TELEFONO_REGEXP = r"^[1-9]\d{9}$"
 
+CURP_PATTERN = re.compile(CURP_REGEXP)
+EMAIL_PATTERN = re.compile(EMAIL_REGEXP)
+TELEFONO_PATTERN = re.compile(TELEFONO_REGEXP)
 
-def safe_clave(input_str, max_len=16):
-    """Safe clave"""
-    if not isinstance(input_str, str):
-        return None
+CLAVE_NO_PERMITIDOS = re.compile(r"[^a-zA-Z0-9()-]+")
+CURP_ESPACIOS = re.compile(r"\s")
+CURP_SIMBOLOS = re.compile(r"[()\[\]:/.-]+")
+CURP_FRAGMENTO = re.compile(r"^[A-Z\d]+$")
+EMAIL_FRAGMENTO = re.compile(r"^[\w.-]*@*[\w.-]*\.*\w*$")
+EXPEDIENTE_NO_NUMEROS = re.compile(r"[^0-9]+")
+STRING_NO_PERMITIDOS = re.compile(r"[^a-zA-Z0-9.(),/-]+")
+STRING_NO_PERMITIDOS_CON_ACENTOS = re.compile(r"[^a-záéíóúüñA-ZÁÉÍÓÚÜÑ0-9.(),/-]+")
+TELEFONO_NO_NUMEROS = re.compile(r"[^0-9]+")
+
+MEMO_SIZE = 4096
+
+
+def to_ascii(input_str: str) -> str:
+    """Transliterar a ASCII, las cadenas que ya son ASCII no cambian con unidecode"""
+    if input_str.isascii():
+        return input_str
+    return unidecode(input_str)
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def sanitize_clave(input_str: str, max_len: int) -> Optional[str]:
+    """Limpiar clave, los simbolos y espacios se convierten en un guion"""
     input_str = input_str.strip()
     if input_str == "":
         return None
-    new_string = re.sub(r"[^a-zA-Z0-9()-]+", " ", unidecode(input_str))
-    removed_multiple_spaces = re.sub(r"\s+", " ", new_string)
-    spaces_to_dashes = re.sub(r"\s+", "-", removed_multiple_spaces)
-    final = spaces_to_dashes.strip().upper()
+    final = CLAVE_NO_PERMITIDOS.sub("-", to_ascii(input_str)).upper()
     if len(final) > max_len:
         return final[:max_len]
     return final
 
 
-def safe_curp(input_str, search_fragment=False):
-    """Safe CURP"""
+def safe_clave(input_str, max_len=16):
+    """Safe clave"""
     if not isinstance(input_str, str):
         return None
+    return sanitize_clave(input_str, max_len)
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def sanitize_curp(input_str: str, search_fragment: bool) -> Optional[str]:
+    """Limpiar CURP"""
     input_str = input_str.strip()
     if input_str == "":
         return None
-    removed_spaces = re.sub(r"\s", "", input_str)
-    removed_simbols = re.sub(r"[()\[\]:/.-]+", "", removed_spaces)
-    final = unidecode(removed_simbols.upper())
+    removed_spaces = CURP_ESPACIOS.sub("", input_str)
+    removed_simbols = CURP_SIMBOLOS.sub("", removed_spaces)
+    final = to_ascii(removed_simbols.upper())
     if search_fragment:
-        if re.match(r"^[A-Z\d]+$", final) is None:
+        if CURP_FRAGMENTO.match(final) is None:
             return None
         return final
-    if re.fullmatch(CURP_REGEXP, final) is None:
+    if CURP_PATTERN.fullmatch(final) is None:
         return None
     return final
 
 
-def safe_email(input_str, search_fragment=False):
-    """Safe string"""
+def safe_curp(input_str, search_fragment=False):
+    """Safe CURP"""
     if not isinstance(input_str, str):
         return None
+    return sanitize_curp(input_str, bool(search_fragment))
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def sanitize_email(input_str: str, search_fragment: bool) -> Optional[str]:
+    """Limpiar email"""
     input_str = input_str.strip()
     if input_str == "":
         return None
     final = input_str.lower()
     if search_fragment:
-        if re.match(r"^[\w.-]*@*[\w.-]*\.*\w*$", final) is None:
+        if EMAIL_FRAGMENTO.match(final) is None:
             return None
         return final
-    if re.match(EMAIL_REGEXP, final) is None:
+    if EMAIL_PATTERN.match(final) is None:
         return None
     return final
 
 
+def safe_email(input_str, search_fragment=False):
+    """Safe string"""
+    if not isinstance(input_str, str):
+        return None
+    return sanitize_email(input_str, bool(search_fragment))
+
+
 def safe_expediente(input_str):
     """Safe expediente"""
     if not isinstance(input_str, str):
@@ -70,7 +114,7 @@ def safe_expediente(input_str):
     input_str = input_str.strip()
     if input_str == "":
         return None
-    elementos = re.sub(r"[^0-9]+", "-", input_str).split("-")
+    elementos = EXPEDIENTE_NO_NUMEROS.sub("-", input_str).split("-")
     try:
         numero = int(elementos[0])
         ano = int(elementos[1])
@@ -83,19 +127,18 @@ def safe_expediente(input_str):
     return f"{str(numero)}/{str(ano)}"
 
 
-def safe_string(input_str, max_len=250, to_uppercase=True, do_unidecode=True):
-    """Safe string"""
-    if not isinstance(input_str, str):
-        return None
+@lru_cache(maxsize=MEMO_SIZE)
+def sanitize_string(input_str: str, max_len: int, to_uppercase: bool, do_unidecode: bool) -> Optional[str]:
+    """Limpiar texto, cada grupo de caracteres no permitidos se convierte en un espacio"""
     input_str = input_str.strip()
     if input_str == "":
         return None
     if do_unidecode:
-        new_string = re.sub(r"[^a-zA-Z0-9.(),/-]+", " ", unidecode(input_str))
+        new_string = STRING_NO_PERMITIDOS.sub(" ", to_ascii(input_str))
     else:
-        new_string = re.sub(r"[^a-záéíóúüñA-ZÁÉÍÓÚÜÑ0-9.(),/-]+", " ", input_str)
-    removed_multiple_spaces = re.sub(r"\s+", " ", new_string)
-    final = removed_multiple_spaces.strip()
+        new_string = STRING_NO_PERMITIDOS_CON_ACENTOS.sub(" ", input_str)
+    # Los espacios ya quedaron sueltos porque son caracteres no permitidos, solo falta quitar los de las orillas
+    final = new_string.strip()
     if to_uppercase:
         final = final.upper()
     if max_len == 0:
@@ -103,14 +146,27 @@ def safe_string(input_str, max_len=250, to_uppercase=True, do_unidecode=True):
     return (final[:max_len] + "...") if len(final) > max_len else final
 
 
-def safe_telefono(input_str):
-    """Safe telefono"""
+def safe_string(input_str, max_len=250, to_uppercase=True, do_unidecode=True):
+    """Safe string"""
     if not isinstance(input_str, str):
         return None
+    return sanitize_string(input_str, max_len, bool(to_uppercase), bool(do_unidecode))
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def sanitize_telefono(input_str: str) -> Optional[str]:
+    """Limpiar telefono, deja solo los numeros"""
     input_str = input_str.strip()
     if input_str == "":
         return None
-    solo_numeros = re.sub(r"[^0-9]+", "", unidecode(input_str))
-    if re.match(TELEFONO_REGEXP, solo_numeros) is None:
+    solo_numeros = TELEFONO_NO_NUMEROS.sub("", to_ascii(input_str))
+    if TELEFONO_PATTERN.match(solo_numeros) is None:
         return None
     return solo_numeros
+
+
+def safe_telefono(input_str):
+    """Safe telefono"""
+    if not isinstance(input_str, str):
+        return None
+    return sanitize_telefono(input_str)
@@ -4,6 +4,7 @@ Santander Web Pay Plus
 import re
 import asyncio
 import os
+import time
 import urllib
 import xml.etree.ElementTree as ET
 
@@ -24,6 +25,7 @@ from lib.exceptions import (
     CitasBankResponseInvalidError,
     CitasXMLReadError,
 )
+from lib.metrics import BANCO_DURACION
 
 XML_ENCRYPT_REGEXP = r"^[a-zA-Z0-9+\/=]{32,}$"
 
@@ -166,6 +168,7 @@ async def send_chain(chain: str) -> str:
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
 
     # Send the request
+    inicio = time.perf_counter()
     try:
         response = requests.request(
             "POST",
@@ -175,13 +178,18 @@ async def send_chain(chain: str) -> str:
             timeout=WPP_TIMEOUT,
         )
     except requests.exceptions.ConnectionError as error:
+        BANCO_DURACION.observe(time.perf_counter() - inicio, "connection_error")
         raise CitasConnectionError("Error porque no se pudo conectar a WPP") from error
     except requests.exceptions.Timeout as error:
+        BANCO_DURACION.observe(time.perf_counter() - inicio, "timeout")
         raise CitasTimeoutError("Error porque se agoto el tiempo de espera con WPP") from error
     except requests.exceptions.RequestException as error:
+        BANCO_DURACION.observe(time.perf_counter() - inicio, "request_error")
         raise CitasRequestError("Error al enviar la cadena a WPP") from error
     except Exception as error:
+        BANCO_DURACION.observe(time.perf_counter() - inicio, "unknown_error")
         raise CitasUnknownError("Error desconocido al enviar la cadena a WPP") from error
+    BANCO_DURACION.observe(time.perf_counter() - inicio, str(response.status_code))
 
     # Entregar
     return response.text
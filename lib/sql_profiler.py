@@ -0,0 +1,157 @@
+"""
+Perfilador de SQL por peticion y detector de N+1
+
+Solo para desarrollo y pruebas, se activa con la variable de entorno SQL_PROFILER=1.
+Registra cada sentencia con su duracion y el lugar del codigo que la provoco,
+y marca como repetidas las sentencias que solo difieren en sus parametros.
+"""
+from collections import Counter as Contador
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+import os
+import re
+import time
+import traceback
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+bitacora = logging.getLogger(__name__)
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CARPETAS_PROPIAS = (os.path.join(RAIZ, "citas_admin") + os.sep, os.path.join(RAIZ, "lib") + os.sep)
+ARCHIVOS_IGNORADOS = (os.path.abspath(__file__), os.path.join(RAIZ, "lib", "metrics.py"), os.path.join(RAIZ, "lib", "database.py"))
+
+LITERALES_REGEXP = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PARAMETROS_REGEXP = re.compile(r"%\(\w+\)s|%s|\?|:\w+")
+ESPACIOS_REGEXP = re.compile(r"\s+")
+
+
+def normalizar_sentencia(sentencia: str) -> str:
+    """Quitar los literales y parametros para comparar sentencias que solo difieren en sus valores"""
+    sentencia = LITERALES_REGEXP.sub("?", sentencia)
+    sentencia = PARAMETROS_REGEXP.sub("?", sentencia)
+    return ESPACIOS_REGEXP.sub(" ", sentencia).strip()
+
+
+def get_lugar() -> str:
+    """Entregar archivo:renglon del primer marco de la pila que pertenece al proyecto"""
+    for marco in reversed(traceback.extract_stack()):
+        archivo = os.path.abspath(marco.filename)
+        if archivo.startswith(CARPETAS_PROPIAS) and archivo not in ARCHIVOS_IGNORADOS:
+            return f"{os.path.relpath(archivo, RAIZ)}:{marco.lineno}"
+    return "desconocido"
+
+
+class PerfilSQL:
+    """Sentencias ejecutadas durante una peticion o un bloque de codigo"""
+
+    def __init__(self):
+        self.sentencias: List[Tuple[str, float, str]] = []
+
+    def registrar(self, sentencia: str, duracion: float, lugar: str):
+        """Agregar una sentencia con su duracion y lugar"""
+        self.sentencias.append((sentencia, duracion, lugar))
+
+    @property
+    def cantidad(self) -> int:
+        """Cantidad de sentencias"""
+        return len(self.sentencias)
+
+    @property
+    def duracion(self) -> float:
+        """Tiempo total en la base de datos"""
+        return sum(duracion for _, duracion, _ in self.sentencias)
+
+    def repetidas(self) -> Dict[str, Tuple[int, List[str]]]:
+        """Sentencias normalizadas que se ejecutaron mas de una vez, con la cantidad y los lugares"""
+        contador = Contador()
+        lugares: Dict[str, List[str]] = {}
+        for sentencia, _, lugar in self.sentencias:
+            normalizada = normalizar_sentencia(sentencia)
+            contador[normalizada] += 1
+            if lugar not in lugares.setdefault(normalizada, []):
+                lugares[normalizada].append(lugar)
+        return {normalizada: (cantidad, lugares[normalizada]) for normalizada, cantidad in contador.most_common() if cantidad > 1}
+
+    def resumen(self) -> str:
+        """Resumen en texto para la bitacora y los mensajes de las pruebas"""
+        renglones = [f"{self.cantidad} sentencias en {self.duracion * 1000:.1f} ms"]
+        for normalizada, (cantidad, lugares) in self.repetidas().items():
+            renglones.append(f"  N+1 {cantidad}x en {', '.join(lugares)}: {normalizada[:200]}")
+        return "\n".join(renglones)
+
+
+PERFIL_SQL: ContextVar[Optional[PerfilSQL]] = ContextVar("perfil_sql", default=None)
+
+
+def instrumentar_perfil(engine: Engine):
+    """Escuchar los eventos del engine para registrar las sentencias en el perfil activo"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("perfil_inicio", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+        duracion = time.perf_counter() - conn.info["perfil_inicio"].pop()
+        perfil = PERFIL_SQL.get()
+        if perfil is not None:
+            perfil.registrar(statement, duracion, get_lugar())
+
+
+@contextmanager
+def presupuesto_sql(maximo: int):
+    """Fallar con AssertionError si el bloque ejecuta mas de maximo sentencias, para las pruebas"""
+    perfil = PerfilSQL()
+    token = PERFIL_SQL.set(perfil)
+    try:
+        yield perfil
+    finally:
+        PERFIL_SQL.reset(token)
+    if perfil.cantidad > maximo:
+        raise AssertionError(f"Se excedio el presupuesto de {maximo} sentencias\n{perfil.resumen()}")
+
+
+def verificar_presupuesto_sql(response, maximo: int):
+    """Fallar con AssertionError si la respuesta reporta mas de maximo sentencias en el encabezado X-SQL-Count"""
+    cantidad = int(response.headers["X-SQL-Count"])
+    if cantidad > maximo:
+        raise AssertionError(f"Se excedio el presupuesto de {maximo} sentencias con {cantidad}, repetidas {response.headers.get('X-SQL-Repeated', '0')}")
+
+
+class SQLProfilerMiddleware:
+    """Middleware ASGI que perfila las sentencias de cada peticion, agrega encabezados X-SQL-* y escribe en la bitacora"""
+
+    def __init__(self, app, presupuesto: int = 0):
+        self.app = app
+        self.presupuesto = presupuesto
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        perfil = PerfilSQL()
+        token = PERFIL_SQL.set(perfil)
+
+        async def enviar(message):
+            if message["type"] == "http.response.start":
+                repetidas = perfil.repetidas()
+                encabezados = list(message.get("headers", []))
+                encabezados.append((b"x-sql-count", str(perfil.cantidad).encode()))
+                encabezados.append((b"x-sql-time", f"{perfil.duracion * 1000:.1f}ms".encode()))
+                encabezados.append((b"x-sql-repeated", str(sum(cantidad for cantidad, _ in repetidas.values())).encode()))
+                message["headers"] = encabezados
+                excedido = 0 < self.presupuesto < perfil.cantidad
+                if excedido or repetidas:
+                    bitacora.warning("%s %s %s%s", scope["method"], scope["path"], perfil.resumen(), " (excede el presupuesto)" if excedido else "")
+                else:
+                    bitacora.info("%s %s %s", scope["method"], scope["path"], perfil.resumen())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            PERFIL_SQL.reset(token)
@@ -1,16 +1,10 @@
 """
 UniversalMixin define las columnas y métodos comunes de todos los modelos
 """
-import re
-
-from hashids import Hashids
 from sqlalchemy import Column, DateTime, String
 from sqlalchemy.sql import func
 
-from config.settings import get_settings
-
-settings = get_settings()
-hashids = Hashids(salt=settings.salt, min_length=8)
+from lib.hashids import cifrar_id, decode_id
 
 
 class UniversalMixin:
@@ -22,15 +16,9 @@ class UniversalMixin:
 
     def encode_id(self):
         """Convertir el ID de entero a cadena"""
-        return hashids.encode(self.id)
+        return cifrar_id(self.id)
 
     @classmethod
     def decode_id(cls, id_encoded: str):
         """Convertir el ID de entero a cadena"""
-        if re.fullmatch(r"[0-9a-zA-Z]{8,16}", id_encoded) is None:
-            return None
-        descifrado = hashids.decode(id_encoded)
-        try:
-            return descifrado[0]
-        except IndexError:
-            return None
+        return decode_id(id_encoded)
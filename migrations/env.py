@@ -0,0 +1,44 @@
+"""
+Migraciones, entorno de Alembic
+
+Las tablas las comparten otros sistemas, por eso la version se guarda en su propia tabla
+alembic_version_api_oauth2 y las migraciones solo agregan lo que necesita esta API.
+"""
+from logging.config import fileConfig
+
+from alembic import context
+
+# pylint: disable=unused-import
+import citas_admin.app  # Cargar todos los modelos para que se conozcan sus tablas
+from lib.database import Base, get_engine
+
+VERSION_TABLE = "alembic_version_api_oauth2"
+
+if context.config.config_file_name is not None:
+    fileConfig(context.config.config_file_name)
+
+
+def run_migrations_offline():
+    """Escribir el SQL de las migraciones sin conectarse, con alembic upgrade head --sql"""
+    context.configure(
+        url=get_engine().url.render_as_string(hide_password=False),
+        target_metadata=Base.metadata,
+        version_table=VERSION_TABLE,
+        literal_binds=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """Ejecutar las migraciones en la base de datos"""
+    with get_engine().connect() as conexion:
+        context.configure(connection=conexion, target_metadata=Base.metadata, version_table=VERSION_TABLE)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,40 @@
+"""
+Cit Citas Ocupaciones, contadores de citas por oficina y hora de inicio
+
+La tabla se crea solo si no existe, donde ya la creo create_all, y los contadores se llenan de nuevo con las citas
+
+Revision ID: 3f1c2a9d8e01
+Revises:
+Create Date: 2026-10-19 10:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "3f1c2a9d8e01"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Aplicar"""
+    if not sa.inspect(op.get_bind()).has_table("cit_citas_ocupaciones"):
+        op.create_table(
+            "cit_citas_ocupaciones",
+            sa.Column("oficina_id", sa.Integer(), sa.ForeignKey("oficinas.id"), primary_key=True),
+            sa.Column("inicio", sa.DateTime(), primary_key=True),
+            sa.Column("cantidad", sa.Integer(), nullable=False),
+            sa.CheckConstraint("cantidad >= 0", name="cit_citas_ocupaciones_cantidad_check"),
+        )
+    op.execute("DELETE FROM cit_citas_ocupaciones")
+    op.execute(
+        """
+        INSERT INTO cit_citas_ocupaciones (oficina_id, inicio, cantidad)
+        SELECT oficina_id, inicio, count(*) FROM cit_citas WHERE estatus = 'A' AND estado <> 'CANCELO' GROUP BY oficina_id, inicio
+        """
+    )
+
+
+def downgrade():
+    """Revertir"""
+    op.drop_table("cit_citas_ocupaciones")
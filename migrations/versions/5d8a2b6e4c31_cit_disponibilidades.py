@@ -0,0 +1,82 @@
+"""
+Cit Disponibilidades, horas en que se puede agendar cada servicio en cada oficina con los lugares que quedan
+
+Los disparadores borran las horas que dejan de valer: las de la oficina y fecha de una hora bloqueada,
+las de la fecha de un dia inhabil, las de una oficina si cambia su horario, sus lugares o su estatus,
+y las de un servicio si cambia su horario, su duracion o su estatus. La API las vuelve a calcular al consultarlas.
+La tabla se crea solo si no existe, donde ya la creo create_all. Llenela con disponibilidades.py extender
+
+Revision ID: 5d8a2b6e4c31
+Revises: 9c5e1f3a7b20
+Create Date: 2026-10-19 14:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "5d8a2b6e4c31"
+down_revision = "9c5e1f3a7b20"
+branch_labels = None
+depends_on = None
+
+TABLAS = ["cit_dias_inhabiles", "cit_horas_bloqueadas", "cit_servicios", "oficinas"]
+
+
+def upgrade():
+    """Aplicar"""
+    if not sa.inspect(op.get_bind()).has_table("cit_disponibilidades"):
+        op.create_table(
+            "cit_disponibilidades",
+            sa.Column("oficina_id", sa.Integer(), primary_key=True),
+            sa.Column("cit_servicio_id", sa.Integer(), primary_key=True),
+            sa.Column("fecha", sa.Date(), primary_key=True),
+            sa.Column("hora", sa.Time(), primary_key=True),
+            sa.Column("lugares", sa.Integer(), nullable=False),
+        )
+    op.execute("CREATE INDEX IF NOT EXISTS ix_cit_disponibilidades_oficina_id_fecha_hora ON cit_disponibilidades (oficina_id, fecha, hora)")
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION cit_disponibilidades_borrar() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                DELETE FROM cit_disponibilidades;
+            ELSIF TG_TABLE_NAME = 'cit_horas_bloqueadas' THEN
+                IF TG_OP <> 'INSERT' THEN
+                    DELETE FROM cit_disponibilidades WHERE oficina_id = OLD.oficina_id AND fecha = OLD.fecha;
+                END IF;
+                IF TG_OP <> 'DELETE' THEN
+                    DELETE FROM cit_disponibilidades WHERE oficina_id = NEW.oficina_id AND fecha = NEW.fecha;
+                END IF;
+            ELSIF TG_TABLE_NAME = 'cit_dias_inhabiles' THEN
+                IF TG_OP <> 'INSERT' THEN
+                    DELETE FROM cit_disponibilidades WHERE fecha = OLD.fecha;
+                END IF;
+                IF TG_OP <> 'DELETE' THEN
+                    DELETE FROM cit_disponibilidades WHERE fecha = NEW.fecha;
+                END IF;
+            ELSIF TG_TABLE_NAME = 'oficinas' THEN
+                IF TG_OP = 'DELETE' OR (OLD.apertura, OLD.cierre, OLD.limite_personas, OLD.estatus) IS DISTINCT FROM (NEW.apertura, NEW.cierre, NEW.limite_personas, NEW.estatus) THEN
+                    DELETE FROM cit_disponibilidades WHERE oficina_id = OLD.id;
+                END IF;
+            ELSIF TG_TABLE_NAME = 'cit_servicios' THEN
+                IF TG_OP = 'DELETE' OR (OLD.desde, OLD.hasta, OLD.duracion, OLD.estatus) IS DISTINCT FROM (NEW.desde, NEW.hasta, NEW.duracion, NEW.estatus) THEN
+                    DELETE FROM cit_disponibilidades WHERE cit_servicio_id = OLD.id;
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for tabla in TABLAS:
+        eventos = "INSERT OR UPDATE OR DELETE" if tabla in ("cit_dias_inhabiles", "cit_horas_bloqueadas") else "UPDATE OR DELETE"
+        op.execute(f"CREATE TRIGGER {tabla}_cit_disponibilidades AFTER {eventos} ON {tabla} FOR EACH ROW EXECUTE FUNCTION cit_disponibilidades_borrar()")
+        op.execute(f"CREATE TRIGGER {tabla}_cit_disponibilidades_truncate AFTER TRUNCATE ON {tabla} FOR EACH STATEMENT EXECUTE FUNCTION cit_disponibilidades_borrar()")
+
+
+def downgrade():
+    """Revertir"""
+    for tabla in TABLAS:
+        op.execute(f"DROP TRIGGER IF EXISTS {tabla}_cit_disponibilidades_truncate ON {tabla}")
+        op.execute(f"DROP TRIGGER IF EXISTS {tabla}_cit_disponibilidades ON {tabla}")
+    op.execute("DROP FUNCTION IF EXISTS cit_disponibilidades_borrar()")
+    op.drop_table("cit_disponibilidades")
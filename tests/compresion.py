@@ -0,0 +1,113 @@
+"""
+Ahorro y latencia de la compresion de las respuestas
+
+Arma respuestas tipicas, una pagina de citas con limit=10000, una de 100 citas y la serie de 100 dias
+de creados_por_dia, y mide para gzip y brotli en cada nivel el tamaño comprimido, el ahorro
+y la mediana del tiempo de comprimir. Sirve para elegir COMPRESION_NIVEL_GZIP y COMPRESION_NIVEL_BROTLI.
+
+    python -m tests.compresion
+    python -m tests.compresion --niveles-gzip 1 6 9 --niveles-brotli 1 4 11
+"""
+import argparse
+from datetime import date, datetime, timedelta
+import json
+import random
+import statistics
+import time
+
+from tests.entorno import definir_entorno
+
+# Valores por defecto para poder importar lib sin un archivo .env
+definir_entorno("compresion")
+
+# pylint: disable=wrong-import-position
+from lib.compresion import Compresor, brotli
+
+NOMBRES = ["MARIA", "JOSE", "JUAN", "GUADALUPE", "FRANCISCO", "ANA", "LUIS", "ROSA", "CARLOS", "ELENA"]
+APELLIDOS = ["HERNANDEZ", "GARCIA", "MARTINEZ", "LOPEZ", "GONZALEZ", "RODRIGUEZ", "PEREZ", "SANCHEZ", "RAMIREZ", "TORRES"]
+ESTADOS = ["ASISTIO", "CANCELO", "INASISTENCIA", "PENDIENTE"]
+
+
+def pagina_de_citas(cantidad: int, azar: random.Random) -> bytes:
+    """JSON como el de /v2/cit_citas con limit igual a la cantidad"""
+    items = []
+    for numero in range(cantidad):
+        cliente_id = azar.randint(1, 300000)
+        oficina_id = azar.randint(1, 150)
+        servicio_id = azar.randint(1, 40)
+        inicio = datetime(2022, 10, 3, 8) + timedelta(days=azar.randint(0, 90), minutes=15 * azar.randint(0, 31))
+        items.append(
+            {
+                "id": 1000000 + numero,
+                "cit_cliente_id": cliente_id,
+                "cit_cliente_nombre": f"{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)} {azar.choice(APELLIDOS)}",
+                "cit_cliente_curp": f"{azar.choice(APELLIDOS)[:4]}{azar.randint(500101, 991231)}HCLSRN0{azar.randint(0, 9)}",
+                "cit_cliente_email": f"persona{cliente_id}@correo.com",
+                "cit_servicio_id": servicio_id,
+                "cit_servicio_clave": f"SRV-{servicio_id:03}",
+                "cit_servicio_descripcion": f"SERVICIO {servicio_id}",
+                "oficina_id": oficina_id,
+                "oficina_clave": f"SLT-J{oficina_id}-FAM",
+                "oficina_descripcion": f"JUZGADO {oficina_id} DE PRIMERA INSTANCIA EN MATERIA FAMILIAR",
+                "oficina_descripcion_corta": f"JUZGADO {oficina_id} FAMILIAR",
+                "inicio": inicio.isoformat(),
+                "termino": (inicio + timedelta(minutes=15)).isoformat(),
+                "notas": azar.choice(["", "CONSULTA DE EXPEDIENTE", "ENTREGA DE DOCUMENTOS", "PENSION ALIMENTICIA"]),
+                "estado": azar.choice(ESTADOS),
+                "asistencia": azar.random() < 0.5,
+                "codigo_asistencia": f"{azar.randint(0, 9999):04}",
+                "creado": (inicio - timedelta(days=azar.randint(1, 30), seconds=azar.randint(0, 86399))).isoformat(),
+                "puede_cancelarse": azar.random() < 0.3,
+            }
+        )
+    return json.dumps({"success": True, "message": "Success", "result": {"total": 1200000, "items": items, "limit": cantidad, "offset": 0}}).encode()
+
+
+def creados_por_dia(dias: int, azar: random.Random) -> bytes:
+    """JSON como el de /v2/cit_citas/creados_por_dia con size igual a los dias"""
+    hoy = date(2022, 12, 31)
+    items = [{"creado": (hoy - timedelta(days=dias - 1 - numero)).isoformat(), "cantidad": azar.randint(800, 2500)} for numero in range(dias)]
+    return json.dumps({"success": True, "message": "Success", "result": {"total": len(items), "items": items, "size": dias}}).encode()
+
+
+def medir(cuerpo: bytes, codificacion: str, nivel: int, repeticiones: int):
+    """Comprimir varias veces, entrega el tamaño comprimido y la mediana de milisegundos"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        comprimido = Compresor(codificacion, nivel, nivel).comprimir(cuerpo, terminar=True)
+        tiempos.append(time.perf_counter() - inicio)
+    return len(comprimido), statistics.median(tiempos) * 1000
+
+
+def main():
+    """Ahorro y latencia de la compresion"""
+
+    parser = argparse.ArgumentParser(description="Ahorro y latencia de la compresion de las respuestas")
+    parser.add_argument("--niveles-gzip", type=int, nargs="+", default=[1, 6, 9])
+    parser.add_argument("--niveles-brotli", type=int, nargs="+", default=[1, 4, 6])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    azar = random.Random(1)
+    cuerpos = {
+        "cit_citas limit=10000": pagina_de_citas(10000, azar),
+        "cit_citas limit=100": pagina_de_citas(100, azar),
+        "creados_por_dia 100 dias": creados_por_dia(100, azar),
+    }
+    pruebas = [("gzip", nivel) for nivel in args.niveles_gzip]
+    if brotli is None:
+        print("Sin brotli, instale el paquete brotli para medirlo")
+    else:
+        pruebas += [("br", nivel) for nivel in args.niveles_brotli]
+
+    print(f"{'Respuesta':26} {'Codificacion':12} {'Bytes':>10} {'Ahorro':>8} {'Milisegundos':>13}")
+    for nombre, cuerpo in cuerpos.items():
+        print(f"{nombre:26} {'ninguna':12} {len(cuerpo):10} {'':>8} {'':>13}")
+        for codificacion, nivel in pruebas:
+            largo, milisegundos = medir(cuerpo, codificacion, nivel, args.repeticiones)
+            print(f"{'':26} {f'{codificacion} {nivel}':12} {largo:10} {100 * (1 - largo / len(cuerpo)):7.1f}% {milisegundos:13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+Entorno para las pruebas que no necesitan un archivo .env
+"""
+import os
+from typing import Dict
+
+
+def get_variables(nombre: str, extra: Dict[str, str] = None) -> Dict[str, str]:
+    """Valores por defecto para poder importar la aplicacion sin un archivo .env"""
+    variables = {
+        "DB_HOST": "127.0.0.1",
+        "DB_PORT": "5432",
+        "DB_NAME": nombre,
+        "DB_PASS": nombre,
+        "DB_USER": nombre,
+        "LIMITE_CITAS_PENDIENTES": "30",
+        "ORIGINS": "http://127.0.0.1",
+        "POLL_SYSTEM_URL": "http://127.0.0.1/poll_system",
+        "POLL_SERVICE_URL": "http://127.0.0.1/poll_service",
+        "SALT": nombre,
+        "TZ": "America/Mexico_City",
+    }
+    variables.update(extra or {})
+    return variables
+
+
+def definir_entorno(nombre: str, extra: Dict[str, str] = None) -> None:
+    """Definir las variables de entorno que falten con los valores por defecto"""
+    for variable, valor in get_variables(nombre, extra).items():
+        os.environ.setdefault(variable, valor)
@@ -0,0 +1,139 @@
+"""
+Prueba de concurrencia para crear citas
+
+Lanza muchas peticiones simultaneas para crear citas con hilos que arrancan a la vez y revisa
+que no se sobrepase el limite de personas de la oficina ni el limite de citas pendientes del cliente.
+Al terminar borra las citas que creo y descuenta sus lugares.
+
+Use una base de datos sembrada con tests.load.seed y las mismas variables de entorno DB_*
+
+    python -m tests.load.concurrencia --hilos 12 --rondas 5    # Entrega 1 si hay sobrecupo
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import sys
+import threading
+
+# pylint: disable=unused-import
+import citas_admin.app  # Cargar todos los modelos para que se resuelvan las relaciones
+from citas_admin.v2.cit_citas.crud import create_cit_cita, get_cit_citas_disponibles_cantidad
+from citas_admin.v2.cit_citas.models import CitCita
+from citas_admin.v2.cit_citas_ocupaciones.crud import get_cit_citas_ocupaciones_cantidades, liberar_lugares
+from citas_admin.v2.cit_clientes.models import CitCliente
+from citas_admin.v2.cit_dias_disponibles.crud import get_cit_dias_disponibles
+from citas_admin.v2.cit_horas_disponibles.crud import get_cit_horas_disponibles
+from citas_admin.v2.cit_oficinas_servicios.models import CitOficinaServicio
+from citas_admin.v2.oficinas.models import Oficina
+from config.settings import get_settings
+from lib.database import get_session_local
+from lib.exceptions import CitasAnyError
+
+
+def buscar_lugares(db, settings, cantidad: int, oficina_servicio: CitOficinaServicio) -> list:
+    """Buscar fechas y horas disponibles de una oficina y servicio"""
+    lugares = []
+    for fecha in get_cit_dias_disponibles(db=db, settings=settings):
+        try:
+            horas = get_cit_horas_disponibles(db=db, cit_servicio_id=oficina_servicio.cit_servicio_id, fecha=fecha, oficina_id=oficina_servicio.oficina_id, settings=settings)
+        except CitasAnyError:
+            continue
+        lugares.extend((fecha, hora) for hora in horas)
+        if len(lugares) >= cantidad:
+            break
+    return lugares[:cantidad]
+
+
+def agendar_a_la_vez(settings, intentos: list) -> list:
+    """Crear las citas de los intentos con un hilo por intento que arrancan a la vez, entrega las citas creadas"""
+    barrera = threading.Barrier(len(intentos))
+
+    def intentar(intento: dict):
+        db = get_session_local()()
+        try:
+            barrera.wait()
+            cit_cita = create_cit_cita(db=db, notas="PRUEBA DE CONCURRENCIA", settings=settings, **intento)
+            return (cit_cita.id, cit_cita.oficina_id, cit_cita.inicio)
+        except CitasAnyError:
+            db.rollback()
+            return None
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=len(intentos)) as ejecutor:
+        return [creada for creada in ejecutor.map(intentar, intentos) if creada is not None]
+
+
+def borrar(db, creadas: list):
+    """Borrar las citas creadas por la prueba y descontar sus lugares"""
+    if len(creadas) == 0:
+        return
+    liberar_lugares(db, [(oficina_id, inicio) for _, oficina_id, inicio in creadas])
+    db.query(CitCita).filter(CitCita.id.in_([cit_cita_id for cit_cita_id, _, _ in creadas])).delete(synchronize_session=False)
+    db.commit()
+
+
+def contar_citas(db, oficina_id: int, inicio: datetime) -> int:
+    """Contar las citas que ocupan lugar en la oficina a esa hora"""
+    return db.query(CitCita).filter_by(oficina_id=oficina_id, inicio=inicio, estatus="A").filter(CitCita.estado != "CANCELO").count()
+
+
+def main():
+    """Prueba de concurrencia"""
+
+    parser = argparse.ArgumentParser(description="Prueba de concurrencia para crear citas")
+    parser.add_argument("--hilos", type=int, default=12, help="Peticiones simultaneas, no mas que el pool de conexiones")
+    parser.add_argument("--rondas", type=int, default=5)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    db = get_session_local()()
+    oficina_servicio = db.query(CitOficinaServicio).join(Oficina).filter(Oficina.estatus == "A", Oficina.limite_personas > 0).filter(CitOficinaServicio.estatus == "A").first()
+    oficina = db.query(Oficina).get(oficina_servicio.oficina_id)
+    clientes = db.query(CitCliente).filter_by(estatus="A").order_by(CitCliente.id.desc()).limit(args.hilos * args.rondas + 1).all()
+    fallas = []
+    creadas = []
+    try:
+        # Muchos clientes a la vez por el mismo lugar, no deben pasar del limite de personas
+        lugares = buscar_lugares(db, settings, args.rondas, oficina_servicio)
+        for ronda, (fecha, hora) in enumerate(lugares):
+            inicio = datetime.combine(fecha, hora)
+            antes = contar_citas(db, oficina.id, inicio)
+            intentos = [{"cit_cliente_id": cliente.id, "cit_servicio_id": oficina_servicio.cit_servicio_id, "fecha": fecha, "hora_minuto": hora, "oficina_id": oficina.id} for cliente in clientes[ronda * args.hilos : (ronda + 1) * args.hilos]]
+            de_la_ronda = agendar_a_la_vez(settings, intentos)
+            creadas.extend(de_la_ronda)
+            despues = contar_citas(db, oficina.id, inicio)
+            contador = get_cit_citas_ocupaciones_cantidades(db, oficina.id, fecha).get(inicio, 0)
+            print(f"Lugar {inicio}: habia {antes}, se crearon {len(de_la_ronda)} de {len(intentos)}, limite {oficina.limite_personas}, contador {contador}")
+            if despues > max(antes, oficina.limite_personas):
+                fallas.append(f"Sobrecupo en {inicio}: {despues} citas con limite de {oficina.limite_personas}")
+            if contador != despues:
+                fallas.append(f"El contador de {inicio} tiene {contador} y hay {despues} citas")
+
+        # Un cliente a la vez por muchos lugares, no debe pasar de su limite de citas pendientes
+        cliente = clientes[-1]
+        disponibles = get_cit_citas_disponibles_cantidad(db=db, cit_cliente_id=cliente.id, settings=settings)
+        lugares = buscar_lugares(db, settings, disponibles + args.hilos, oficina_servicio)
+        intentos = [{"cit_cliente_id": cliente.id, "cit_servicio_id": oficina_servicio.cit_servicio_id, "fecha": fecha, "hora_minuto": hora, "oficina_id": oficina.id} for fecha, hora in lugares]
+        for intento in intentos[: max(disponibles - 2, 0)]:
+            creadas.extend(agendar_a_la_vez(settings, [intento]))  # Dejarle dos disponibles antes de lanzar los simultaneos
+        de_la_ronda = agendar_a_la_vez(settings, intentos[max(disponibles - 2, 0) :][: args.hilos])
+        creadas.extend(de_la_ronda)
+        restantes = get_cit_citas_disponibles_cantidad(db=db, cit_cliente_id=cliente.id, settings=settings)
+        print(f"Cliente {cliente.id}: tenia {disponibles} disponibles, se crearon {len(de_la_ronda)} a la vez de {min(args.hilos, len(intentos))}, le quedan {restantes}")
+        if len(de_la_ronda) > min(disponibles, 2):
+            fallas.append(f"El cliente {cliente.id} paso su limite de citas pendientes con {len(de_la_ronda)} citas simultaneas")
+    finally:
+        borrar(db, creadas)
+        db.close()
+
+    # Revisar
+    for falla in fallas:
+        print(falla)
+    if fallas:
+        sys.exit(1)
+    print("Sin sobrecupo")
+
+
+if __name__ == "__main__":
+    main()
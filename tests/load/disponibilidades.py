@@ -0,0 +1,172 @@
+"""
+Prueba de las horas disponibles precalculadas
+
+Con la base de datos migrada hasta cit_disponibilidades, revisa que las horas guardadas sean las mismas
+que las calculadas en vivo, que ocupar y liberar un lugar actualice los lugares en la misma transaccion,
+que al calcular las horas que faltan se espere a la cita que se esta creando y se guarden los lugares con ella,
+que una oficina inactiva no entregue horas aunque esten guardadas y sin disparadores que las borren,
+que al agregar o quitar una hora bloqueada los disparadores borren las horas de la oficina en la fecha
+y que la siguiente consulta las vuelva a calcular sin la hora bloqueada. Deja los datos como estaban.
+
+Use una base de datos sembrada con tests.load.seed y las mismas variables de entorno DB_*
+
+    python -m tests.load.disponibilidades    # Entrega 1 si algo no cumple
+"""
+import argparse
+from datetime import datetime, timedelta
+import random
+import sys
+import threading
+
+from sqlalchemy import text
+
+# pylint: disable=unused-import
+import citas_admin.app  # Cargar todos los modelos para que se resuelvan las relaciones
+from citas_admin.v2.cit_citas_ocupaciones.crud import get_cit_citas_ocupaciones_cantidades, liberar_lugares, ocupar_lugar
+from citas_admin.v2.cit_dias_disponibles.crud import get_cit_dias_disponibles
+from citas_admin.v2.cit_disponibilidades.crud import get_cit_disponibilidades
+from citas_admin.v2.cit_disponibilidades.models import CitDisponibilidad
+from citas_admin.v2.cit_horas_bloqueadas.models import CitHoraBloqueada
+from citas_admin.v2.cit_horas_disponibles.crud import get_cit_horas_disponibles, get_cit_horas_posibles
+from citas_admin.v2.cit_oficinas_servicios.models import CitOficinaServicio
+from citas_admin.v2.oficinas.models import Oficina
+from config.settings import get_settings
+from lib.database import get_session_local
+from lib.exceptions import CitasIsDeletedError
+
+
+def calcular_en_vivo(db, settings, oficina_servicio: CitOficinaServicio, fecha) -> list:
+    """Calcular las horas y los lugares como antes de precalcularlas"""
+    tiempos = get_cit_horas_posibles(db=db, cit_servicio_id=oficina_servicio.cit_servicio_id, fecha=fecha, oficina_id=oficina_servicio.oficina_id, settings=settings)
+    cantidades = get_cit_citas_ocupaciones_cantidades(db=db, oficina_id=oficina_servicio.oficina_id, fecha=fecha)
+    return [(tiempo.time(), oficina_servicio.oficina.limite_personas - cantidades.get(tiempo, 0)) for tiempo in tiempos]
+
+
+def main():
+    """Prueba de las disponibilidades"""
+
+    parser = argparse.ArgumentParser(description="Prueba de las horas disponibles precalculadas")
+    parser.add_argument("--muestras", type=int, default=50, help="Servicios, oficinas y fechas al azar a comparar con el calculo en vivo")
+    parser.add_argument("--semilla", type=int, default=7)
+    args = parser.parse_args()
+
+    fallas = []
+    settings = get_settings()
+    aleatorio = random.Random(args.semilla)
+    db = get_session_local()()
+    otra = get_session_local()()
+    creadas = []
+    try:
+        fechas = get_cit_dias_disponibles(db=db, settings=settings)
+        oficinas_servicios = db.query(CitOficinaServicio).filter_by(estatus="A").order_by(CitOficinaServicio.id).all()
+
+        # Lo guardado es igual al calculo en vivo, lo que falta se calcula y se guarda al consultar
+        diferentes = 0
+        for _ in range(args.muestras):
+            oficina_servicio = aleatorio.choice(oficinas_servicios)
+            fecha = aleatorio.choice(fechas)
+            get_cit_horas_disponibles(db=db, cit_servicio_id=oficina_servicio.cit_servicio_id, fecha=fecha, oficina_id=oficina_servicio.oficina_id, settings=settings)
+            guardadas = get_cit_disponibilidades(db=db, oficina_id=oficina_servicio.oficina_id, cit_servicio_id=oficina_servicio.cit_servicio_id, fecha=fecha).all()
+            if [tuple(renglon) for renglon in guardadas] != calcular_en_vivo(db, settings, oficina_servicio, fecha):
+                diferentes += 1
+        if diferentes > 0:
+            fallas.append(f"Guardadas: {diferentes} de {args.muestras} muestras difieren del calculo en vivo")
+        print(f"Guardadas: {args.muestras - diferentes} de {args.muestras} muestras iguales al calculo en vivo")
+
+        # Ocupar y liberar un lugar actualiza los lugares en la misma transaccion, se revierte al final
+        oficina_servicio = oficinas_servicios[0]
+        fecha = fechas[-1]
+        disponibles = get_cit_horas_disponibles(db=db, cit_servicio_id=oficina_servicio.cit_servicio_id, fecha=fecha, oficina_id=oficina_servicio.oficina_id, settings=settings)
+        inicio = datetime.combine(fecha, disponibles[0])
+        antes = dict(get_cit_disponibilidades(db=db, oficina_id=oficina_servicio.oficina_id, cit_servicio_id=oficina_servicio.cit_servicio_id, fecha=fecha).all())
+        ocupar_lugar(db, oficina_servicio.oficina_id, inicio, oficina_servicio.oficina.limite_personas)
+        ocupado = dict(get_cit_disponibilidades(db=db, oficina_id=oficina_servicio.oficina_id, cit_servicio_id=oficina_servicio.cit_servicio_id, fecha=fecha).all())
+        liberar_lugares(db, [(oficina_servicio.oficina_id, inicio)])
+        liberado = dict(get_cit_disponibilidades(db=db, oficina_id=oficina_servicio.oficina_id, cit_servicio_id=oficina_servicio.cit_servicio_id, fecha=fecha).all())
+        db.rollback()
+        if ocupado[inicio.time()] != antes[inicio.time()] - 1 or liberado[inicio.time()] != antes[inicio.time()]:
+            fallas.append(f"Lugares: {antes[inicio.time()]} antes, {ocupado[inicio.time()]} al ocupar y {liberado[inicio.time()]} al liberar")
+        print(f"Lugares: {antes[inicio.time()]} antes, {ocupado[inicio.time()]} al ocupar y {liberado[inicio.time()]} al liberar")
+
+        # Al calcular las horas que faltan se espera a la cita que se esta creando, los lugares guardados la incluyen
+        otra.query(CitDisponibilidad).filter_by(oficina_id=oficina_servicio.oficina_id, fecha=fecha).delete(synchronize_session=False)
+        otra.commit()
+        ocupar_lugar(otra, oficina_servicio.oficina_id, inicio, oficina_servicio.oficina.limite_personas)
+        tercera = get_session_local()()
+        calculo = threading.Thread(
+            target=get_cit_horas_disponibles,
+            kwargs={"db": tercera, "cit_servicio_id": oficina_servicio.cit_servicio_id, "fecha": fecha, "oficina_id": oficina_servicio.oficina_id, "settings": settings, "confirmar": True},
+        )
+        calculo.start()
+        calculo.join(0.5)
+        espero = calculo.is_alive()
+        otra.commit()
+        calculo.join()
+        tercera.close()
+        guardadas = get_cit_disponibilidades(db=db, oficina_id=oficina_servicio.oficina_id, cit_servicio_id=oficina_servicio.cit_servicio_id, fecha=fecha).all()
+        en_vivo = calcular_en_vivo(db, settings, oficina_servicio, fecha)
+        liberar_lugares(otra, [(oficina_servicio.oficina_id, inicio)])
+        otra.commit()
+        if not espero or [tuple(renglon) for renglon in guardadas] != en_vivo:
+            fallas.append(f"Cita mientras se calcula: {'espero' if espero else 'no espero'} y guardo {dict(guardadas).get(inicio.time())} lugares en lugar de {dict(en_vivo).get(inicio.time())}")
+        print(f"Cita mientras se calcula: {'espero' if espero else 'no espero'} y guardo {dict(guardadas).get(inicio.time())} lugares con la cita")
+        db.rollback()
+
+        # Una oficina inactiva no entrega las horas guardadas, aunque no haya disparador que las borre, se revierte al final
+        get_cit_horas_disponibles(db=db, cit_servicio_id=oficina_servicio.cit_servicio_id, fecha=fecha, oficina_id=oficina_servicio.oficina_id, settings=settings)
+        db.execute(text(f"ALTER TABLE {Oficina.__tablename__} DISABLE TRIGGER USER"))
+        db.query(Oficina).filter_by(id=oficina_servicio.oficina_id).update({"estatus": "B"}, synchronize_session="fetch")
+        guardadas = get_cit_disponibilidades(db=db, oficina_id=oficina_servicio.oficina_id, cit_servicio_id=oficina_servicio.cit_servicio_id, fecha=fecha).count()
+        try:
+            get_cit_horas_disponibles(db=db, cit_servicio_id=oficina_servicio.cit_servicio_id, fecha=fecha, oficina_id=oficina_servicio.oficina_id, settings=settings)
+            fallas.append(f"Oficina inactiva: entrego horas con {guardadas} guardadas")
+        except CitasIsDeletedError:
+            print(f"Oficina inactiva: no entrego horas con {guardadas} guardadas y sin disparadores")
+        db.rollback()
+        db.expire_all()
+
+        # Agregar una hora bloqueada borra las horas de la oficina en la fecha, la consulta las calcula sin ella
+        bloqueada = disponibles[0]
+        cit_hora_bloqueada = CitHoraBloqueada(
+            oficina_id=oficina_servicio.oficina_id,
+            fecha=fecha,
+            inicio=bloqueada,
+            termino=(datetime.combine(fecha, bloqueada) + timedelta(minutes=1)).time(),
+            descripcion="PRUEBA DE DISPONIBILIDADES",
+        )
+        otra.add(cit_hora_bloqueada)
+        otra.commit()
+        creadas.append(cit_hora_bloqueada.id)
+        if get_cit_disponibilidades(db=db, oficina_id=oficina_servicio.oficina_id, cit_servicio_id=oficina_servicio.cit_servicio_id, fecha=fecha).count() != 0:
+            fallas.append("Al agregar la hora bloqueada no se borraron las horas de la oficina en la fecha")
+        horas = get_cit_horas_disponibles(db=db, cit_servicio_id=oficina_servicio.cit_servicio_id, fecha=fecha, oficina_id=oficina_servicio.oficina_id, settings=settings, confirmar=True)
+        if bloqueada in horas or get_cit_disponibilidades(db=db, oficina_id=oficina_servicio.oficina_id, cit_servicio_id=oficina_servicio.cit_servicio_id, fecha=fecha).count() == 0:
+            fallas.append(f"Despues de bloquear {bloqueada} no se calcularon las horas sin ella")
+        print(f"Bloqueo: {bloqueada} fuera de las {len(horas)} horas calculadas otra vez")
+
+        # Quitar la hora bloqueada vuelve a dejar la hora
+        otra.delete(cit_hora_bloqueada)
+        otra.commit()
+        creadas.remove(cit_hora_bloqueada.id)
+        horas = get_cit_horas_disponibles(db=db, cit_servicio_id=oficina_servicio.cit_servicio_id, fecha=fecha, oficina_id=oficina_servicio.oficina_id, settings=settings, confirmar=True)
+        if bloqueada not in horas:
+            fallas.append(f"Despues de quitar el bloqueo {bloqueada} no regreso")
+        print(f"Desbloqueo: {bloqueada} de regreso en las {len(horas)} horas")
+    finally:
+        db.rollback()
+        if creadas:
+            otra.query(CitHoraBloqueada).filter(CitHoraBloqueada.id.in_(creadas)).delete(synchronize_session=False)
+            otra.commit()
+        otra.close()
+        db.close()
+
+    # Revisar
+    for falla in fallas:
+        print(falla)
+    if fallas:
+        sys.exit(1)
+    print("Sin fallas")
+
+
+if __name__ == "__main__":
+    main()
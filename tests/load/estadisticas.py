@@ -0,0 +1,113 @@
+"""
+Prueba de las estadisticas de citas con GROUPING SETS
+
+Con la base de datos sembrada, revisa que una sola consulta de get_cit_citas_estadisticas entregue las mismas
+cantidades que las de creados por dia, creados por dia y distrito y agendadas por servicio y oficina,
+que con dimensiones los subtotales de ROLLUP sumen lo mismo que sus renglones y que el total sea la suma.
+Tambien compara los tiempos de las tres consultas contra la de GROUPING SETS.
+
+Use una base de datos sembrada con tests.load.seed y las mismas variables de entorno DB_*
+
+    python -m tests.load.estadisticas    # Entrega 1 si algo no cumple
+    python -m tests.load.estadisticas --dias 365
+"""
+import argparse
+from collections import defaultdict
+import sys
+import time
+
+# pylint: disable=unused-import
+import citas_admin.app  # Cargar todos los modelos para que se resuelvan las relaciones
+from citas_admin.v2.cit_citas.crud import (
+    get_cit_citas_agendadas_por_servicio_oficina,
+    get_cit_citas_creados_por_dia,
+    get_cit_citas_creados_por_dia_distrito,
+    get_cit_citas_estadisticas,
+)
+from config.settings import get_settings
+from lib.database import get_session_local
+
+
+def agrupar(resultados, *dimensiones) -> dict:
+    """Tomar de los renglones los que estan agrupados exactamente por las dimensiones"""
+    cantidades = {}
+    for resultado in resultados:
+        valores = resultado._asdict()
+        agrupadas = tuple(dimension for dimension in ("dia", "distrito", "oficina", "servicio", "estado") if valores.get(f"{dimension}_agrupado") == 0)
+        if agrupadas == dimensiones:
+            cantidades[tuple(valores[dimension] for dimension in dimensiones)] = valores["cantidad"]
+    return cantidades
+
+
+def medir(funcion, repeticiones: int) -> float:
+    """Medir los milisegundos en promedio"""
+    funcion()
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones * 1000
+
+
+def main():
+    """Prueba de las estadisticas"""
+
+    parser = argparse.ArgumentParser(description="Prueba de las estadisticas de citas con GROUPING SETS")
+    parser.add_argument("--dias", type=int, default=100, help="Dias hacia atras, el size de las consultas")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    fallas = []
+    settings = get_settings()
+    db = get_session_local()()
+    try:
+        # Las mismas cantidades que las consultas por separado, las que usan creado en una sola consulta
+        creados = get_cit_citas_estadisticas(db=db, settings=settings, conjuntos="dia;dia,distrito", size=args.dias).all()
+        por_dia = {(creado,): cantidad for creado, cantidad in get_cit_citas_creados_por_dia(db=db, settings=settings, size=args.dias)}
+        if agrupar(creados, "dia") != por_dia:
+            fallas.append("Las cantidades por dia no son las de creados_por_dia")
+        por_dia_distrito = {(creado, distrito): cantidad for creado, distrito, cantidad in get_cit_citas_creados_por_dia_distrito(db=db, settings=settings, size=args.dias)}
+        if agrupar(creados, "dia", "distrito") != por_dia_distrito:
+            fallas.append("Las cantidades por dia y distrito no son las de creados_por_dia_distrito")
+        agendadas = get_cit_citas_estadisticas(db=db, settings=settings, conjuntos="oficina,servicio", fecha_de="inicio", size=args.dias).all()
+        por_oficina_servicio = {(oficina, servicio): cantidad for oficina, servicio, cantidad in get_cit_citas_agendadas_por_servicio_oficina(db=db, settings=settings, size=args.dias)}
+        if agrupar(agendadas, "oficina", "servicio") != por_oficina_servicio:
+            fallas.append("Las cantidades por oficina y servicio no son las de agendadas_por_servicio_oficina")
+        print(f"Iguales: {len(por_dia)} dias, {len(por_dia_distrito)} dias y distritos, {len(por_oficina_servicio)} oficinas y servicios")
+
+        # Con dimensiones, cada subtotal de ROLLUP es la suma de sus renglones y el total la suma de todo
+        resultados = get_cit_citas_estadisticas(db=db, settings=settings, dimensiones="distrito,oficina,estado", estados="ASISTIO,CANCELO,PENDIENTE", size=args.dias).all()
+        renglones = agrupar(resultados, "distrito", "oficina", "estado")
+        sumas = defaultdict(int)
+        for (distrito, oficina, _), cantidad in renglones.items():
+            sumas[(distrito, oficina)] += cantidad
+        if agrupar(resultados, "distrito", "oficina") != dict(sumas):
+            fallas.append("Los subtotales por distrito y oficina no suman sus renglones")
+        total = agrupar(resultados)
+        if total.get(()) != sum(renglones.values()):
+            fallas.append(f"El total {total.get(())} no es la suma {sum(renglones.values())}")
+        print(f"ROLLUP: {len(resultados)} renglones, total {total.get(())}")
+
+        # Tiempos de las tres consultas contra una sola
+        tres = medir(
+            lambda: (
+                get_cit_citas_creados_por_dia(db=db, settings=settings, size=args.dias).all(),
+                get_cit_citas_creados_por_dia_distrito(db=db, settings=settings, size=args.dias).all(),
+                get_cit_citas_agendadas_por_servicio_oficina(db=db, settings=settings, size=args.dias).all(),
+            ),
+            args.repeticiones,
+        )
+        una = medir(lambda: get_cit_citas_estadisticas(db=db, settings=settings, conjuntos="dia;dia,distrito;oficina,servicio", size=args.dias).all(), args.repeticiones)
+        print(f"Tiempos: {tres:.1f} ms las tres consultas, {una:.1f} ms con GROUPING SETS")
+    finally:
+        db.close()
+
+    # Revisar
+    for falla in fallas:
+        print(falla)
+    if fallas:
+        sys.exit(1)
+    print("Sin fallas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Revisar con EXPLAIN que las consultas principales de los CRUD usen un indice
+
+Construye las consultas con las funciones de los CRUD y parametros tipicos, las explica con
+enable_seqscan apagado y revisa que la tabla principal no se lea completa y que se use alguno de los indices esperados.
+Con enable_seqscan apagado el resultado no depende del tamaño de las tablas, si aun asi hay Seq Scan es que no hay un indice que sirva.
+Se omiten las tablas vacias, porque sin estadisticas el planeador no elige los indices.
+
+Use una base de datos sembrada con tests.load.seed y con las migraciones aplicadas
+
+    alembic upgrade head
+    python -m tests.load.explain              # Entrega 1 si alguna consulta no usa un indice
+    python -m tests.load.explain --planes     # Mostrar tambien los planes
+"""
+import argparse
+from datetime import date, datetime, time, timedelta
+import json
+import sys
+
+from sqlalchemy import text
+
+# pylint: disable=unused-import
+import citas_admin.app  # Cargar todos los modelos para que se resuelvan las relaciones
+from citas_admin.v2.cit_citas.crud import get_cit_citas, get_cit_citas_creados_por_dia, get_cit_citas_estadisticas
+from citas_admin.v2.cit_citas_anonimas.crud import get_cit_citas_anonimas
+from citas_admin.v2.cit_citas_ocupaciones.models import CitCitaOcupacion
+from citas_admin.v2.cit_clientes.crud import get_cit_clientes
+from citas_admin.v2.cit_clientes_recuperaciones.crud import get_cit_clientes_recuperaciones
+from citas_admin.v2.cit_clientes_registros.crud import get_cit_clientes_registros
+from citas_admin.v2.cit_dias_inhabiles.crud import get_cit_dias_inhabiles
+from citas_admin.v2.cit_disponibilidades.crud import get_cit_disponibilidades
+from citas_admin.v2.cit_horas_bloqueadas.crud import get_cit_horas_bloqueadas
+from citas_admin.v2.enc_servicios.crud import get_enc_servicios
+from citas_admin.v2.enc_sistemas.crud import get_enc_sistemas
+from citas_admin.v2.pag_pagos.crud import get_pag_pagos
+from config.settings import get_settings
+from lib.database import get_session_local
+
+
+def get_casos(db, settings) -> list:
+    """Casos con nombre, tabla, indices esperados y la consulta"""
+    hoy = date.today()
+    hace_una_semana = hoy - timedelta(days=7)
+    hace_un_mes = hoy - timedelta(days=30)
+    manana = datetime.combine(hoy + timedelta(days=1), time(hour=9))
+    return [
+        ("cit_citas de un cliente pendientes", "cit_citas", ["ix_cit_citas_cit_cliente_id_estado_inicio"], get_cit_citas(db=db, settings=settings, cit_cliente_id=1, estado="PENDIENTE", inicio_desde=hoy)),
+        ("cit_citas de una oficina por inicio", "cit_citas", ["ix_cit_citas_oficina_id_inicio", "ix_cit_citas_oficina_id_inicio_ocupan"], get_cit_citas(db=db, settings=settings, oficina_id=1, inicio=hoy)),
+        ("cit_citas por creado", "cit_citas", ["ix_cit_citas_creado"], get_cit_citas(db=db, settings=settings, creado_desde=hace_un_mes, creado_hasta=hoy)),
+        ("cit_citas creados por dia", "cit_citas", ["ix_cit_citas_creado"], get_cit_citas_creados_por_dia(db=db, settings=settings)),
+        ("cit_citas estadisticas", "cit_citas", ["ix_cit_citas_creado"], get_cit_citas_estadisticas(db=db, settings=settings, conjuntos="dia;dia,distrito;oficina,servicio", size=30)),
+        ("cit_citas anonimas", "cit_citas", ["ix_cit_citas_oficina_id_inicio_ocupan"], get_cit_citas_anonimas(db=db, oficina_id=1, fecha=manana.date(), hora_minuto=manana.time())),
+        ("cit_citas_ocupaciones de una oficina", "cit_citas_ocupaciones", ["cit_citas_ocupaciones_pkey"], db.query(CitCitaOcupacion).filter_by(oficina_id=1).filter(CitCitaOcupacion.inicio >= manana)),
+        ("cit_disponibilidades de un servicio", "cit_disponibilidades", ["cit_disponibilidades_pkey"], get_cit_disponibilidades(db=db, oficina_id=1, cit_servicio_id=1, fecha=manana.date())),
+        ("cit_horas_bloqueadas de una oficina", "cit_horas_bloqueadas", ["ix_cit_horas_bloqueadas_oficina_id_fecha"], get_cit_horas_bloqueadas(db=db, oficina_id=1, fecha=hoy)),
+        ("cit_dias_inhabiles desde hoy", "cit_dias_inhabiles", ["ix_cit_dias_inhabiles_fecha"], get_cit_dias_inhabiles(db=db)),
+        ("pag_pagos sin comprobante", "pag_pagos", ["ix_pag_pagos_estado_ya_se_envio_comprobante"], get_pag_pagos(db=db, estado="PAGADO", ya_se_envio_comprobante=False)),
+        ("cit_clientes de un dia", "cit_clientes", ["ix_cit_clientes_creado"], get_cit_clientes(db=db, settings=settings, creado=hace_una_semana)),
+        ("cit_clientes_registros de un dia", "cit_clientes_registros", ["ix_cit_clientes_registros_creado"], get_cit_clientes_registros(db=db, settings=settings, creado=hace_una_semana)),
+        ("cit_clientes_recuperaciones de un dia", "cit_clientes_recuperaciones", ["ix_cit_clientes_recuperaciones_creado"], get_cit_clientes_recuperaciones(db=db, settings=settings, creado=hace_una_semana)),
+        ("enc_servicios de un dia", "enc_servicios", ["ix_enc_servicios_creado"], get_enc_servicios(db=db, settings=settings, creado=hace_una_semana)),
+        ("enc_sistemas de un dia", "enc_sistemas", ["ix_enc_sistemas_creado"], get_enc_sistemas(db=db, settings=settings, creado=hace_una_semana)),
+    ]
+
+
+def recorrer(plan: dict):
+    """Recorrer los nodos del plan"""
+    yield plan
+    for subplan in plan.get("Plans", []):
+        yield from recorrer(subplan)
+
+
+def explicar(db, consulta) -> dict:
+    """Explicar la consulta con enable_seqscan apagado, entrega el plan"""
+    compilada = consulta.statement.compile(dialect=db.get_bind().dialect, compile_kwargs={"render_postcompile": True})
+    db.execute(text("SET LOCAL enable_seqscan = off"))
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compilada.string}", compilada.params).scalar()
+    db.rollback()
+    return plan[0]["Plan"]
+
+
+def main():
+    """Revisar los indices"""
+
+    parser = argparse.ArgumentParser(description="Revisar con EXPLAIN que las consultas usen un indice")
+    parser.add_argument("--planes", action="store_true", help="Mostrar los planes")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    db = get_session_local()()
+    fallas = []
+    try:
+        for nombre, tabla, esperados, consulta in get_casos(db, settings):
+            if not db.execute(text(f"SELECT EXISTS (SELECT 1 FROM {tabla})")).scalar():
+                print(f"{nombre:40} se omite porque la tabla esta vacia")
+                continue
+            plan = explicar(db, consulta)
+            nodos = [nodo for nodo in recorrer(plan) if nodo.get("Relation Name") == tabla]
+            indices = sorted(set(nodo["Index Name"] for nodo in recorrer(plan) if "Index Name" in nodo))
+            completas = [nodo for nodo in nodos if nodo["Node Type"] == "Seq Scan"]
+            print(f"{nombre:40} {', '.join(indices) or 'SIN INDICE'}")
+            if args.planes:
+                print(json.dumps(plan, indent=2))
+            if completas:
+                fallas.append(f"{nombre}: lee completa la tabla {tabla}")
+            elif not set(indices) & set(esperados):
+                fallas.append(f"{nombre}: no usa {' ni '.join(esperados)}")
+    finally:
+        db.close()
+
+    # Revisar
+    for falla in fallas:
+        print(falla)
+    if fallas:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
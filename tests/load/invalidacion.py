@@ -0,0 +1,170 @@
+"""
+Prueba de la invalidacion de los caches con LISTEN/NOTIFY
+
+Con la base de datos migrada hasta los disparadores de invalidacion, arranca el hilo que escucha y revisa
+que los avisos lleguen en el orden de los commits, que un cambio de un usuario solo quite su entrada,
+que un valor consultado antes de un aviso no se guarde, y que al terminar la conexion que escucha
+los caches dejen de usarse, se vuelva a conectar y los avisos sigan quitando entradas.
+Deja los datos como estaban.
+
+Use una base de datos sembrada con tests.load.seed y las mismas variables de entorno DB_*
+
+    python -m tests.load.invalidacion    # Entrega 1 si algo no cumple
+"""
+import argparse
+from datetime import date, timedelta
+import sys
+import time
+
+from sqlalchemy import text
+
+# pylint: disable=unused-import
+import citas_admin.app  # Cargar todos los modelos para que se resuelvan las relaciones
+from citas_admin.v2.cit_dias_inhabiles.crud import get_cit_dias_inhabiles_fechas
+from citas_admin.v2.cit_dias_inhabiles.models import CitDiaInhabil
+from citas_admin.v2.usuarios.authentications import get_user
+from citas_admin.v2.usuarios.models import Usuario
+from lib.database import get_session_local
+from lib.invalidacion import BUS, CacheInvalidable, invalidar
+
+
+class Registro(CacheInvalidable):
+    """Cache que solo anota los avisos que recibe, para revisar el orden"""
+
+    def __init__(self, tablas):
+        super().__init__("registro", tablas, None, 1)
+        self.avisos = []
+
+    def invalidar(self, tabla, clave):
+        super().invalidar(tabla, clave)
+        self.avisos.append((tabla, clave))
+
+
+def esperar(condicion, segundos: float = 5.0) -> bool:
+    """Esperar hasta que se cumpla la condicion"""
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        if condicion():
+            return True
+        time.sleep(0.02)
+    return condicion()
+
+
+def main():
+    """Prueba de la invalidacion"""
+
+    parser = argparse.ArgumentParser(description="Prueba de la invalidacion de los caches con LISTEN/NOTIFY")
+    parser.add_argument("--cambios", type=int, default=20, help="Commits seguidos para revisar el orden de los avisos")
+    args = parser.parse_args()
+
+    fallas = []
+    registro = Registro(("cit_dias_inhabiles", "usuarios"))
+    BUS.registrar(registro)
+    BUS.iniciar()
+    if not BUS.conectado.wait(5):
+        print("No se pudo escuchar el canal")
+        sys.exit(1)
+    db = get_session_local()()
+    otra = get_session_local()()
+    hoy = date.today()
+    creados = []
+    try:
+        # Los avisos llegan en el orden de los commits, insertar y borrar dias inhabiles uno por uno
+        ultimo = db.query(CitDiaInhabil.fecha).order_by(CitDiaInhabil.fecha.desc()).first()
+        fecha = max(ultimo[0] if ultimo else hoy, hoy) + timedelta(days=3650)
+        esperados = []
+        for numero in range(args.cambios):
+            cit_dia_inhabil = CitDiaInhabil(fecha=fecha + timedelta(days=numero), descripcion="PRUEBA DE INVALIDACION")
+            otra.add(cit_dia_inhabil)
+            otra.commit()
+            creados.append(cit_dia_inhabil.id)
+            esperados.append(("cit_dias_inhabiles", cit_dia_inhabil.id))
+            if numero % 2 == 1:
+                otra.delete(cit_dia_inhabil)
+                otra.commit()
+                creados.remove(esperados[-1][1])
+                esperados.append(("cit_dias_inhabiles", esperados[-1][1]))
+        esperar(lambda: len(registro.avisos) >= len(esperados))
+        if registro.avisos[: len(esperados)] != esperados:
+            fallas.append(f"Los avisos no llegaron en el orden de los commits: {registro.avisos[:5]}... en lugar de {esperados[:5]}...")
+        print(f"Orden: {len(registro.avisos)} avisos de {len(esperados)} commits")
+
+        # El cache de las fechas se llena y el aviso del commit lo vacia, la siguiente consulta trae la fecha nueva
+        fechas = get_cit_dias_inhabiles_fechas(db, hoy)
+        if get_cit_dias_inhabiles_fechas.cache.obtener((hoy,))[0] is False:
+            fallas.append("No se guardaron las fechas en el cache")
+        nueva = fecha - timedelta(days=1)
+        cit_dia_inhabil = CitDiaInhabil(fecha=nueva, descripcion="PRUEBA DE INVALIDACION")
+        otra.add(cit_dia_inhabil)
+        otra.commit()
+        creados.append(cit_dia_inhabil.id)
+        if not esperar(lambda: get_cit_dias_inhabiles_fechas.cache.obtener((hoy,))[0] is False):
+            fallas.append("El commit de otra conexion no vacio el cache de las fechas")
+        if nueva not in get_cit_dias_inhabiles_fechas(db, hoy) or nueva in fechas:
+            fallas.append("Despues del aviso no se consulto la fecha nueva")
+        print(f"Fechas: {len(fechas)} en cache, vaciado por el commit de otra conexion")
+
+        # Un valor consultado antes de un aviso no se guarda aunque termine despues
+        cache = get_cit_dias_inhabiles_fechas.cache
+        llave = ("carrera",)
+        _, _, generacion = cache.obtener(llave)
+        avisos = len(registro.avisos)
+        invalidar(otra, "cit_dias_inhabiles")
+        otra.commit()
+        esperar(lambda: len(registro.avisos) > avisos)
+        cache.guardar(llave, "viejo", generacion)
+        if cache.obtener(llave)[0]:
+            fallas.append("Se guardo un valor consultado antes del aviso")
+        print("Carrera: el valor consultado antes del aviso no se guardo")
+
+        # El aviso de otro usuario no quita la entrada, un cambio del usuario si
+        usuario_id = db.query(Usuario.id).order_by(Usuario.id).first()[0]
+        otro_id = db.query(Usuario.id).order_by(Usuario.id.desc()).first()[0] + 1
+        get_user(usuario_id, db)
+        avisos = len(registro.avisos)
+        invalidar(otra, "usuarios", otro_id)
+        otra.commit()
+        esperar(lambda: len(registro.avisos) > avisos)
+        if not get_user.cache.obtener((usuario_id,))[0]:
+            fallas.append("El aviso de otro usuario quito la entrada")
+        otra.execute(text("UPDATE usuarios SET estatus = estatus WHERE id = :id"), {"id": usuario_id})
+        otra.commit()
+        if not esperar(lambda: get_user.cache.obtener((usuario_id,))[0] is False):
+            fallas.append("El cambio del usuario no quito su entrada")
+        print(f"Usuarios: el aviso del usuario {otro_id} no quito la entrada de {usuario_id}, su cambio si")
+
+        # Terminar la conexion que escucha, los caches dejan de usarse y se vuelve a conectar
+        get_cit_dias_inhabiles_fechas(db, hoy)
+        conexiones = BUS.conexiones
+        db.execute(text("SELECT pg_terminate_backend(:pid)"), {"pid": BUS.conexion.get_backend_pid()})
+        db.commit()
+        if not esperar(lambda: not BUS.conectado.is_set() or BUS.conexiones > conexiones):
+            fallas.append("No se detecto que se perdio la conexion")
+        if not esperar(lambda: BUS.conectado.is_set() and BUS.conexiones > conexiones, 10):
+            fallas.append("No se volvio a conectar")
+        if get_cit_dias_inhabiles_fechas.cache.obtener((hoy,))[0]:
+            fallas.append("Al volver a conectar no se vaciaron los caches")
+        get_cit_dias_inhabiles_fechas(db, hoy)
+        otra.execute(text("UPDATE cit_dias_inhabiles SET estatus = estatus WHERE id = :id"), {"id": creados[-1]})
+        otra.commit()
+        if not esperar(lambda: get_cit_dias_inhabiles_fechas.cache.obtener((hoy,))[0] is False):
+            fallas.append("Despues de volver a conectar los avisos no vacian el cache")
+        print(f"Reconexion: {BUS.conexiones} conexiones, los avisos siguen vaciando el cache")
+    finally:
+        if creados:
+            otra.query(CitDiaInhabil).filter(CitDiaInhabil.id.in_(creados)).delete(synchronize_session=False)
+            otra.commit()
+        otra.close()
+        db.close()
+        BUS.detener()
+
+    # Revisar
+    for falla in fallas:
+        print(falla)
+    if fallas:
+        sys.exit(1)
+    print("Sin fallas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Ejecutar las pruebas de carga y entregar un reporte de RPS y percentiles por endpoint
+
+Primero siembre los datos con seed.py y arranque la API contra esa base de datos, luego
+
+    python -m tests.load.run --host http://127.0.0.1:8006 --usuarios 20 --segundos 60 --reporte antes.json
+
+Para comparar dos reportes, por ejemplo de dos commits
+
+    python -m tests.load.run --comparar antes.json despues.json
+"""
+import argparse
+from datetime import datetime
+import json
+import math
+import random
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from tests.load.scenarios import ESCENARIOS, MANIFIESTO, Cliente, elegir_escenarios
+
+
+class Registro:
+    """Acumula la duracion de las peticiones por endpoint, seguro entre hilos"""
+
+    def __init__(self):
+        self.candado = threading.Lock()
+        self.duraciones: Dict[str, List[float]] = {}
+        self.fallas: Dict[str, int] = {}
+        self.errores: Dict[str, int] = {}
+        self.midiendo = False
+
+    def registrar(self, nombre: str, duracion: float, estatus: int, exito: bool):
+        """Registrar una peticion, las del calentamiento se descartan"""
+        if not self.midiendo:
+            return
+        with self.candado:
+            self.duraciones.setdefault(nombre, []).append(duracion)
+            if estatus != 200:
+                self.errores[nombre] = self.errores.get(nombre, 0) + 1
+            elif not exito:
+                self.fallas[nombre] = self.fallas.get(nombre, 0) + 1
+
+
+def percentil(ordenados: List[float], porcentaje: float) -> float:
+    """Percentil por el metodo del rango mas cercano"""
+    if not ordenados:
+        return 0.0
+    posicion = max(0, math.ceil(porcentaje / 100 * len(ordenados)) - 1)
+    return ordenados[posicion]
+
+
+def get_commit() -> str:
+    """Commit actual de git, para identificar el reporte"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def elaborar_reporte(registro: Registro, segundos: float, args) -> dict:
+    """Elaborar el reporte con peticiones, RPS y percentiles en milisegundos por endpoint"""
+    endpoints = {}
+    total = 0
+    for nombre, duraciones in sorted(registro.duraciones.items()):
+        ordenados = sorted(duraciones)
+        total += len(ordenados)
+        endpoints[nombre] = {
+            "peticiones": len(ordenados),
+            "rps": round(len(ordenados) / segundos, 2),
+            "p50_ms": round(percentil(ordenados, 50) * 1000, 1),
+            "p95_ms": round(percentil(ordenados, 95) * 1000, 1),
+            "p99_ms": round(percentil(ordenados, 99) * 1000, 1),
+            "fallas": registro.fallas.get(nombre, 0),
+            "errores": registro.errores.get(nombre, 0),
+        }
+    return {
+        "commit": get_commit(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "host": args.host,
+        "usuarios": args.usuarios,
+        "segundos": round(segundos, 1),
+        "escenarios": args.escenarios,
+        "semilla": args.semilla,
+        "peticiones": total,
+        "rps": round(total / segundos, 2),
+        "endpoints": endpoints,
+    }
+
+
+def imprimir_reporte(reporte: dict):
+    """Imprimir el reporte como tabla"""
+    print(f"Commit {reporte['commit']} {reporte['usuarios']} usuarios {reporte['segundos']} s {reporte['peticiones']} peticiones {reporte['rps']} RPS")
+    print(f"{'endpoint':60} {'peticiones':>10} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'fallas':>7} {'errores':>7}")
+    for nombre, datos in reporte["endpoints"].items():
+        print(f"{nombre:60} {datos['peticiones']:>10} {datos['rps']:>8} {datos['p50_ms']:>8} {datos['p95_ms']:>8} {datos['p99_ms']:>8} {datos['fallas']:>7} {datos['errores']:>7}")
+
+
+def comparar(archivo_antes: str, archivo_despues: str, tolerancia: float) -> int:
+    """Comparar dos reportes, entrega 1 si algun p95 empeora mas que la tolerancia en porcentaje"""
+    with open(archivo_antes, encoding="utf8") as archivo:
+        antes = json.load(archivo)
+    with open(archivo_despues, encoding="utf8") as archivo:
+        despues = json.load(archivo)
+    print(f"Antes {antes['commit']} {antes['rps']} RPS, despues {despues['commit']} {despues['rps']} RPS")
+    print(f"{'endpoint':60} {'rps':>16} {'p50 ms':>16} {'p95 ms':>16} {'p99 ms':>16}")
+    empeoro = False
+    for nombre in sorted(set(antes["endpoints"]) | set(despues["endpoints"])):
+        if nombre not in antes["endpoints"] or nombre not in despues["endpoints"]:
+            print(f"{nombre:60} solo en {'despues' if nombre in despues['endpoints'] else 'antes'}")
+            continue
+        columnas = []
+        for metrica in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            valor_antes = antes["endpoints"][nombre][metrica]
+            valor_despues = despues["endpoints"][nombre][metrica]
+            cambio = (valor_despues - valor_antes) / valor_antes * 100 if valor_antes else 0.0
+            columnas.append(f"{valor_despues:>8} {cambio:+6.1f}%")
+            if metrica == "p95_ms" and cambio > tolerancia:
+                empeoro = True
+        print(f"{nombre:60} {' '.join(columnas)}")
+    if empeoro:
+        print(f"Algun p95 empeoro mas de {tolerancia}%")
+        return 1
+    return 0
+
+
+def usuario_virtual(numero: int, args, manifiesto: dict, registro: Registro, termino: float):
+    """Hilo que ejecuta escenarios elegidos al azar hasta el tiempo de termino"""
+    azar = random.Random(args.semilla * 1000 + numero)
+    cliente = Cliente(args.host, args.api_key or manifiesto["api_key"], manifiesto, registro.registrar, args.timeout)
+    funciones, pesos = elegir_escenarios(args.escenarios)
+    while time.monotonic() < termino:
+        azar.choices(funciones, weights=pesos)[0](cliente, azar)
+        if args.pausa > 0:
+            time.sleep(azar.uniform(0, args.pausa))
+
+
+def main():
+    """Pruebas de carga"""
+
+    parser = argparse.ArgumentParser(description="Pruebas de carga con datos sembrados")
+    parser.add_argument("--host", default="http://127.0.0.1:8006", help="URL de la API")
+    parser.add_argument("--api-key", default="", help="Por defecto la del manifiesto")
+    parser.add_argument("--manifiesto", default=MANIFIESTO)
+    parser.add_argument("--usuarios", type=int, default=10, help="Usuarios virtuales concurrentes")
+    parser.add_argument("--segundos", type=float, default=60, help="Duracion de la medicion")
+    parser.add_argument("--calentamiento", type=float, default=5, help="Segundos que no se miden al inicio")
+    parser.add_argument("--pausa", type=float, default=0, help="Pausa maxima al azar entre escenarios")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--escenarios", nargs="+", default=list(ESCENARIOS), choices=list(ESCENARIOS))
+    parser.add_argument("--reporte", default="", help="Archivo JSON donde guardar el reporte")
+    parser.add_argument("--comparar", nargs=2, metavar=("ANTES", "DESPUES"), help="Comparar dos reportes en vez de ejecutar")
+    parser.add_argument("--tolerancia", type=float, default=10, help="Porcentaje que puede empeorar el p95 al comparar")
+    args = parser.parse_args()
+
+    if args.comparar:
+        sys.exit(comparar(args.comparar[0], args.comparar[1], args.tolerancia))
+
+    with open(args.manifiesto, encoding="utf8") as archivo:
+        manifiesto = json.load(archivo)
+
+    # Arrancar los usuarios virtuales
+    registro = Registro()
+    termino = time.monotonic() + args.calentamiento + args.segundos
+    hilos = [threading.Thread(target=usuario_virtual, args=(numero, args, manifiesto, registro, termino), daemon=True) for numero in range(args.usuarios)]
+    for hilo in hilos:
+        hilo.start()
+
+    # Medir despues del calentamiento
+    time.sleep(args.calentamiento)
+    registro.midiendo = True
+    inicio = time.monotonic()
+    for hilo in hilos:
+        hilo.join()
+    segundos = time.monotonic() - inicio
+
+    # Entregar el reporte
+    reporte = elaborar_reporte(registro, segundos, args)
+    imprimir_reporte(reporte)
+    if args.reporte:
+        with open(args.reporte, "w", encoding="utf8") as archivo:
+            json.dump(reporte, archivo, indent=2)
+        print(f"Reporte en {args.reporte}")
+
+
+if __name__ == "__main__":
+    main()
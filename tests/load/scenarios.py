@@ -0,0 +1,188 @@
+"""
+Escenarios de las pruebas de carga, siguen los flujos de los archivos de rest-client
+
+Cada escenario recibe un Cliente y un generador random y hace una secuencia de peticiones.
+El nombre que se registra es la plantilla de la ruta, asi las estadisticas se agrupan por endpoint.
+"""
+from datetime import date, timedelta
+import random
+import time
+from typing import Callable, Dict, List, Tuple
+
+import requests
+
+MANIFIESTO = "tests/load/manifiesto.json"
+
+
+class Cliente:
+    """Cliente HTTP que registra la duracion y el estatus de cada peticion"""
+
+    def __init__(self, base_url: str, api_key: str, manifiesto: dict, registrar: Callable[[str, float, int, bool], None], timeout: float = 30):
+        self.base_url = base_url.rstrip("/")
+        self.manifiesto = manifiesto
+        self.registrar = registrar
+        self.timeout = timeout
+        self.sesion = requests.Session()
+        self.sesion.headers["X-Api-Key"] = api_key
+
+    def peticion(self, metodo: str, nombre: str, ruta: str, params: dict = None, json: dict = None) -> dict:
+        """Hacer la peticion, registrarla con el nombre y entregar el cuerpo en JSON"""
+        inicio = time.perf_counter()
+        try:
+            respuesta = self.sesion.request(metodo, self.base_url + ruta, params=params, json=json, timeout=self.timeout)
+        except requests.exceptions.RequestException:
+            self.registrar(nombre, time.perf_counter() - inicio, 0, False)
+            return {}
+        duracion = time.perf_counter() - inicio
+        try:
+            cuerpo = respuesta.json()
+        except ValueError:
+            cuerpo = {}
+        # Las fallas de negocio se entregan con estatus 200 y success en falso, se registran aparte de los errores HTTP
+        exito = respuesta.status_code == 200 and (not isinstance(cuerpo, dict) or cuerpo.get("success", True) is not False)
+        self.registrar(nombre, duracion, respuesta.status_code, exito)
+        return cuerpo if isinstance(cuerpo, dict) else {}
+
+    def get(self, nombre: str, ruta: str, **params) -> dict:
+        """GET"""
+        return self.peticion("GET", nombre, ruta, params=params)
+
+    def post(self, nombre: str, ruta: str, json: dict) -> dict:
+        """POST"""
+        return self.peticion("POST", nombre, ruta, json=json)
+
+
+def elegir_cliente(cliente: Cliente, azar: random.Random) -> int:
+    """Elegir un ID de cliente sembrado"""
+    return azar.randint(1, cliente.manifiesto["clientes"])
+
+
+def elegir_oficina(cliente: Cliente, azar: random.Random) -> int:
+    """Elegir un ID de oficina sembrada"""
+    return azar.randint(1, cliente.manifiesto["oficinas"])
+
+
+def elegir_servicio(cliente: Cliente, azar: random.Random, oficina_id: int) -> int:
+    """Elegir un servicio que ofrece la oficina, con la misma formula que el sembrado"""
+    manifiesto = cliente.manifiesto
+    return 1 + (oficina_id * 7 + azar.randrange(manifiesto["servicios_por_oficina"])) % manifiesto["servicios"]
+
+
+def curp_de(cit_cliente_id: int) -> str:
+    """CURP sembrado del cliente"""
+    return f"CAR{chr(65 + (cit_cliente_id // 1000000) % 26)}{cit_cliente_id % 1000000:06d}HCLSRN00"
+
+
+def email_de(cit_cliente_id: int) -> str:
+    """Email sembrado del cliente"""
+    return f"cliente{cit_cliente_id}@carga.test"
+
+
+def navegar_disponibilidad(cliente: Cliente, azar: random.Random):
+    """agendar_una_cita.rest hasta elegir la hora, sin crear la cita"""
+    cliente.get("/v2/distritos", "/v2/distritos")
+    oficina_id = elegir_oficina(cliente, azar)
+    cliente.get("/v2/oficinas?distrito_id", "/v2/oficinas", distrito_id=azar.randint(1, cliente.manifiesto["distritos"]))
+    cliente.get("/v2/oficinas/{oficina_id}", f"/v2/oficinas/{oficina_id}")
+    cliente.get("/v2/cit_oficinas_servicios?oficina_id", "/v2/cit_oficinas_servicios", oficina_id=oficina_id)
+    dias = cliente.get("/v2/cit_dias_disponibles", "/v2/cit_dias_disponibles", oficina_id=oficina_id)
+    fechas = [item["fecha"] for item in dias.get("result", {}).get("items", [])]
+    if fechas:
+        cliente.get("/v2/cit_horas_disponibles", "/v2/cit_horas_disponibles", oficina_id=oficina_id, cit_servicio_id=elegir_servicio(cliente, azar, oficina_id), fecha=azar.choice(fechas[:20]))
+
+
+def agendar(cliente: Cliente, azar: random.Random):
+    """agendar_una_cita.rest completo, consulta el perfil, las horas y crea la cita"""
+    cit_cliente_id = elegir_cliente(cliente, azar)
+    oficina_id = elegir_oficina(cliente, azar)
+    cit_servicio_id = elegir_servicio(cliente, azar, oficina_id)
+    cliente.get("/v2/cit_clientes/perfil", "/v2/cit_clientes/perfil", cit_cliente_id=cit_cliente_id)
+    cliente.get("/v2/cit_citas/disponibles", "/v2/cit_citas/disponibles", cit_cliente_id=cit_cliente_id)
+    dias = cliente.get("/v2/cit_dias_disponibles", "/v2/cit_dias_disponibles", oficina_id=oficina_id)
+    fechas = [item["fecha"] for item in dias.get("result", {}).get("items", [])]
+    if not fechas:
+        return
+    fecha = azar.choice(fechas[:20])
+    horas = cliente.get("/v2/cit_horas_disponibles", "/v2/cit_horas_disponibles", oficina_id=oficina_id, cit_servicio_id=cit_servicio_id, fecha=fecha)
+    horas_minutos = [item["horas_minutos"] for item in horas.get("result", {}).get("items", [])]
+    if not horas_minutos:
+        return
+    cliente.post(
+        "/v2/cit_citas/nueva",
+        "/v2/cit_citas/nueva",
+        json={
+            "cit_cliente_id": cit_cliente_id,
+            "oficina_id": oficina_id,
+            "cit_servicio_id": cit_servicio_id,
+            "fecha": fecha,
+            "hora_minuto": azar.choice(horas_minutos)[:5],
+            "notas": "CITA DE PRUEBA DE CARGA",
+        },
+    )
+
+
+def cancelar(cliente: Cliente, azar: random.Random):
+    """Consultar mis citas y cancelar una pendiente que se pueda cancelar"""
+    cit_cliente_id = elegir_cliente(cliente, azar)
+    forma = azar.randrange(3)
+    if forma == 0:
+        mis_citas = cliente.get("/v2/cit_citas/mis_citas", "/v2/cit_citas/mis_citas", cit_cliente_id=cit_cliente_id)
+    elif forma == 1:
+        mis_citas = cliente.get("/v2/cit_citas/mis_citas", "/v2/cit_citas/mis_citas", cit_cliente_curp=curp_de(cit_cliente_id))
+    else:
+        mis_citas = cliente.get("/v2/cit_citas/mis_citas", "/v2/cit_citas/mis_citas", cit_cliente_email=email_de(cit_cliente_id))
+    cancelables = [item for item in mis_citas.get("result", {}).get("items", []) if item.get("puede_cancelarse")]
+    if cancelables:
+        cit_cita = azar.choice(cancelables)
+        cliente.get("/v2/cit_citas/{cit_cita_id}", f"/v2/cit_citas/{cit_cita['id']}")
+        cliente.post("/v2/cit_citas/cancelar", "/v2/cit_citas/cancelar", json={"id": cit_cita["id"], "cit_cliente_id": cit_cliente_id})
+
+
+def tableros(cliente: Cliente, azar: random.Random):
+    """cit_citas.rest, los listados y conteos que usan los tableros"""
+    hoy = date.today()
+    dia = hoy - timedelta(days=azar.randint(0, 60))
+    oficina_id = elegir_oficina(cliente, azar)
+    cliente.get("/v2/cit_citas?oficina_id&inicio", "/v2/cit_citas", oficina_id=oficina_id, inicio=dia.isoformat())
+    cliente.get("/v2/cit_citas?oficina_clave&estado", "/v2/cit_citas", oficina_clave=f"OF-{oficina_id:04d}", estado="PENDIENTE", inicio_desde=hoy.isoformat())
+    cliente.get("/v2/cit_citas/creados_por_dia", "/v2/cit_citas/creados_por_dia", size=30)
+    cliente.get("/v2/cit_citas/creados_por_dia_distrito", "/v2/cit_citas/creados_por_dia_distrito", size=30)
+    cliente.get("/v2/cit_citas/agendadas_por_servicio_oficina", "/v2/cit_citas/agendadas_por_servicio_oficina", inicio=dia.isoformat())
+
+
+def pagos(cliente: Cliente, azar: random.Random):
+    """Consultas de pagos, el carro no se incluye porque llama al banco"""
+    cit_cliente_id = elegir_cliente(cliente, azar)
+    cliente.get("/v2/pag_tramites_servicios", "/v2/pag_tramites_servicios")
+    cliente.get("/v2/pag_pagos?cit_cliente_id", "/v2/pag_pagos", cit_cliente_id=cit_cliente_id)
+    cliente.get("/v2/pag_pagos?estado", "/v2/pag_pagos", estado="PAGADO", ya_se_envio_comprobante="false")
+
+
+def catalogos(cliente: Cliente, azar: random.Random):
+    """catalogos.rest"""
+    cliente.get("/v2/materias", "/v2/materias")
+    cliente.get("/v2/distritos", "/v2/distritos")
+    cliente.get("/v2/autoridades", "/v2/autoridades")
+    cliente.get("/v2/oficinas", "/v2/oficinas")
+    cliente.get("/v2/cit_servicios", "/v2/cit_servicios")
+
+
+# Escenarios con su peso relativo en la mezcla
+ESCENARIOS: Dict[str, Tuple[Callable[[Cliente, random.Random], None], int]] = {
+    "navegar_disponibilidad": (navegar_disponibilidad, 40),
+    "agendar": (agendar, 15),
+    "cancelar": (cancelar, 10),
+    "tableros": (tableros, 15),
+    "pagos": (pagos, 10),
+    "catalogos": (catalogos, 10),
+}
+
+
+def elegir_escenarios(nombres: List[str]) -> Tuple[List[Callable[[Cliente, random.Random], None]], List[int]]:
+    """Entregar las funciones y los pesos de los escenarios elegidos"""
+    funciones, pesos = [], []
+    for nombre in nombres:
+        funcion, peso = ESCENARIOS[nombre]
+        funciones.append(funcion)
+        pesos.append(peso)
+    return funciones, pesos
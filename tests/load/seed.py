@@ -0,0 +1,445 @@
+"""
+Sembrar datos sinteticos para las pruebas de carga
+
+Llena una base de datos local de Postgres con volumenes realistas de distritos, oficinas,
+servicios, clientes, citas, dias inhabiles, horas bloqueadas, encuestas y pagos,
+crea un usuario con permiso de administrar todos los modulos y escribe un manifiesto
+con la API key y los rangos de IDs que usa run.py
+
+Use las mismas variables de entorno DB_* de la API, por ejemplo
+
+    python -m tests.load.seed --limpiar --clientes 300000 --citas 1200000
+
+No lo ejecute contra la base de datos de produccion, --limpiar borra todas las tablas.
+"""
+import argparse
+from datetime import date, datetime, timedelta
+import json
+import time
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import text
+
+from config.settings import get_settings
+from lib.database import Base, get_engine, get_session_local
+from lib.hashids import cifrar_id
+from lib.pwgen import generar_api_key
+
+# Importar todos los modelos para que create_all conozca las tablas
+from citas_admin.v2.autoridades.models import Autoridad
+from citas_admin.v2.cit_categorias.models import CitCategoria
+from citas_admin.v2.cit_citas.models import CitCita
+from citas_admin.v2.cit_citas_ocupaciones.models import CitCitaOcupacion
+from citas_admin.v2.cit_clientes.models import CitCliente
+from citas_admin.v2.cit_clientes_recuperaciones.models import CitClienteRecuperacion
+from citas_admin.v2.cit_clientes_registros.models import CitClienteRegistro
+from citas_admin.v2.cit_dias_inhabiles.models import CitDiaInhabil
+from citas_admin.v2.cit_disponibilidades.models import CitDisponibilidad
+from citas_admin.v2.cit_horas_bloqueadas.models import CitHoraBloqueada
+from citas_admin.v2.cit_oficinas_servicios.models import CitOficinaServicio
+from citas_admin.v2.cit_servicios.models import CitServicio
+from citas_admin.v2.distritos.models import Distrito
+from citas_admin.v2.domicilios.models import Domicilio
+from citas_admin.v2.enc_servicios.models import EncServicio
+from citas_admin.v2.enc_sistemas.models import EncSistema
+from citas_admin.v2.materias.models import Materia
+from citas_admin.v2.modulos.models import Modulo
+from citas_admin.v2.oficinas.models import Oficina
+from citas_admin.v2.pag_pagos.models import PagPago
+from citas_admin.v2.pag_tramites_servicios.models import PagTramiteServicio
+from citas_admin.v2.permisos.models import Permiso
+from citas_admin.v2.roles.models import Rol
+from citas_admin.v2.usuarios.models import Usuario
+from citas_admin.v2.usuarios_oficinas.models import UsuarioOficina
+from citas_admin.v2.usuarios_roles.models import UsuarioRol
+
+from citas_admin.v2.cit_dias_disponibles.crud import get_cit_dias_disponibles
+from citas_admin.v2.cit_disponibilidades.crud import extender_cit_disponibilidades
+
+from tests.load.scenarios import MANIFIESTO
+
+MODULOS = [
+    "AUTORIDADES",
+    "CIT CATEGORIAS",
+    "CIT CITAS",
+    "CIT CLIENTES",
+    "CIT CLIENTES RECUPERACIONES",
+    "CIT CLIENTES REGISTROS",
+    "CIT DIAS INHABILES",
+    "CIT HORAS BLOQUEADAS",
+    "CIT OFICINAS SERVICIOS",
+    "CIT SERVICIOS",
+    "DISTRITOS",
+    "DOMICILIOS",
+    "ENC SERVICIOS",
+    "ENC SISTEMAS",
+    "MATERIAS",
+    "MODULOS",
+    "OFICINAS",
+    "PAG PAGOS",
+    "PAG TRAMITES SERVICIOS",
+    "PERMISOS",
+    "ROLES",
+    "USUARIO OFICINAS",
+    "USUARIOS",
+    "USUARIOS ROLES",
+]
+
+SERVICIOS_POR_OFICINA = 6
+FRANJAS_POR_DIA = 32  # De las 08:00 a las 16:00 en intervalos de 15 minutos
+
+TABLAS = [
+    "usuarios_roles",
+    "usuarios_oficinas",
+    "usuarios",
+    "permisos",
+    "roles",
+    "modulos",
+    "pag_pagos",
+    "pag_tramites_servicios",
+    "enc_servicios",
+    "enc_sistemas",
+    "cit_disponibilidades",
+    "cit_citas_ocupaciones",
+    "cit_citas",
+    "cit_clientes_recuperaciones",
+    "cit_clientes_registros",
+    "cit_clientes",
+    "cit_horas_bloqueadas",
+    "cit_dias_inhabiles",
+    "cit_oficinas_servicios",
+    "cit_servicios",
+    "cit_categorias",
+    "autoridades",
+    "oficinas",
+    "domicilios",
+    "materias",
+    "distritos",
+]
+
+
+def ejecutar(conexion, descripcion: str, sentencia: str, **parametros):
+    """Ejecutar una sentencia y mostrar cuanto tardo"""
+    inicio = time.perf_counter()
+    resultado = conexion.execute(text(sentencia), parametros)
+    print(f"  {descripcion}: {resultado.rowcount} renglones en {time.perf_counter() - inicio:.1f} s")
+
+
+def sembrar_catalogos(conexion, args):
+    """Sembrar distritos, materias, domicilios, oficinas, autoridades, categorias, servicios y tramites"""
+    ejecutar(
+        conexion,
+        "distritos",
+        """
+        INSERT INTO distritos (nombre, nombre_corto, es_distrito_judicial)
+        SELECT 'DISTRITO JUDICIAL ' || g, 'DISTRITO ' || g, TRUE FROM generate_series(1, :distritos) g
+        """,
+        distritos=args.distritos,
+    )
+    ejecutar(conexion, "materias", "INSERT INTO materias (nombre) SELECT 'MATERIA ' || g FROM generate_series(1, 6) g")
+    ejecutar(
+        conexion,
+        "domicilios",
+        """
+        INSERT INTO domicilios (estado, municipio, calle, num_ext, num_int, colonia, cp, completo)
+        SELECT 'COAHUILA', 'MUNICIPIO ' || (1 + g % 38), 'CALLE ' || g, g::text, '', 'CENTRO', 25000 + g, 'CALLE ' || g || ', CENTRO, COAHUILA'
+        FROM generate_series(1, :oficinas) g
+        """,
+        oficinas=args.oficinas,
+    )
+    ejecutar(
+        conexion,
+        "oficinas",
+        """
+        INSERT INTO oficinas (distrito_id, domicilio_id, clave, descripcion, descripcion_corta, es_jurisdiccional, puede_agendar_citas, apertura, cierre, limite_personas, puede_enviar_qr)
+        SELECT 1 + g % :distritos, g, 'OF-' || lpad(g::text, 4, '0'), 'OFICINA DE CARGA ' || g, 'OFICINA ' || g, g % 4 <> 0, TRUE, '08:00', '16:00', 1 + g % 4, g % 2 = 0
+        FROM generate_series(1, :oficinas) g
+        """,
+        distritos=args.distritos,
+        oficinas=args.oficinas,
+    )
+    ejecutar(
+        conexion,
+        "autoridades",
+        """
+        INSERT INTO autoridades (distrito_id, materia_id, clave, descripcion, descripcion_corta, es_jurisdiccional, es_notaria, organo_jurisdiccional)
+        SELECT 1 + g % :distritos, 1 + g % 6, 'AUT-' || lpad(g::text, 4, '0'), 'AUTORIDAD DE CARGA ' || g, 'AUTORIDAD ' || g, TRUE, FALSE, 'JUZGADO DE PRIMERA INSTANCIA'
+        FROM generate_series(1, :oficinas) g
+        """,
+        distritos=args.distritos,
+        oficinas=args.oficinas,
+    )
+    ejecutar(conexion, "cit_categorias", "INSERT INTO cit_categorias (nombre) SELECT 'CATEGORIA ' || g FROM generate_series(1, 5) g")
+    ejecutar(
+        conexion,
+        "cit_servicios",
+        """
+        INSERT INTO cit_servicios (cit_categoria_id, clave, descripcion, duracion, documentos_limite, desde, hasta, dias_habilitados)
+        SELECT 1 + g % 5, 'SRV-' || lpad(g::text, 3, '0'), 'SERVICIO ' || g, CASE WHEN g % 3 = 0 THEN '00:30'::time ELSE '00:15'::time END, 1 + g % 10,
+            CASE WHEN g % 5 = 0 THEN '09:00'::time END, CASE WHEN g % 7 = 0 THEN '14:00'::time END, '01234'
+        FROM generate_series(1, :servicios) g
+        """,
+        servicios=args.servicios,
+    )
+    ejecutar(
+        conexion,
+        "cit_oficinas_servicios",
+        """
+        INSERT INTO cit_oficinas_servicios (cit_servicio_id, oficina_id, descripcion)
+        SELECT DISTINCT 1 + (o * 7 + k) % :servicios, o, 'OFICINA ' || o || ' SERVICIO ' || (1 + (o * 7 + k) % :servicios)
+        FROM generate_series(1, :oficinas) o, generate_series(0, :por_oficina - 1) k
+        """,
+        servicios=args.servicios,
+        oficinas=args.oficinas,
+        por_oficina=SERVICIOS_POR_OFICINA,
+    )
+    ejecutar(
+        conexion,
+        "pag_tramites_servicios",
+        """
+        INSERT INTO pag_tramites_servicios (clave, descripcion, costo, url)
+        SELECT 'PAG-' || lpad(g::text, 3, '0'), 'TRAMITE ' || g, 100 + g * 25, 'https://noexiste.com/tramite/' || g FROM generate_series(1, 10) g
+        """,
+    )
+
+
+def sembrar_calendario(conexion, args, desde: date, hasta: date):
+    """Sembrar dias inhabiles y horas bloqueadas"""
+    ejecutar(
+        conexion,
+        "cit_dias_inhabiles",
+        """
+        INSERT INTO cit_dias_inhabiles (fecha, descripcion)
+        SELECT d::date, 'DIA INHABIL DE CARGA' FROM generate_series(:desde, :hasta, interval '1 day') d
+        WHERE extract(isodow FROM d) < 6 AND hashtext(d::text) % 20 = 0
+        """,
+        desde=desde,
+        hasta=hasta,
+    )
+    ejecutar(
+        conexion,
+        "cit_horas_bloqueadas",
+        """
+        INSERT INTO cit_horas_bloqueadas (oficina_id, fecha, inicio, termino, descripcion)
+        SELECT 1 + g % :oficinas, :desde + (g * 7919) % (:hasta - :desde), '13:00'::time + ((g % 3) * interval '30 minutes'), '14:00'::time + ((g % 3) * interval '30 minutes'), 'JUNTA'
+        FROM generate_series(1, :horas_bloqueadas) g
+        """,
+        oficinas=args.oficinas,
+        desde=desde,
+        hasta=hasta,
+        horas_bloqueadas=args.horas_bloqueadas,
+    )
+
+
+def sembrar_clientes(conexion, args):
+    """Sembrar clientes, con CURP y email unicos"""
+    ejecutar(
+        conexion,
+        "cit_clientes",
+        """
+        INSERT INTO cit_clientes (nombres, apellido_primero, apellido_segundo, curp, telefono, email, contrasena_md5, contrasena_sha256, renovacion, limite_citas_pendientes,
+            autoriza_mensajes, enviar_boletin, es_adulto_mayor, es_mujer, es_identidad, es_discapacidad, es_personal_interno)
+        SELECT 'NOMBRE ' || g, 'APELLIDO ' || (g % 997), 'APELLIDO ' || (g % 991),
+            'CAR' || chr(65 + (g / 1000000) % 26) || lpad((g % 1000000)::text, 6, '0') || 'HCLSRN00',
+            (8440000000 + g)::text, 'cliente' || g || '@carga.test', md5(g::text), md5(g::text) || md5(g::text), CURRENT_DATE + 365, 0,
+            TRUE, g % 10 = 0, g % 12 = 0, g % 2 = 0, FALSE, g % 50 = 0, g % 100 = 0
+        FROM generate_series(1, :clientes) g
+        """,
+        clientes=args.clientes,
+    )
+
+
+def sembrar_citas(conexion, args, desde: date, hasta: date, hoy: date):
+    """Sembrar citas repartidas en dias habiles, las pasadas con asistencia y las futuras pendientes"""
+    ejecutar(
+        conexion,
+        "cit_citas",
+        """
+        INSERT INTO cit_citas (cit_cliente_id, cit_servicio_id, oficina_id, inicio, termino, notas, estado, asistencia, codigo_asistencia, cancelar_antes, creado)
+        SELECT c.cit_cliente_id, c.cit_servicio_id, c.oficina_id, c.inicio, c.inicio + interval '15 minutes', 'CITA DE CARGA',
+            CASE
+                WHEN c.azar < 0.12 THEN 'CANCELO'
+                WHEN c.inicio::date >= :hoy THEN 'PENDIENTE'
+                WHEN c.azar < 0.25 THEN 'INASISTENCIA'
+                ELSE 'ASISTIO'
+            END,
+            c.inicio::date < :hoy AND c.azar >= 0.25, lpad((c.g % 10000)::text, 4, '0'), c.inicio - interval '1 day', c.inicio - (1 + c.g % 30) * interval '1 day'
+        FROM (
+            SELECT g,
+                1 + (g * 7919) % :clientes AS cit_cliente_id,
+                1 + (o * 7 + g % :por_oficina) % :servicios AS cit_servicio_id,
+                o AS oficina_id,
+                (dia + time '08:00' + (g % :franjas) * interval '15 minutes') AS inicio,
+                random() AS azar
+            FROM (
+                SELECT g, 1 + (g * 31) % :oficinas AS o,
+                    :desde + CAST((g * 104729) % (:hasta - :desde + 1) AS integer) AS dia
+                FROM generate_series(CAST(1 AS bigint), :citas) g
+            ) base
+            WHERE extract(isodow FROM dia) < 6
+        ) c
+        """,
+        hoy=hoy,
+        desde=desde,
+        hasta=hasta,
+        clientes=args.clientes,
+        oficinas=args.oficinas,
+        servicios=args.servicios,
+        por_oficina=SERVICIOS_POR_OFICINA,
+        franjas=FRANJAS_POR_DIA,
+        citas=int(args.citas * 7 / 5),  # Se generan de mas porque se descartan los fines de semana
+    )
+    ejecutar(
+        conexion,
+        "cit_citas_ocupaciones",
+        """
+        INSERT INTO cit_citas_ocupaciones (oficina_id, inicio, cantidad)
+        SELECT oficina_id, inicio, count(*) FROM cit_citas WHERE estatus = 'A' AND estado <> 'CANCELO' GROUP BY oficina_id, inicio
+        """,
+    )
+
+
+def sembrar_disponibilidades():
+    """Precalcular las horas disponibles de los servicios de cada oficina en los dias disponibles"""
+    inicio = time.perf_counter()
+    db = get_session_local()()
+    try:
+        cantidad = extender_cit_disponibilidades(db, get_cit_dias_disponibles(db=db, settings=get_settings()))
+    finally:
+        db.close()
+    print(f"  cit_disponibilidades: {cantidad} renglones en {time.perf_counter() - inicio:.1f} s")
+
+
+def sembrar_encuestas_pagos(conexion, args):
+    """Sembrar encuestas de servicio, de sistema y pagos"""
+    ejecutar(
+        conexion,
+        "enc_servicios",
+        """
+        INSERT INTO enc_servicios (cit_cliente_id, oficina_id, respuesta_01, respuesta_02, respuesta_03, respuesta_04, estado)
+        SELECT 1 + (g * 13) % :clientes, 1 + g % :oficinas,
+            CASE WHEN g % 3 = 0 THEN 1 + g % 5 END, CASE WHEN g % 3 = 0 THEN 1 + g % 4 END, CASE WHEN g % 3 = 0 THEN 1 + g % 3 END, NULL,
+            CASE WHEN g % 3 = 0 THEN 'CONTESTADO' WHEN g % 3 = 1 THEN 'PENDIENTE' ELSE 'CANCELADO' END
+        FROM generate_series(1, :encuestas) g
+        """,
+        clientes=args.clientes,
+        oficinas=args.oficinas,
+        encuestas=args.encuestas,
+    )
+    ejecutar(
+        conexion,
+        "enc_sistemas",
+        """
+        INSERT INTO enc_sistemas (cit_cliente_id, respuesta_01, respuesta_02, respuesta_03, estado)
+        SELECT 1 + (g * 17) % :clientes, CASE WHEN g % 3 = 0 THEN 1 + g % 5 END, NULL, NULL,
+            CASE WHEN g % 3 = 0 THEN 'CONTESTADO' WHEN g % 3 = 1 THEN 'PENDIENTE' ELSE 'CANCELADO' END
+        FROM generate_series(1, :encuestas) g
+        """,
+        clientes=args.clientes,
+        encuestas=args.encuestas,
+    )
+    ejecutar(
+        conexion,
+        "pag_pagos",
+        """
+        INSERT INTO pag_pagos (cit_cliente_id, pag_tramite_servicio_id, estado, email, folio, total, ya_se_envio_comprobante)
+        SELECT 1 + (g * 23) % :clientes, 1 + g % 10,
+            CASE WHEN g % 10 < 7 THEN 'PAGADO' WHEN g % 10 < 8 THEN 'FALLIDO' WHEN g % 10 < 9 THEN 'CANCELADO' ELSE 'SOLICITADO' END,
+            'cliente' || (1 + (g * 23) % :clientes) || '@carga.test', CASE WHEN g % 10 < 7 THEN 'FOLIO' || g ELSE '' END, 100 + (g % 10) * 25, g % 10 < 7
+        FROM generate_series(1, :pagos) g
+        """,
+        clientes=args.clientes,
+        pagos=args.pagos,
+    )
+
+
+def sembrar_usuario(conexion) -> str:
+    """Crear el usuario de carga con permiso de administrar todos los modulos, entrega la API key"""
+    email = "carga@carga.test"
+    for nombre in MODULOS:
+        conexion.execute(text("INSERT INTO modulos (nombre, nombre_corto, icono, ruta, en_navegacion) VALUES (:nombre, :nombre, 'icono', '/', TRUE)"), {"nombre": nombre})
+    rol_id = conexion.execute(text("INSERT INTO roles (nombre) VALUES ('CARGA') RETURNING id")).scalar()
+    conexion.execute(
+        text("INSERT INTO permisos (modulo_id, rol_id, nombre, nivel) SELECT id, :rol_id, nombre || ' CARGA', :nivel FROM modulos"),
+        {"rol_id": rol_id, "nivel": Permiso.ADMINISTRAR},
+    )
+    usuario_id = conexion.execute(
+        text(
+            """
+            INSERT INTO usuarios (autoridad_id, oficina_id, email, contrasena, nombres, apellido_paterno, apellido_materno, api_key, api_key_expiracion)
+            VALUES (1, 1, :email, '', 'USUARIO', 'DE', 'CARGA', '', :expiracion) RETURNING id
+            """
+        ),
+        {"email": email, "expiracion": datetime.now() + timedelta(days=365)},
+    ).scalar()
+    conexion.execute(text("INSERT INTO usuarios_roles (rol_id, usuario_id, descripcion) VALUES (:rol_id, :usuario_id, 'CARGA')"), {"rol_id": rol_id, "usuario_id": usuario_id})
+    api_key = generar_api_key(cifrar_id(usuario_id), email)
+    conexion.execute(text("UPDATE usuarios SET api_key = :api_key WHERE id = :usuario_id"), {"api_key": api_key, "usuario_id": usuario_id})
+    return api_key
+
+
+def main():
+    """Sembrar datos sinteticos"""
+
+    parser = argparse.ArgumentParser(description="Sembrar datos sinteticos para las pruebas de carga")
+    parser.add_argument("--limpiar", action="store_true", help="Borrar todos los renglones antes de sembrar")
+    parser.add_argument("--distritos", type=int, default=14)
+    parser.add_argument("--oficinas", type=int, default=150)
+    parser.add_argument("--servicios", type=int, default=40)
+    parser.add_argument("--clientes", type=int, default=300000)
+    parser.add_argument("--citas", type=int, default=1200000)
+    parser.add_argument("--horas-bloqueadas", type=int, default=5000)
+    parser.add_argument("--encuestas", type=int, default=100000)
+    parser.add_argument("--pagos", type=int, default=100000)
+    parser.add_argument("--dias-pasados", type=int, default=540, help="Dias hacia atras con citas")
+    parser.add_argument("--dias-futuros", type=int, default=60, help="Dias hacia adelante con citas pendientes")
+    parser.add_argument("--semilla", type=int, default=1, help="Semilla para random() de Postgres")
+    parser.add_argument("--manifiesto", default=MANIFIESTO)
+    args = parser.parse_args()
+
+    hoy = date.today()
+    desde = hoy - timedelta(days=args.dias_pasados)
+    hasta = hoy + timedelta(days=args.dias_futuros)
+
+    engine = get_engine()
+    Base.metadata.create_all(engine)
+    command.stamp(Config("alembic.ini"), "7b4d9e2c6a10")  # Las tablas y los indices ya estan como en esa migracion
+    command.upgrade(Config("alembic.ini"), "head")  # Las siguientes crean lo que no esta en los modelos, como los disparadores
+    print("Sembrando datos sinteticos")
+    inicio = time.perf_counter()
+    with engine.begin() as conexion:
+        if args.limpiar:
+            conexion.execute(text(f"TRUNCATE {', '.join(TABLAS)} RESTART IDENTITY CASCADE"))
+        conexion.execute(text("SELECT setseed(:semilla)"), {"semilla": 1 / (1 + args.semilla)})
+        sembrar_catalogos(conexion, args)
+        sembrar_calendario(conexion, args, desde, hasta)
+        sembrar_clientes(conexion, args)
+        sembrar_citas(conexion, args, desde, hasta, hoy)
+        sembrar_encuestas_pagos(conexion, args)
+        api_key = sembrar_usuario(conexion)
+    sembrar_disponibilidades()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexion:
+        conexion.execute(text("ANALYZE"))
+    print(f"Listo en {time.perf_counter() - inicio:.1f} s")
+
+    # Escribir el manifiesto para run.py
+    manifiesto = {
+        "api_key": api_key,
+        "clientes": args.clientes,
+        "oficinas": args.oficinas,
+        "servicios": args.servicios,
+        "servicios_por_oficina": SERVICIOS_POR_OFICINA,
+        "distritos": args.distritos,
+        "desde": desde.isoformat(),
+        "hasta": hasta.isoformat(),
+        "semilla": args.semilla,
+    }
+    with open(args.manifiesto, "w", encoding="utf8") as archivo:
+        json.dump(manifiesto, archivo, indent=2)
+    print(f"Manifiesto en {args.manifiesto}")
+    print(f"API_KEY={api_key}")
+
+
+if __name__ == "__main__":
+    main()
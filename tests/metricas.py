@@ -0,0 +1,127 @@
+"""
+Metricas sumadas de los workers y acceso a /metrics
+
+Revisa sin base de datos, con procesos hijos como si fueran workers de gunicorn, que /metrics entregue
+la suma de los contadores y los medidores de todos, que al terminar un worker sus contadores se sigan contando
+y sus medidores ya no, que lo mismo pase con un worker que muere sin terminar y que los contadores nunca bajen.
+Tambien que /metrics no exista sin METRICS_TOKEN y que con el pida Authorization: Bearer.
+Entrega 1 si algo no cumple.
+
+    python -m tests.metricas
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+
+from tests.entorno import definir_entorno
+
+# Valores por defecto para poder importar lib sin un archivo .env
+definir_entorno("metricas", {"METRICS_TOKEN": "metricas"})
+
+# pylint: disable=wrong-import-position
+from lib.metrics import HTTP_DURACION, HTTP_EN_CURSO, SQL_SENTENCIAS, MetricasCompartidas
+
+CONTADOR = "db_statements_total"
+MEDIDOR = 'http_requests_in_progress{method="GET"}'
+HISTOGRAMA = 'http_request_duration_seconds_count{method="GET",route="/prueba",status="200"}'
+
+
+def leer(texto: str, serie: str) -> float:
+    """Tomar el valor de una serie del texto de Prometheus, cero si no esta"""
+    for renglon in texto.splitlines():
+        if renglon.startswith(serie + " "):
+            return float(renglon.split(" ")[-1])
+    return 0.0
+
+
+def worker(directorio: str, sentencias: int, en_curso: int, terminar: bool, listo, seguir):
+    """Worker que guarda sus metricas, espera y termina, o muere sin terminar"""
+    compartidas = MetricasCompartidas(directorio)
+    SQL_SENTENCIAS.inc(sentencias)
+    HTTP_EN_CURSO.inc(en_curso, "GET")
+    HTTP_DURACION.observe(0.01, "GET", "/prueba", "200")
+    compartidas.guardar()
+    listo.set()
+    seguir.wait(10)
+    if terminar:
+        compartidas.terminar()
+    os._exit(0)  # pylint: disable=protected-access
+
+
+def revisar_suma() -> list:
+    """Revisar la suma de los workers, entrega las fallas"""
+    fallas = []
+    contexto = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as directorio:
+        compartidas = MetricasCompartidas(directorio)
+
+        # Dos workers vivos, uno termina bien y el otro muere sin terminar, este proceso cuenta despues del fork
+        procesos = []
+        for sentencias, en_curso, terminar in ((5, 2, True), (7, 4, False)):
+            listo, seguir = contexto.Event(), contexto.Event()
+            proceso = contexto.Process(target=worker, args=(directorio, sentencias, en_curso, terminar, listo, seguir))
+            proceso.start()
+            listo.wait(10)
+            procesos.append((proceso, seguir))
+        SQL_SENTENCIAS.inc(3)
+        HTTP_EN_CURSO.inc(1, "GET")
+        texto = compartidas.render()
+        vivos = (leer(texto, CONTADOR), leer(texto, MEDIDOR), leer(texto, HISTOGRAMA))
+        if vivos != (15, 7, 2):
+            fallas.append(f"Vivos: contador, medidor e histograma {vivos} en lugar de (15, 7, 2)")
+        print(f"Vivos: contador {vivos[0]}, medidor {vivos[1]}, histograma {vivos[2]}")
+
+        # Al terminar los dos, los contadores y los histogramas siguen y los medidores ya no
+        for proceso, seguir in procesos:
+            seguir.set()
+            proceso.join()
+        texto = compartidas.render()
+        terminados = (leer(texto, CONTADOR), leer(texto, MEDIDOR), leer(texto, HISTOGRAMA))
+        if terminados != (15, 1, 2):
+            fallas.append(f"Terminados: contador, medidor e histograma {terminados} en lugar de (15, 1, 2)")
+        print(f"Terminados: contador {terminados[0]}, medidor {terminados[1]}, histograma {terminados[2]}")
+
+        # Los archivos de los que terminaron se acumulan una sola vez
+        SQL_SENTENCIAS.inc(1)
+        otra_vez = leer(compartidas.render(), CONTADOR)
+        archivos = sorted(nombre for nombre in os.listdir(directorio) if nombre.endswith(".json"))
+        if otra_vez != 16 or archivos != sorted([f"{os.getpid()}.json", MetricasCompartidas.TERMINADOS]):
+            fallas.append(f"Otra vez: contador {otra_vez} en lugar de 16 con los archivos {archivos}")
+        print(f"Otra vez: contador {otra_vez} con {len(archivos)} archivos")
+    return fallas
+
+
+def revisar_acceso() -> list:
+    """Revisar que /metrics pida el token, entrega las fallas"""
+    # pylint: disable=import-outside-toplevel
+    from fastapi.testclient import TestClient
+
+    from citas_admin.app import app, settings
+
+    fallas = []
+    cliente = TestClient(app)
+    respuestas = {
+        "sin encabezado": cliente.get("/metrics").status_code,
+        "otro token": cliente.get("/metrics", headers={"Authorization": "Bearer otro"}).status_code,
+        "con el token": cliente.get("/metrics", headers={"Authorization": f"Bearer {settings.metrics_token}"}).status_code,
+    }
+    token, settings.metrics_token = settings.metrics_token, ""
+    respuestas["sin METRICS_TOKEN"] = cliente.get("/metrics", headers={"Authorization": f"Bearer {token}"}).status_code
+    settings.metrics_token = token
+    if respuestas != {"sin encabezado": 403, "otro token": 403, "con el token": 200, "sin METRICS_TOKEN": 404}:
+        fallas.append(f"Acceso: {respuestas}")
+    print(f"Acceso: {respuestas}")
+    return fallas
+
+
+def main():
+    """Revisar las metricas"""
+    fallas = revisar_suma() + revisar_acceso()
+    for falla in fallas:
+        print(falla)
+    sys.exit(1 if fallas else 0)
+
+
+if __name__ == "__main__":
+    main()
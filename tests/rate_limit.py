@@ -0,0 +1,141 @@
+"""
+Limite de peticiones con cubetas de fichas
+
+Revisa sin base de datos, con un reloj falso, que la cubeta permita hasta su capacidad, que se recargue
+con el tiempo sin pasar de la capacidad, que Retry-After se redondee hacia arriba, que un modulo sin limite
+propio use el del asterisco, que los workers compartan las cubetas del archivo y que si el archivo sigue
+bloqueado la peticion se permita en lugar de elevar un error. Entrega 1 si algo no cumple.
+
+    python -m tests.rate_limit
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from tests.entorno import definir_entorno
+
+# Valores por defecto para poder importar lib sin un archivo .env
+definir_entorno("rate_limit")
+
+# pylint: disable=wrong-import-position
+from config.settings import Settings
+from lib import rate_limit
+from lib.rate_limit import FileRateLimitStore, MemoryRateLimitStore, consumir_ficha, get_retry_after
+
+
+class Reloj:
+    """Reloj falso para time.monotonic y time.time"""
+
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def monotonic(self) -> float:
+        """Segundos del reloj"""
+        return self.ahora
+
+    def time(self) -> float:
+        """Segundos del reloj"""
+        return self.ahora
+
+
+def revisar_cubeta(nombre: str, store, reloj: Reloj) -> list:
+    """Revisar la capacidad y la recarga de un almacen, entrega las fallas"""
+    fallas = []
+
+    # Hasta la capacidad se permite, la siguiente espera lo que tarda en recargarse una ficha
+    esperas = [store.consume("1:CIT CITAS", 3, 60) for _ in range(4)]
+    if esperas[:3] != [0.0, 0.0, 0.0] or abs(esperas[3] - 20.0) > 1e-6:
+        fallas.append(f"{nombre} capacidad: {esperas}")
+    print(f"{nombre} capacidad: 3 permitidas y la cuarta espera {esperas[3]:.1f} segundos")
+
+    # A los 20 segundos hay una ficha, no dos
+    reloj.ahora += 20
+    esperas = [store.consume("1:CIT CITAS", 3, 60) for _ in range(2)]
+    if esperas[0] != 0.0 or esperas[1] <= 0.0:
+        fallas.append(f"{nombre} recarga: {esperas}")
+    print(f"{nombre} recarga: a los 20 segundos una ficha, despues espera {esperas[1]:.1f}")
+
+    # Despues de mucho tiempo la cubeta se llena solo hasta la capacidad
+    reloj.ahora += 3600
+    esperas = [store.consume("1:CIT CITAS", 3, 60) for _ in range(4)]
+    if esperas[:3] != [0.0, 0.0, 0.0] or esperas[3] <= 0.0:
+        fallas.append(f"{nombre} tope: {esperas}")
+    print(f"{nombre} tope: despues de una hora solo 3 fichas")
+    return fallas
+
+
+def revisar_retry_after() -> list:
+    """Revisar el redondeo de Retry-After, entrega las fallas"""
+    redondeos = {espera: get_retry_after(espera) for espera in (0.001, 0.5, 1.0, 1.2, 19.999999, 20.0)}
+    if redondeos != {0.001: "1", 0.5: "1", 1.0: "1", 1.2: "2", 19.999999: "20", 20.0: "20"}:
+        return [f"Retry-After: {redondeos}"]
+    print(f"Retry-After: {redondeos}")
+    return []
+
+
+def revisar_modulos() -> list:
+    """Revisar que el modulo sin limite propio use el del asterisco, entrega las fallas"""
+    fallas = []
+    settings = Settings(rate_limits="CIT CITAS=1/60,*=2/60", rate_limit_store="memory")
+    rate_limit.get_rate_limit_store.cache_clear()
+    propio = [asyncio.run(consumir_ficha(7, "CIT CITAS", settings)) > 0 for _ in range(2)]
+    asterisco = [asyncio.run(consumir_ficha(7, "OFICINAS", settings)) > 0 for _ in range(3)]
+    sin_limites = asyncio.run(consumir_ficha(7, "OFICINAS", Settings(rate_limits="CIT CITAS=1/60")))
+    if propio != [False, True] or asterisco != [False, False, True] or sin_limites != 0.0:
+        fallas.append(f"Modulos: propio {propio}, asterisco {asterisco}, sin asterisco {sin_limites}")
+    print("Modulos: CIT CITAS con su limite de 1, OFICINAS con el del asterisco de 2, sin asterisco no se limita")
+    return fallas
+
+
+def revisar_archivo_bloqueado(ruta: str) -> list:
+    """Revisar que con el archivo bloqueado por otro worker se permita sin elevar, entrega las fallas"""
+    store = FileRateLimitStore(ruta, espera=0.2)
+    otro = sqlite3.connect(ruta, isolation_level=None)
+    otro.execute("BEGIN IMMEDIATE")
+    inicio = time.perf_counter()
+    try:
+        espera = store.consume("2:CIT CITAS", 1, 60)
+    except sqlite3.OperationalError as error:
+        return [f"Bloqueado: elevo {error}"]
+    finally:
+        otro.execute("ROLLBACK")
+        otro.close()
+    segundos = time.perf_counter() - inicio
+    despues = store.consume("2:CIT CITAS", 1, 60)
+    if espera != 0.0 or despues != 0.0:
+        return [f"Bloqueado: espera {espera} y despues {despues}"]
+    print(f"Bloqueado: se permitio en {segundos:.2f} segundos y despues se vuelve a contar")
+    return []
+
+
+def main():
+    """Revisar el limite de peticiones"""
+    reloj = Reloj()
+    rate_limit.time = reloj
+    fallas = []
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "rate_limit.sqlite3")
+        fallas += revisar_cubeta("Memoria", MemoryRateLimitStore(), reloj)
+        fallas += revisar_cubeta("Archivo", FileRateLimitStore(ruta), reloj)
+
+        # Otro worker con el mismo archivo ve las fichas que ya se consumieron
+        otro_worker = FileRateLimitStore(ruta).consume("1:CIT CITAS", 3, 60)
+        if otro_worker <= 0.0:
+            fallas.append(f"Compartido: otro worker tenia fichas {otro_worker}")
+        print(f"Compartido: otro worker con el mismo archivo espera {otro_worker:.1f} segundos")
+
+        rate_limit.time = time
+        fallas += revisar_archivo_bloqueado(ruta)
+    rate_limit.time = time
+    fallas += revisar_retry_after()
+    fallas += revisar_modulos()
+    for falla in fallas:
+        print(falla)
+    sys.exit(1 if fallas else 0)
+
+
+if __name__ == "__main__":
+    main()
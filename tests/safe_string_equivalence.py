@@ -0,0 +1,237 @@
+"""
+Test safe_string
+
+Compara las funciones de lib/safe_string con copias de las funciones originales, antes de precompilar
+las expresiones regulares y memorizar, con un corpus fijo y cadenas al azar. Deben ser identicas.
+
+    python -m tests.safe_string_equivalence --cantidad 200000
+"""
+import argparse
+from datetime import date
+import random
+import re
+import sys
+import timeit
+
+from unidecode import unidecode
+
+from lib.safe_string import CURP_REGEXP, EMAIL_REGEXP, TELEFONO_REGEXP, safe_clave, safe_curp, safe_email, safe_expediente, safe_string, safe_telefono
+
+# Funciones originales, copiadas sin cambios salvo el nombre
+
+
+def safe_clave_original(input_str, max_len=16):
+    """Safe clave"""
+    if not isinstance(input_str, str):
+        return None
+    input_str = input_str.strip()
+    if input_str == "":
+        return None
+    new_string = re.sub(r"[^a-zA-Z0-9()-]+", " ", unidecode(input_str))
+    removed_multiple_spaces = re.sub(r"\s+", " ", new_string)
+    spaces_to_dashes = re.sub(r"\s+", "-", removed_multiple_spaces)
+    final = spaces_to_dashes.strip().upper()
+    if len(final) > max_len:
+        return final[:max_len]
+    return final
+
+
+def safe_curp_original(input_str, search_fragment=False):
+    """Safe CURP"""
+    if not isinstance(input_str, str):
+        return None
+    input_str = input_str.strip()
+    if input_str == "":
+        return None
+    removed_spaces = re.sub(r"\s", "", input_str)
+    removed_simbols = re.sub(r"[()\[\]:/.-]+", "", removed_spaces)
+    final = unidecode(removed_simbols.upper())
+    if search_fragment:
+        if re.match(r"^[A-Z\d]+$", final) is None:
+            return None
+        return final
+    if re.fullmatch(CURP_REGEXP, final) is None:
+        return None
+    return final
+
+
+def safe_email_original(input_str, search_fragment=False):
+    """Safe string"""
+    if not isinstance(input_str, str):
+        return None
+    input_str = input_str.strip()
+    if input_str == "":
+        return None
+    final = input_str.lower()
+    if search_fragment:
+        if re.match(r"^[\w.-]*@*[\w.-]*\.*\w*$", final) is None:
+            return None
+        return final
+    if re.match(EMAIL_REGEXP, final) is None:
+        return None
+    return final
+
+
+def safe_expediente_original(input_str):
+    """Safe expediente"""
+    if not isinstance(input_str, str):
+        return None
+    input_str = input_str.strip()
+    if input_str == "":
+        return None
+    elementos = re.sub(r"[^0-9]+", "-", input_str).split("-")
+    try:
+        numero = int(elementos[0])
+        ano = int(elementos[1])
+    except (IndexError, ValueError) as error:
+        raise error
+    if numero < 0:
+        return None
+    if ano < 1950 or ano > date.today().year:
+        return None
+    return f"{str(numero)}/{str(ano)}"
+
+
+def safe_string_original(input_str, max_len=250, to_uppercase=True, do_unidecode=True):
+    """Safe string"""
+    if not isinstance(input_str, str):
+        return None
+    input_str = input_str.strip()
+    if input_str == "":
+        return None
+    if do_unidecode:
+        new_string = re.sub(r"[^a-zA-Z0-9.(),/-]+", " ", unidecode(input_str))
+    else:
+        new_string = re.sub(r"[^a-záéíóúüñA-ZÁÉÍÓÚÜÑ0-9.(),/-]+", " ", input_str)
+    removed_multiple_spaces = re.sub(r"\s+", " ", new_string)
+    final = removed_multiple_spaces.strip()
+    if to_uppercase:
+        final = final.upper()
+    if max_len == 0:
+        return final
+    return (final[:max_len] + "...") if len(final) > max_len else final
+
+
+def safe_telefono_original(input_str):
+    """Safe telefono"""
+    if not isinstance(input_str, str):
+        return None
+    input_str = input_str.strip()
+    if input_str == "":
+        return None
+    solo_numeros = re.sub(r"[^0-9]+", "", unidecode(input_str))
+    if re.match(TELEFONO_REGEXP, solo_numeros) is None:
+        return None
+    return solo_numeros
+
+
+CORPUS = [
+    None,
+    123,
+    "",
+    "   ",
+    "\t\n",
+    "JUZGADO PRIMERO FAMILIAR",
+    "  Juzgado   Segundo Civil  ",
+    "Pensión alimenticia, expediente 123/2022",
+    "Méndez Núñez Über Ñandú",
+    "SLT-J1-FAM",
+    "slt j2 civ",
+    "Ofic. Trámite (Mxl)",
+    "---a---",
+    "a\u00a0b\u2003c",
+    "北京 市",
+    "emoji 😀 final",
+    "ß straße",
+    "ﬁ ligadura",
+    "①②③ 844 123 4567",
+    "XAXX010101HCLSRN00",
+    "xaxx-010101-mclsrn09",
+    "[XAXX:010101/HCLSRN.00]",
+    "ñaxx010101hclsrn00",
+    "persona@correo.com",
+    "  Otra.Persona@Dominio.gob.mx ",
+    "ÑOÑO@correo.com",
+    "mal correo",
+    "@",
+    "a@b",
+    "8441234567",
+    "(844) 123-4567",
+    "0441234567",
+    "844123456\n",
+    "12/2020",
+    "12-1949",
+    "abc",
+    "x" * 300,
+    "á" * 300,
+]
+
+ALFABETO = "aAzZ09 .,()/-_@[]:áéíóúüñÁÉÍÓÚÜÑßçÇ\t\n\u00a0\u2003\u3000北京😀ﬁ①"
+
+
+def comparar(nombre, nueva, original, entradas, **parametros):
+    """Comparar la funcion nueva con la original, entrega la cantidad de diferencias"""
+    diferencias = 0
+    for entrada in entradas:
+        try:
+            esperado = ("ok", original(entrada, **parametros))
+        except Exception as error:  # pylint: disable=broad-except
+            esperado = ("error", type(error))
+        try:
+            obtenido = ("ok", nueva(entrada, **parametros))
+        except Exception as error:  # pylint: disable=broad-except
+            obtenido = ("error", type(error))
+        if esperado != obtenido:
+            diferencias += 1
+            if diferencias <= 5:
+                print(f"  {nombre}{parametros} {entrada!r}: esperado {esperado!r} obtenido {obtenido!r}")
+    return diferencias
+
+
+def main():
+    """Test safe_string"""
+
+    parser = argparse.ArgumentParser(description="Test safe_string")
+    parser.add_argument("--cantidad", type=int, default=20000, help="Cantidad de cadenas al azar")
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+
+    azar = random.Random(args.semilla)
+    entradas = CORPUS + ["".join(azar.choices(ALFABETO, k=azar.randint(0, 40))) for _ in range(args.cantidad)]
+    entradas = entradas + entradas  # Repetidas para pasar por la memoria
+
+    print("Prueba de equivalencia de safe_string")
+    casos = [
+        ("safe_clave", safe_clave, safe_clave_original, {}),
+        ("safe_clave", safe_clave, safe_clave_original, {"max_len": 4}),
+        ("safe_curp", safe_curp, safe_curp_original, {}),
+        ("safe_curp", safe_curp, safe_curp_original, {"search_fragment": True}),
+        ("safe_email", safe_email, safe_email_original, {}),
+        ("safe_email", safe_email, safe_email_original, {"search_fragment": True}),
+        ("safe_expediente", safe_expediente, safe_expediente_original, {}),
+        ("safe_string", safe_string, safe_string_original, {}),
+        ("safe_string", safe_string, safe_string_original, {"max_len": 0}),
+        ("safe_string", safe_string, safe_string_original, {"max_len": 10, "to_uppercase": False}),
+        ("safe_string", safe_string, safe_string_original, {"do_unidecode": False}),
+        ("safe_string", safe_string, safe_string_original, {"do_unidecode": False, "to_uppercase": False}),
+        ("safe_telefono", safe_telefono, safe_telefono_original, {}),
+    ]
+    diferencias = 0
+    for nombre, nueva, original, parametros in casos:
+        diferencias += comparar(nombre, nueva, original, entradas, **parametros)
+
+    # Comparar tiempos con las entradas del corpus que son cadenas
+    cadenas = [entrada for entrada in entradas if isinstance(entrada, str)]
+    for nombre, nueva, original in (("safe_string", safe_string, safe_string_original), ("safe_curp", safe_curp, safe_curp_original), ("safe_telefono", safe_telefono, safe_telefono_original)):
+        antes = min(timeit.repeat(lambda: [original(cadena) for cadena in cadenas], number=1, repeat=3))
+        despues = min(timeit.repeat(lambda: [nueva(cadena) for cadena in cadenas], number=1, repeat=3))
+        print(f"  {nombre}: {antes * 1000:.1f} ms antes, {despues * 1000:.1f} ms despues, {antes / despues:.1f}x")
+
+    if diferencias > 0:
+        print(f"Hay {diferencias} diferencias")
+        sys.exit(1)
+    print(f"Sin diferencias en {len(entradas)} entradas")
+
+
+if __name__ == "__main__":
+    main()